@@ -78,6 +78,66 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 BREAKOUT_CANDLE_STREAM = "candle_1m"
 BREAKOUT_LIVE_OHLC_KEY = "live_ohlc_data"
 BREAKOUT_PREV_DAY_HASH = "prev_day_ohlc"
+BREAKOUT_REF_LEVELS_KEY = "ref_levels"
+# Candles read (and acknowledged) per XREADGROUP in the algo engine: reads grow from the
+# minimum towards the maximum while a backlog is queued, and are sized for each minute's burst
+BREAKOUT_CONSUMER_BATCH = int(os.environ.get('BREAKOUT_CONSUMER_BATCH', 100))
+BREAKOUT_CONSUMER_BATCH_MAX = int(os.environ.get('BREAKOUT_CONSUMER_BATCH_MAX', 2000))
+# Longest gap (seconds) between pending-entry checks while candles are still draining
+BREAKOUT_PENDING_CHECK_SECS = float(os.environ.get('BREAKOUT_PENDING_CHECK_SECS', 1.0))
+# Restart catch-up: backlog read size, and the age (seconds) past which backlog candles are skipped
+BREAKOUT_CATCHUP_BATCH = int(os.environ.get('BREAKOUT_CATCHUP_BATCH', 1000))
+BREAKOUT_CATCHUP_FRESH_SECS = int(os.environ.get('BREAKOUT_CATCHUP_FRESH_SECS', 360))
+# IST time (HH:MM) at which the algo engine squares off open positions and stops entering
+BREAKOUT_SQUARE_OFF_TIME = os.environ.get('BREAKOUT_SQUARE_OFF_TIME', '15:15')
+# Per-process Redis connection pool size (engines share it across threads)
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 20))
+# Shared-memory candle ring used when both engines run on one host (run_colocated / --colocated)
+COLOCATED_SHM_NAME = os.environ.get('COLOCATED_SHM_NAME', 'algotrader_candles')
+COLOCATED_RING_CAPACITY = int(os.environ.get('COLOCATED_RING_CAPACITY', 16384))
+
+# --- BROKER BACKEND ---
+# 'live' talks to SmartAPI, 'paper' uses the local simulator in tradeapp/paper_broker.py
+BROKER_BACKEND = os.environ.get('BROKER_BACKEND', 'live')
+PAPER_BROKER = {
+    'latency_ms': float(os.environ.get('PAPER_LATENCY_MS', 40)),
+    'slippage_bps': float(os.environ.get('PAPER_SLIPPAGE_BPS', 2)),
+    'reject_rate': float(os.environ.get('PAPER_REJECT_RATE', 0)),
+}
+# Refresh the shared SmartAPI session this long before the access token expires
+BROKER_TOKEN_REFRESH_AHEAD_SECS = int(os.environ.get('BROKER_TOKEN_REFRESH_AHEAD_SECS', 1800))
+# Keep-alive connection pool for SmartAPI calls (tradeapp/http_pool.py)
+BROKER_HTTP_POOL_SIZE = int(os.environ.get('BROKER_HTTP_POOL_SIZE', 4))
+BROKER_HTTP_KEEPALIVE_SECS = int(os.environ.get('BROKER_HTTP_KEEPALIVE_SECS', 30))
+SMARTAPI_ROOT = os.environ.get('SMARTAPI_ROOT')  # None = SmartAPI's production root
+SMARTAPI_CA_BUNDLE = os.environ.get('SMARTAPI_CA_BUNDLE')
+# SmartAPI calls per second shared by every process (tradeapp/ratelimit.py), and the
+# slots of each second that reconciliation, session and history calls leave to orders
+BROKER_API_RATE = int(os.environ.get('BROKER_API_RATE', 10))
+BROKER_QUOTA_HEADROOM = int(os.environ.get('BROKER_QUOTA_HEADROOM', 2))
+
+# --- HISTORICAL API ---
+# SmartAPI getCandleData quota (requests/second, enforced across processes) and fetch concurrency
+HISTORY_API_RATE = float(os.environ.get('HISTORY_API_RATE', 3))
+HISTORY_FETCH_WORKERS = int(os.environ.get('HISTORY_FETCH_WORKERS', 6))
+# Local incremental candle store (tradeapp/history.py)
+HISTORY_DIR = os.environ.get('HISTORY_DIR', os.path.join(BASE_DIR, 'history'))
+
+# --- INSTRUMENT MASTER ---
+# Angel scrip master (tradeapp/instruments.py); INSTRUMENT_MASTER_FILE points at a local copy instead
+INSTRUMENT_MASTER_URL = os.environ.get('INSTRUMENT_MASTER_URL', 'https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json')
+INSTRUMENT_MASTER_FILE = os.environ.get('INSTRUMENT_MASTER_FILE')
+INSTRUMENT_CACHE_PATH = os.environ.get('INSTRUMENT_CACHE_PATH', os.path.join(HISTORY_DIR, 'instruments.bin'))
+# Named list from tradeapp.constants.UNIVERSES, or an EXCHANGE[:SEGMENT] spec such as "NSE:EQ"
+TRADING_UNIVERSE = os.environ.get('TRADING_UNIVERSE', 'breakout')
+
+# --- PROFILING ---
+# Where `manage.py profile_engine` / SIGUSR1 profiles are written
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# --- METRICS ---
+# Shared secret for scraping /metrics/; without it only logged-in staff users can read it
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 
 # --- CRITICAL LOGIN SETTINGS (Fixes the loop) ---
 # This tells Django: "If user is not logged in, send them to /login/, NOT /dashboard/"
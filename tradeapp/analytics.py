@@ -0,0 +1,156 @@
+"""
+Daily and per-symbol performance summaries.
+
+`record_close()` folds one closed trade into its DailySummary and
+SymbolSummary rows with a single UPDATE each (F-expressions, so concurrent
+engines do not lose increments). `rebuild()` recomputes both tables from the
+Trade history and is what the backfill_analytics command runs. Reads
+(`summarize()`) only touch the summary rows, so their cost depends on the
+date range and universe, not on how many trades have been taken.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import Trade, DailySummary, SymbolSummary
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('trades', 'wins', 'losses', 'pnl', 'gross_profit', 'gross_loss', 'r_total', 'r_trades')
+ZERO = Decimal('0')
+
+
+def trade_stats(trade):
+    """Increments one closed trade contributes, or None if it has no PnL."""
+    if trade.pnl is None:
+        return None
+    pnl = Decimal(str(trade.pnl))
+    stats = {
+        'trades': 1,
+        'wins': int(pnl > 0),
+        'losses': int(pnl < 0),
+        'pnl': pnl,
+        'gross_profit': max(pnl, ZERO),
+        'gross_loss': -min(pnl, ZERO),
+        'r_total': 0.0,
+        'r_trades': 0,
+    }
+    # R multiple against the planned risk (entry to stop) per share
+    if trade.entry_price and trade.stop_level and trade.quantity:
+        risk = (float(trade.entry_price) - float(trade.stop_level)) * trade.quantity
+        if risk > 0:
+            stats['r_total'] = float(pnl) / risk
+            stats['r_trades'] = 1
+    return stats
+
+
+def close_date(trade):
+    return timezone.localdate(trade.updated_at or timezone.now())
+
+
+def _bump(model, lookup, stats):
+    model.objects.get_or_create(**lookup)
+    model.objects.filter(**lookup).update(
+        **{field: F(field) + stats[field] for field in COUNTERS},
+        # Coalesce: a fresh row has no best/worst yet (and SQLite's MAX() is NULL-poisoned)
+        best=Greatest(Coalesce(F('best'), stats['pnl']), stats['pnl']),
+        worst=Least(Coalesce(F('worst'), stats['pnl']), stats['pnl']),
+        updated_at=timezone.now(),
+    )
+
+
+def record_close(trade):
+    """Call exactly once per trade, when it reaches CLOSED."""
+    stats = trade_stats(trade)
+    if stats is None:
+        return
+    with transaction.atomic():
+        _bump(DailySummary, {'user_id': trade.user_id, 'date': close_date(trade)}, stats)
+        _bump(SymbolSummary, {'user_id': trade.user_id, 'symbol': trade.symbol}, stats)
+
+
+def rebuild(user=None):
+    """Recomputes every summary row from CLOSED trades. Returns the number of trades folded in."""
+    trades = Trade.objects.filter(status='CLOSED', pnl__isnull=False)
+    if user is not None:
+        trades = trades.filter(user=user)
+
+    daily, symbols = defaultdict(dict), defaultdict(dict)
+    count = 0
+    for trade in trades.only('user_id', 'symbol', 'pnl', 'entry_price', 'stop_level', 'quantity', 'updated_at').iterator(chunk_size=2000):
+        stats = trade_stats(trade)
+        for bucket in (daily[(trade.user_id, close_date(trade))], symbols[(trade.user_id, trade.symbol)]):
+            for field in COUNTERS:
+                bucket[field] = bucket.get(field, 0) + stats[field]
+            bucket['best'] = max(bucket.get('best', stats['pnl']), stats['pnl'])
+            bucket['worst'] = min(bucket.get('worst', stats['pnl']), stats['pnl'])
+        count += 1
+
+    with transaction.atomic():
+        for model in (DailySummary, SymbolSummary):
+            qs = model.objects.all() if user is None else model.objects.filter(user=user)
+            qs.delete()
+        DailySummary.objects.bulk_create(
+            DailySummary(user_id=uid, date=day, **values) for (uid, day), values in daily.items()
+        )
+        SymbolSummary.objects.bulk_create(
+            SymbolSummary(user_id=uid, symbol=symbol, **values) for (uid, symbol), values in symbols.items()
+        )
+    return count
+
+
+def _ratios(row):
+    trades = row['trades'] or 0
+    gross_loss = float(row['gross_loss'] or 0)
+    return {
+        'trades': trades,
+        'wins': row['wins'] or 0,
+        'losses': row['losses'] or 0,
+        'pnl': float(row['pnl'] or 0),
+        'win_rate': round((row['wins'] or 0) / trades, 4) if trades else 0.0,
+        'avg_pnl': round(float(row['pnl'] or 0) / trades, 2) if trades else 0.0,
+        'avg_r': round(row['r_total'] / row['r_trades'], 3) if row['r_trades'] else None,
+        'profit_factor': round(float(row['gross_profit'] or 0) / gross_loss, 3) if gross_loss else None,
+        'best': float(row['best']) if row['best'] is not None else None,
+        'worst': float(row['worst']) if row['worst'] is not None else None,
+    }
+
+
+def summarize(user, days=30, top=20):
+    """Totals, per-day rows and top/bottom symbols, read from the summary tables only."""
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    fields = COUNTERS + ('best', 'worst')
+
+    daily_rows = list(DailySummary.objects.filter(user=user, date__range=(start, end)).order_by('date').values('date', *fields))
+    totals = {field: sum(row[field] for row in daily_rows) for field in COUNTERS}
+    totals['best'] = max((row['best'] for row in daily_rows), default=None)
+    totals['worst'] = min((row['worst'] for row in daily_rows), default=None)
+
+    # Equity curve and max drawdown over closed days
+    equity, peak, max_dd, curve = 0.0, 0.0, 0.0, []
+    for row in daily_rows:
+        equity += float(row['pnl'])
+        peak = max(peak, equity)
+        max_dd = max(max_dd, peak - equity)
+        curve.append({'date': row['date'].isoformat(), 'equity': round(equity, 2), **_ratios(row)})
+
+    symbols = SymbolSummary.objects.filter(user=user)
+    by_pnl = lambda qs: [{'symbol': row['symbol'], **_ratios(row)} for row in qs.values('symbol', *fields)]
+
+    lifetime = symbols.aggregate(**{field: Sum(field) for field in COUNTERS}, best=Max('best'), worst=Min('worst'))
+
+    return {
+        'range': {'from': start.isoformat(), 'to': end.isoformat()},
+        'totals': {**_ratios(totals), 'max_drawdown': round(max_dd, 2)},
+        'lifetime': _ratios(lifetime),
+        'daily': curve,
+        'top_symbols': by_pnl(symbols.order_by('-pnl')[:top]),
+        'bottom_symbols': by_pnl(symbols.order_by('pnl')[:top]),
+    }
@@ -3,38 +3,114 @@ import logging
 import time
 import os
 import redis
+import threading
 from datetime import datetime, timedelta
 from tenacity import retry, stop_after_attempt, wait_exponential
 from django.apps import apps
+from django.conf import settings
+from tradeapp.instruments import trading_exchange
 
 logger = logging.getLogger(__name__)
 
-def get_redis_client():
-    redis_url = os.environ.get('REDIS_URL')
-    if redis_url:
-        return redis.from_url(redis_url, decode_responses=True, ssl_cert_reqs=None)
-    else:
-        return redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+_redis_pools = {}
+_redis_pools_lock = threading.Lock()
+
+def _redis_pool(decode_responses):
+    # One tuned pool per process (and per decode mode), shared by every client and thread
+    with _redis_pools_lock:
+        pool = _redis_pools.get(decode_responses)
+        if pool is None:
+            options = dict(
+                decode_responses=decode_responses,
+                max_connections=getattr(settings, 'REDIS_MAX_CONNECTIONS', 20),
+                socket_keepalive=True,
+                socket_connect_timeout=5,
+                health_check_interval=30,
+            )
+            redis_url = os.environ.get('REDIS_URL')
+            if redis_url:
+                if redis_url.startswith('rediss://'):
+                    options['ssl_cert_reqs'] = None
+                pool = redis.ConnectionPool.from_url(redis_url, **options)
+            else:
+                pool = redis.ConnectionPool(host='localhost', port=6379, db=0, **options)
+            _redis_pools[decode_responses] = pool
+        return pool
+
+def get_redis_client(decode_responses=True):
+    # decode_responses=False is for binary payloads (e.g. the reference levels blob)
+    return redis.Redis(connection_pool=_redis_pool(decode_responses))
+
+def create_broker(api_creds):
+    """Returns the order/data client selected by settings.BROKER_BACKEND ('live' or 'paper')."""
+    kwargs = dict(
+        api_key=api_creds.api_key,
+        access_token=api_creds.access_token,
+        refresh_token=api_creds.refresh_token,
+        feed_token=api_creds.feed_token
+    )
+    if getattr(settings, 'BROKER_BACKEND', 'live') == 'paper':
+        from tradeapp.paper_broker import PaperBroker
+        return PaperBroker(**kwargs)
+    from tradeapp.session import get_session
+    from tradeapp.http_pool import start_keepalive
+    from tradeapp.ratelimit import get_quota
+    broker = AngelConnect(**kwargs, session=get_session(), quota=get_quota())
+    start_keepalive(broker.client.root)
+    return broker
 
 class AngelConnect:
-    def __init__(self, api_key, access_token=None, refresh_token=None, feed_token=None):
+    def __init__(self, api_key, access_token=None, refresh_token=None, feed_token=None, session=None, quota=None):
         self.api_key = api_key
-        self.client = smart.SmartConnect(api_key=self.api_key)
+        # SMARTAPI_ROOT lets tests point the client at a local stand-in
+        self.client = smart.SmartConnect(api_key=self.api_key, root=getattr(settings, 'SMARTAPI_ROOT', None))
         self.access_token = access_token
         self.refresh_token = refresh_token
         self.feed_token = feed_token
+        # Shared tokens (tradeapp/session.py); None keeps the standalone behaviour
+        self.session = session
+        self._session_version = 0
+        # Cross-process API budget (tradeapp/ratelimit.py); None leaves calls unpaced
+        self.quota = quota
         if access_token:
             self.client.setAccessToken(access_token)
             self.client.setRefreshToken(refresh_token)
             self.client.setFeedToken(feed_token)
+        self._sync_session()
+
+    def _sync_session(self):
+        # An int compare per call; tokens are swapped only when the shared session moved
+        if self.session is None or self.session.version == self._session_version:
+            return
+        tokens = self.session.tokens
+        if tokens.get('access_token'):
+            self.access_token = tokens['access_token']
+            self.refresh_token = tokens['refresh_token']
+            self.feed_token = tokens['feed_token']
+            self.client.setAccessToken(self.access_token)
+            self.client.setRefreshToken(self.refresh_token)
+            self.client.setFeedToken(self.feed_token)
+        self._session_version = self.session.version
+
+    def _call(self, cls, method, *args):
+        """One SmartAPI call, admitted by the shared quota under priority class `cls`."""
+        if self.quota is not None:
+            self.quota.acquire(cls)
+        return method(*args)
 
     def _refresh_and_save_token(self):
+        if self.session is not None:
+            # One refresh across all processes; whoever holds the lock persists it
+            if self.session.request_refresh(self.access_token):
+                self._sync_session()
+                return True
+            return False
         if not self.refresh_token:
             logger.error("❌ Cannot refresh: No refresh token available.")
             return False
         try:
             logger.info("🔄 Attempting Token Refresh via API...")
-            data = self.client.generateToken(self.refresh_token)
+            data = self._call('session', self.client.generateToken, self.refresh_token)
             is_success = data.get('status', False) or data.get('success', False)
             if is_success:
                 new_access_token = data['data']['jwtToken']
@@ -60,22 +136,24 @@ class AngelConnect:
         return False
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def place_order(self, symbol_token, symbol, quantity, transaction_type, product_type="INTRADAY", order_type="MARKET", price=0.0):
+    def place_order(self, symbol_token, symbol, quantity, transaction_type, product_type="INTRADAY", order_type="MARKET", price=0.0,
+                    exchange=None):
         logger.info(f"📤 Placing Order: {symbol} {transaction_type} {quantity}")
+        self._sync_session()
         try:
             orderparams = {
                 "variety": "NORMAL", "tradingsymbol": symbol, "symboltoken": symbol_token,
-                "transactiontype": transaction_type, "exchange": "NSE", "ordertype": order_type,
+                "transactiontype": transaction_type, "exchange": exchange or trading_exchange(), "ordertype": order_type,
                 "producttype": product_type, "duration": "DAY", 
                 "price": price, "squareoff": "0", "stoploss": "0", "quantity": quantity
             }
             try:
-                oid = self.client.placeOrder(orderparams)
+                oid = self._call('order', self.client.placeOrder, orderparams)
                 logger.info(f"✅ Order ID Recieved: {oid}")
                 return oid
             except Exception as e:
                 if "Invalid Token" in str(e) and self._refresh_and_save_token():
-                    return self.client.placeOrder(orderparams)
+                    return self._call('order', self.client.placeOrder, orderparams)
                 raise e
         except Exception as e:
             logger.error(f"❌ Order Failed: {e}")
@@ -83,10 +161,11 @@ class AngelConnect:
 
     def get_order_status(self, order_id):
         # Implementation remains same as previous, just adding logger if needed
+        self._sync_session()
         try:
-            book = self.client.orderBook()
+            book = self._call('reconcile', self.client.orderBook)
             if not book and self._refresh_and_save_token():
-                 book = self.client.orderBook()
+                 book = self._call('reconcile', self.client.orderBook)
             if not book or 'data' not in book: return None
             for order in book['data']:
                 if order['orderid'] == order_id:
@@ -99,23 +178,46 @@ class AngelConnect:
         except Exception:
             return None
 
+    def get_order_statuses(self, order_ids):
+        """Resolves many orders from a single orderBook call: {order_id: status_dict}."""
+        wanted = set(order_ids)
+        self._sync_session()
+        try:
+            book = self._call('reconcile', self.client.orderBook)
+            if not book and self._refresh_and_save_token():
+                 book = self._call('reconcile', self.client.orderBook)
+            if not book or not book.get('data'): return {}
+            return {
+                order['orderid']: {
+                    'status': order['orderstatus'],
+                    'filled_quantity': int(order.get('filledshares', 0)),
+                    'average_price': float(order.get('averageprice', 0.0)),
+                    'text': order.get('text', '')
+                }
+                for order in book['data'] if order['orderid'] in wanted
+            }
+        except Exception:
+            return {}
+
     def get_historical_data(self, token, interval="ONE_DAY"):
-        # Implementation from previous step (Already has logs)
-        # Re-include it here for completeness if you copy-paste the whole file
+        # Default window: last 10 days up to yesterday's close
+        now = datetime.now()
+        return self.get_candles(token, interval, (now - timedelta(days=10)).date(), (now - timedelta(days=1)).date())
+
+    def get_candles(self, token, interval, from_date, to_date, exchange=None):
+        """Candles for whole sessions from_date..to_date (inclusive dates), getCandleData format."""
+        self._sync_session()
         try:
-            now = datetime.now()
-            from_date = now - timedelta(days=10)
             from_str = from_date.strftime("%Y-%m-%d 09:15")
-            yesterday = now - timedelta(days=1)
-            to_str = yesterday.strftime("%Y-%m-%d 15:30")
-            params = {"exchange": "NSE", "symboltoken": token, "interval": interval, "fromdate": from_str, "todate": to_str}
-            data = self.client.getCandleData(params)
+            to_str = to_date.strftime("%Y-%m-%d 15:30")
+            params = {"exchange": exchange or trading_exchange(), "symboltoken": token, "interval": interval, "fromdate": from_str, "todate": to_str}
+            data = self._call('history', self.client.getCandleData, params)
             
             if not data.get('status') and (data.get('errorcode') == 'AG8001' or 'Invalid Token' in str(data.get('message', ''))):
                 logger.warning(f"⚠️ Token Expired for {token}. Attempting Refresh...")
                 if self._refresh_and_save_token():
-                    data = self.client.getCandleData(params)
+                    data = self._call('history', self.client.getCandleData, params)
             return data['data'] if data and 'data' in data else None
         except Exception as e:
             logger.error(f"History Error {token}: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TradeappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "tradeapp"
+
+    def ready(self):
+        # Registers the Trade signal handlers that invalidate dashboard snapshots
+        from . import dashboard  # noqa: F401
@@ -0,0 +1,243 @@
+"""
+Minute-candle backtester for the PDH Cash Breakout strategy.
+
+Candles are packed once into a column-major block of float64 values held in
+`multiprocessing.shared_memory`, so a pool of sweep workers can attach to the
+same arrays by name instead of receiving a pickled copy each.
+"""
+import itertools
+import logging
+import os
+from array import array
+from collections import namedtuple
+from datetime import datetime
+from math import floor, isnan
+from multiprocessing import Pool, shared_memory
+
+import pytz
+
+from tradeapp.constants import ENTRY_OFFSET_PCT, STOP_OFFSET_PCT, TARGET_R_MULTIPLE, SIGNAL_EXPIRY_MINUTES
+
+logger = logging.getLogger(__name__)
+
+IST = pytz.timezone("Asia/Kolkata")
+
+# Column order inside the shared block
+COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'pdh', 'session_end')
+COL_TS, COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE, COL_PDH, COL_SESSION_END = range(len(COLUMNS))
+NAN = float('nan')
+
+BreakoutParams = namedtuple(
+    'BreakoutParams',
+    ['entry_offset_pct', 'stop_offset_pct', 'target_r', 'expiry_minutes', 'sl_amount']
+)
+
+DEFAULT_PARAMS = BreakoutParams(ENTRY_OFFSET_PCT, STOP_OFFSET_PCT, TARGET_R_MULTIPLE, SIGNAL_EXPIRY_MINUTES, 500.0)
+
+
+def _parse_ts(raw):
+    # SmartAPI candles carry ISO timestamps e.g. "2024-01-05T09:15:00+05:30",
+    # the local history store keeps epoch seconds
+    if isinstance(raw, (int, float)):
+        return datetime.fromtimestamp(raw, IST)
+    return datetime.fromisoformat(str(raw))
+
+
+def pack_candles(candles_by_symbol):
+    """
+    Flattens {symbol: [[ts, o, h, l, c, v], ...]} (getCandleData format) into
+    column arrays. PDH for every row is the high of that symbol's previous
+    session, and `session_end` is the last row index of the same session.
+    Returns (columns, signal_rows), signal rows in time order across symbols.
+    """
+    cols = [array('d') for _ in COLUMNS]
+    signals = array('q')
+
+    for candles in candles_by_symbol.values():
+        sessions = {}
+        for c in candles:
+            ts = _parse_ts(c[0])
+            sessions.setdefault(ts.date(), []).append((ts, float(c[1]), float(c[2]), float(c[3]), float(c[4])))
+
+        prev_high = NAN
+        for day in sorted(sessions):
+            rows = sorted(sessions[day])
+            start = len(cols[COL_TS])
+            end = start + len(rows) - 1
+            for ts, o, h, l, c in rows:
+                idx = len(cols[COL_TS])
+                cols[COL_TS].append(ts.timestamp())
+                cols[COL_OPEN].append(o)
+                cols[COL_HIGH].append(h)
+                cols[COL_LOW].append(l)
+                cols[COL_CLOSE].append(c)
+                cols[COL_PDH].append(prev_high)
+                cols[COL_SESSION_END].append(end)
+                # Signal rule is parameter independent, so detect once here
+                if not isnan(prev_high) and c > o and l < prev_high < c and o < prev_high:
+                    signals.append(idx)
+            prev_high = max(r[2] for r in rows)
+
+    # Rows are grouped by symbol; simulate() walks signals as an equity curve, so it needs them by time
+    signals = array('q', sorted(signals, key=cols[COL_TS].__getitem__))
+    return cols, signals
+
+
+class SharedCandles:
+    """Column-major float64 candle block living in shared memory."""
+
+    def __init__(self, shm, n_rows, n_signals, owner=False):
+        self.shm = shm
+        self.n_rows = n_rows
+        self.n_signals = n_signals
+        self.owner = owner
+        view = shm.buf.cast('d')
+        self.cols = [view[i * n_rows:(i + 1) * n_rows] for i in range(len(COLUMNS))]
+        self.signals = shm.buf[len(COLUMNS) * n_rows * 8:].cast('q')[:n_signals]
+
+    @classmethod
+    def create(cls, cols, signals):
+        n_rows, n_signals = len(cols[0]), len(signals)
+        size = max(1, len(COLUMNS) * n_rows * 8 + n_signals * 8)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        obj = cls(shm, n_rows, n_signals, owner=True)
+        for dst, src in zip(obj.cols, cols):
+            dst[:] = src
+        obj.signals[:] = signals
+        return obj
+
+    @classmethod
+    def attach(cls, name, n_rows, n_signals):
+        return cls(shared_memory.SharedMemory(name=name), n_rows, n_signals)
+
+    @property
+    def spec(self):
+        return (self.shm.name, self.n_rows, self.n_signals)
+
+    def close(self):
+        # memoryviews must be released before the mapping can be closed
+        for col in self.cols:
+            col.release()
+        self.signals.release()
+        self.cols, self.signals = [], None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def simulate(data, params):
+    """
+    Replays every detected signal under one parameter set. Mirrors the live
+    engine: one position per symbol at a time, entry when price trades above
+    `entry_level` within the expiry window, exits on stop, target or session end.
+    Returns a stats dict.
+    """
+    ts, opn, high, low, close, _, session_end = data.cols
+    entry_pct, stop_pct, target_r, expiry_minutes, sl_amount = params
+    expiry_secs = expiry_minutes * 60.0
+
+    pnl_total = 0.0
+    equity_peak = 0.0
+    max_drawdown = 0.0
+    trades = wins = 0
+    r_sum = 0.0
+    busy_until = {}  # session end row -> last row occupied by a signal/position
+
+    for sig in data.signals:
+        last = int(session_end[sig])
+        # Skip signals that fire while the previous position on this session is still live
+        if busy_until.get(last, -1) >= sig:
+            continue
+
+        entry_level = high[sig] * (1.0 + entry_pct)
+        stop_level = low[sig] - low[sig] * stop_pct
+        target_level = entry_level + target_r * (entry_level - stop_level)
+        deadline = ts[sig] + expiry_secs
+
+        i = sig + 1
+        fill = None
+        while i <= last and ts[i] <= deadline:
+            if high[i] > entry_level:
+                fill = max(entry_level, opn[i])
+                break
+            i += 1
+        if fill is None:
+            busy_until[last] = min(i, last)
+            continue
+
+        risk = fill - stop_level
+        qty = floor(sl_amount / risk) if risk > 0 else 0
+        if qty <= 0:
+            busy_until[last] = i
+            continue
+
+        exit_price = close[last]
+        j = i
+        while j <= last:
+            # Stop is checked before target: assume the worst when both print in one bar
+            if low[j] <= stop_level:
+                exit_price = min(stop_level, opn[j]) if j > i else stop_level
+                break
+            if high[j] >= target_level:
+                exit_price = max(target_level, opn[j]) if j > i else target_level
+                break
+            j += 1
+        busy_until[last] = min(j, last)
+
+        pnl = qty * (exit_price - fill)
+        trades += 1
+        wins += pnl > 0
+        r_sum += (exit_price - fill) / risk
+        pnl_total += pnl
+        equity_peak = max(equity_peak, pnl_total)
+        max_drawdown = max(max_drawdown, equity_peak - pnl_total)
+
+    return {
+        'pnl': round(pnl_total, 2),
+        'trades': trades,
+        'win_rate': round(wins / trades, 4) if trades else 0.0,
+        'avg_r': round(r_sum / trades, 4) if trades else 0.0,
+        'max_drawdown': round(max_drawdown, 2),
+    }
+
+
+# --- Process pool plumbing -------------------------------------------------
+
+_worker_data = None
+
+
+def _init_worker(spec):
+    global _worker_data
+    _worker_data = SharedCandles.attach(*spec)
+
+
+def _run_chunk(chunk):
+    return [(params, simulate(_worker_data, params)) for params in chunk]
+
+
+def param_grid(entry_offsets, stop_offsets, target_rs, expiries, sl_amounts):
+    return [BreakoutParams(*combo) for combo in itertools.product(entry_offsets, stop_offsets, target_rs, expiries, sl_amounts)]
+
+
+def sweep(candles_by_symbol, grid, processes=None, chunk_size=None, rank_by='pnl'):
+    """
+    Evaluates every BreakoutParams in `grid` on a process pool sharing one
+    packed copy of the candles. Returns [(params, stats), ...] best first.
+    """
+    cols, signals = pack_candles(candles_by_symbol)
+    logger.info(f"📦 Packed {len(cols[0])} candles, {len(signals)} signals for {len(grid)} combinations")
+
+    data = SharedCandles.create(cols, signals)
+    processes = processes or os.cpu_count() or 1
+    # A few chunks per worker keeps the pool balanced without per-task overhead dominating
+    chunk_size = chunk_size or max(1, len(grid) // (processes * 4))
+    chunks = [grid[i:i + chunk_size] for i in range(0, len(grid), chunk_size)]
+
+    try:
+        with Pool(processes, initializer=_init_worker, initargs=(data.spec,)) as pool:
+            results = [row for part in pool.imap_unordered(_run_chunk, chunks) for row in part]
+    finally:
+        data.close()
+
+    results.sort(key=lambda r: r[1][rank_by], reverse=rank_by != 'max_drawdown')
+    return results
@@ -0,0 +1,551 @@
+"""
+Micro-benchmarks for the tick, candle and signal hot paths.
+
+Everything runs against `InMemoryRedis`, a single-process stand-in for the
+subset of redis-py the engines use, and a synthetic tick generator, so the
+numbers measure our code rather than the network. Algo engine benchmarks run
+inside a transaction that is rolled back, leaving the database untouched.
+"""
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from tradeapp.candles import CandleBuilder, encode_candle, decode_candle, LIVE_OHLC_KEY
+from tradeapp.constants import FINAL_DICTIONARY_OBJECT
+
+PREV_DAY_HASH = "prev_day_ohlc"
+
+
+class InMemoryRedis:
+    """Minimal decode_responses=True redis-py lookalike (strings, bitmaps, hashes, streams, pipelines)."""
+
+    def __init__(self):
+        self.kv = {}
+        self.hashes = {}
+        self.streams = {}
+        self.stream_ids = {}  # arrival order, so a group read is a slice rather than a scan
+        self.groups = {}
+        self._seq = itertools.count()
+
+    # strings
+    def get(self, key):
+        return self.kv.get(key)
+
+    def set(self, key, value, **kwargs):
+        self.kv[key] = value if isinstance(value, bytes) else str(value)
+        return True
+
+    def setbit(self, key, offset, value):
+        bits = self.kv.setdefault(key, bytearray())
+        byte, mask = offset >> 3, 0x80 >> (offset & 7)
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        old = int(bool(bits[byte] & mask))
+        bits[byte] = bits[byte] | mask if value else bits[byte] & ~mask & 0xFF
+        return old
+
+    def expire(self, key, seconds):
+        return True
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.kv.pop(key, None)
+            self.hashes.pop(key, None)
+            self.streams.pop(key, None)
+            self.stream_ids.pop(key, None)
+
+    # hashes
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.hashes.setdefault(key, {})
+        if field is not None:
+            h[field] = str(value)
+        if mapping:
+            h.update({k: str(v) for k, v in mapping.items()})
+        return 1
+
+    def hmget(self, key, fields):
+        h = self.hashes.get(key, {})
+        return [h.get(f) for f in fields]
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    # streams
+    def xadd(self, key, fields, id='*', **kwargs):
+        msg_id = f"{int(time.time() * 1000)}-{next(self._seq)}" if id == '*' else id
+        self.streams.setdefault(key, OrderedDict())[msg_id] = dict(fields)
+        self.stream_ids.setdefault(key, []).append(msg_id)
+        return msg_id
+
+    def xgroup_create(self, key, group, id='$', mkstream=False):
+        stream = self.streams.setdefault(key, OrderedDict())
+        if id == '$':
+            cursor = len(stream)
+        else:
+            # Entries strictly after `id` are delivered
+            after = tuple(int(x) for x in (id.split('-') + ['0'])[:2])
+            cursor = sum(1 for i in stream if tuple(map(int, i.split('-'))) <= after)
+        self.groups[(key, group)] = {'cursor': cursor, 'pending': set()}
+        return True
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None, **kwargs):
+        out = []
+        for key in streams:
+            state = self.groups[(key, group)]
+            ids = self.stream_ids.get(key, [])
+            batch = ids[state['cursor']:state['cursor'] + count if count else None]
+            state['cursor'] += len(batch)
+            state['pending'].update(batch)
+            if batch:
+                out.append([key, [(i, self.streams[key][i]) for i in batch]])
+        return out
+
+    def xack(self, key, group, *ids):
+        pending = self.groups[(key, group)]['pending']
+        before = len(pending)
+        pending.difference_update(ids)
+        return before - len(pending)
+
+    def xautoclaim(self, key, group, consumer, min_idle_time, start_id='0-0', count=None, **kwargs):
+        # Deliveries are never orphaned in a single process
+        return ['0-0', [], []]
+
+    def xlen(self, key):
+        return len(self.streams.get(key, ()))
+
+    def publish(self, channel, message):
+        return 0
+
+
+class InMemoryPipeline:
+    """Queues commands and runs them on execute(), like a redis-py pipeline."""
+
+    def __init__(self, r):
+        self.r = r
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((getattr(self.r, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        queued, self.queued = self.queued, []
+        return [command(*args, **kwargs) for command, args, kwargs in queued]
+
+
+class CountingRedis:
+    """Wraps a client and counts commands, i.e. network round trips on a real server."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+        return call
+
+
+def universe(n_tokens):
+    """The real symbol list padded with synthetic symbols up to n_tokens: {token: symbol}."""
+    items = list(FINAL_DICTIONARY_OBJECT.items())[:n_tokens]
+    items += [(f"SYN{i}-EQ", str(900000 + i)) for i in range(n_tokens - len(items))]
+    return {str(token): symbol for symbol, token in items}
+
+
+def synthetic_ticks(tokens, ticks_per_token, seed=7):
+    """Interleaved quote-mode ticks for every token: list of SmartWebSocketV2-shaped dicts."""
+    rng = random.Random(seed)
+    prices = {t: rng.uniform(50, 3000) for t in tokens}
+    volume = dict.fromkeys(tokens, 0)
+    ticks = []
+    for _ in range(ticks_per_token):
+        for t in tokens:
+            prices[t] *= 1.0 + rng.gauss(0, 0.0005)
+            volume[t] += rng.randint(1, 500)
+            ticks.append({'token': t, 'last_traded_price': round(prices[t], 2), 'vol_traded': volume[t]})
+    return ticks
+
+
+def minute_labels(n):
+    start = datetime(2024, 1, 1, 9, 15)
+    return [(start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:00+0530') for i in range(n)]
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+# --- Data engine -------------------------------------------------------------
+
+def bench_on_data(n_tokens, minutes=3, ticks_per_token=20):
+    token_map = universe(n_tokens)
+    ticks = synthetic_ticks(list(token_map), ticks_per_token)
+    labels = minute_labels(minutes + 1)
+    clock_state = {'label': labels[0]}
+    builder = CandleBuilder(InMemoryRedis(), token_map, clock=lambda: clock_state['label'], log_candles=False)
+
+    def run():
+        for label in labels:
+            clock_state['label'] = label
+            for tick in ticks:
+                builder.on_tick(tick)
+
+    elapsed = _timed(run)
+    total = len(ticks) * len(labels)
+    return {'ticks': total, 'seconds': elapsed, 'ticks_per_sec': total / elapsed}
+
+
+def bench_flush_candle(n_tokens, minutes=3):
+    token_map = universe(n_tokens)
+    builder = CandleBuilder(InMemoryRedis(), token_map, log_candles=False)
+    candles = [{'open': 100.0, 'high': 101.0, 'low': 99.5, 'close': 100.5, 'volume': 1000, 'ts': label}
+               for label in minute_labels(minutes)]
+
+    def run():
+        for candle in candles:
+            for token in token_map:
+                builder.flush_candle(token, candle)
+
+    elapsed = _timed(run)
+    total = len(token_map) * minutes
+    return {'candles': total, 'seconds': elapsed, 'candles_per_sec': total / elapsed,
+            'ms_per_minute_batch': elapsed / minutes * 1000.0}
+
+
+def bench_codec(n=20000):
+    payload = {"symbol": "RELIANCE-EQ", "token": "2885", "open": 2501.5, "high": 2510.0, "low": 2499.1,
+               "close": 2507.25, "volume": 123456.0, "ts": minute_labels(1)[0]}
+    encoded = encode_candle(payload)
+    enc = _timed(lambda: [encode_candle(payload) for _ in range(n)])
+    dec = _timed(lambda: [decode_candle(encoded) for _ in range(n)])
+    return {'encode_per_sec': n / enc, 'decode_per_sec': n / dec, 'encoded_bytes': len(json.dumps(encoded))}
+
+
+# --- Algo engine -------------------------------------------------------------
+
+def _make_client(r):
+    from datetime import time as dtime
+    from django.contrib.auth.models import User
+    from tradeapp.models import APICredential
+    from tradeapp.management.commands.run_algo_engine import CashBreakoutClient
+
+    user = User.objects.create(username=f"bench-{time.time_ns()}")
+    creds = APICredential.objects.create(user=user, api_key="bench", client_code="bench")
+    client = CashBreakoutClient(user, creds, redis_client=r)
+    # Benchmarks run at any hour and should never be capped by risk limits
+    client.risk.start_time, client.risk.end_time = dtime.min, dtime.max
+    client.risk.max_total_trades = 10 ** 9
+    return client
+
+
+def bench_algo_minute(n_tokens, signal_rate=0.05, loops=20, seed=11):
+    """
+    Cost of evaluating one minute batch of candles (_process_candle) and of one
+    pending-entry pass (_try_enter_pending) with the resulting watch list.
+    """
+    from django.db import transaction
+    from django.test import override_settings
+
+    rng = random.Random(seed)
+    r = InMemoryRedis()
+    token_map = universe(n_tokens)
+    candles, snapshot = [], {}
+    for token, symbol in token_map.items():
+        low = rng.uniform(50, 3000)
+        high, open_, close = low * 1.01, low * 1.002, low * 1.008
+        # A breakout candle straddles PDH; the rest sit entirely above it
+        pdh = low * 1.005 if rng.random() < signal_rate else low * 0.9
+        r.hset(PREV_DAY_HASH, symbol, json.dumps({'high': pdh, 'low': pdh * 0.98, 'close': pdh * 0.99}))
+        candles.append({"symbol": symbol, "token": token, "open": open_, "high": high, "low": low,
+                        "close": close, "volume": 1000, "ts": minute_labels(1)[0]})
+        snapshot[symbol] = {"ltp": close, "high": high, "low": low}  # below entry: nothing fires
+    r.set(LIVE_OHLC_KEY, json.dumps(snapshot))
+
+    result = {}
+    with override_settings(BROKER_BACKEND='paper'), transaction.atomic():
+        client = _make_client(r)
+        # Includes the batch's journal flush (signal rows and events)
+        result['process_candle_ms_per_minute'] = _timed(lambda: ([client._process_candle(c) for c in candles],
+                                                                 client._flush_journal())) * 1000.0
+        result['signals'] = len(client.pending_trades)
+        per_pass = _timed(lambda: [client._try_enter_pending() for _ in range(loops)]) / loops
+        result['try_enter_pending_ms_per_pass'] = per_pass * 1000.0
+        # The consumer loop blocks up to 1s per xreadgroup, so an idle minute runs ~60 passes
+        result['try_enter_pending_ms_per_minute'] = per_pass * 60 * 1000.0
+        transaction.set_rollback(True)
+    return result
+
+
+def bench_position_memory(n=1000):
+    """Bytes per watched symbol: Trade model instance vs Position."""
+    import tracemalloc
+    from decimal import Decimal
+    from django.utils import timezone
+    from tradeapp.models import Trade
+    from tradeapp.positions import Position
+
+    now = timezone.now()
+    rows = [dict(id=i, user_id=1, symbol=f"SYM{i}-EQ", token=str(i), candle_ts=now, candle_open=100.2,
+                 candle_high=101.0, candle_low=100.0, candle_close=100.8, prev_day_high=100.5,
+                 entry_level=101.01, stop_level=99.98, target_level=103.6, status='PENDING',
+                 created_at=now, updated_at=now) for i in range(n)]
+    # Fresh Decimals per instance, as a DB load produces
+    load = lambda: [Trade(**{k: Decimal(f"{v:.2f}") if isinstance(v, float) else v for k, v in r.items()}) for r in rows]
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del kept
+        return used / n
+
+    trade_bytes = measure(load)
+    trades = load()
+    position_bytes = measure(lambda: [Position.from_trade(t) for t in trades])
+    return {'trade_bytes_per_symbol': trade_bytes, 'position_bytes_per_symbol': position_bytes}
+
+
+def bench_consumer_round_trips(n_tokens, signal_rate=0.05, seed=13):
+    """
+    Redis commands the algo consumer loop issues to drain one minute of candles
+    (adaptively sized XREADGROUPs, one HMGET and one pipelined SETBIT + XACK per
+    batch, a pending pass once caught up), and per idle loop iteration once the
+    stream is empty. The first minute only warms the batch sizing; the second
+    is measured.
+    """
+    from django.db import transaction
+    from django.test import override_settings
+    from tradeapp.management.commands.run_algo_engine import CANDLE_STREAM_KEY
+
+    rng = random.Random(seed)
+    r = CountingRedis(InMemoryRedis())
+    symbols = universe(n_tokens)
+    lows = {}
+    for token, symbol in symbols.items():
+        lows[token] = low = rng.uniform(50, 3000)
+        pdh = low * 1.005 if rng.random() < signal_rate else low * 0.9
+        r.inner.hset(PREV_DAY_HASH, symbol, json.dumps({'high': pdh}))
+    r.inner.set(LIVE_OHLC_KEY, json.dumps({}))
+
+    def publish(label):
+        for token, symbol in symbols.items():
+            low = lows[token]
+            r.inner.xadd(CANDLE_STREAM_KEY, encode_candle({"symbol": symbol, "token": token, "open": low * 1.002,
+                                                           "high": low * 1.01, "low": low, "close": low * 1.008,
+                                                           "volume": 1000, "ts": label}))
+
+    def drain(client):
+        # Same per-iteration work as CashBreakoutClient.run(), minus the timer-driven passes
+        iterations = 0
+        while True:
+            consumed = client._consume_batch(block=None)
+            if client.caught_up:
+                client.caught_up = False
+                client._try_enter_pending()
+            iterations += 1
+            if not consumed:
+                return iterations
+
+    result = {}
+    first, second = minute_labels(2)
+    with override_settings(BROKER_BACKEND='paper'), transaction.atomic():
+        client = _make_client(r)
+        publish(first)
+        drain(client)
+        publish(second)
+        r.calls.clear()
+        iterations = drain(client)
+        result['drain_iterations'] = iterations
+        result['drain_round_trips'] = sum(r.calls.values())
+        result['drain_by_command'] = dict(r.calls)
+        result['batch_size'] = client.batch_size
+        r.calls.clear()
+        # Idle: one blocking read, and the once-a-second pending timer
+        client._consume_batch(block=None)
+        client._try_enter_pending()
+        result['idle_round_trips_per_iteration'] = sum(r.calls.values())
+        # ~60 one-second blocking reads per minute, the first few busy
+        result['round_trips_per_minute'] = result['drain_round_trips'] + max(0, 60 - iterations) * result['idle_round_trips_per_iteration']
+        transaction.set_rollback(True)
+    return result
+
+
+def bench_signal_latency(n_tokens, rtt_ms=0.3, batch=100):
+    """
+    Hand-off cost of one minute of sealed candles from the data engine to the
+    algo engine: the Redis stream path (encode, XADD, batched XREADGROUP,
+    decode, XACK) against the co-located shared-memory ring (publish, read).
+    Redis is in-process here, so `stream_modeled_ms` adds `rtt_ms` per command
+    to approximate a real server; the ring has no round trips.
+    """
+    from tradeapp.management.commands.run_algo_engine import CANDLE_STREAM_KEY
+    from tradeapp.shm_ring import CandleRing
+
+    token_map = universe(n_tokens)
+    label = minute_labels(1)[0]
+    candles = [(token, {"symbol": symbol, "token": token, "open": 100.2, "high": 101.0, "low": 100.0,
+                        "close": 100.8, "volume": 1000, "ts": label}) for token, symbol in token_map.items()]
+
+    r = CountingRedis(InMemoryRedis())
+    r.inner.xgroup_create(CANDLE_STREAM_KEY, "bench_group", id="$", mkstream=True)
+
+    def stream_path():
+        for _, data in candles:
+            r.xadd(CANDLE_STREAM_KEY, encode_candle(data))
+        while True:
+            messages = r.xreadgroup("bench_group", "bench", {CANDLE_STREAM_KEY: '>'}, count=batch)
+            if not messages:
+                break
+            ids = [msg_id for msg_id, fields in messages[0][1] if decode_candle(fields)]
+            r.xack(CANDLE_STREAM_KEY, "bench_group", *ids)
+
+    ring = CandleRing.create(token_map, name=f"bench_ring_{time.time_ns()}", capacity=max(1024, 2 * n_tokens))
+    reader = ring.reader()
+    received = []
+
+    def ring_path():
+        for token, data in candles:
+            ring.publish(token, data)
+        while True:
+            got = reader.read(batch)
+            if not got:
+                break
+            received.extend(got)
+
+    try:
+        stream_secs = _timed(stream_path)
+        ring_secs = _timed(ring_path)
+    finally:
+        ring.close()
+    assert len(received) == len(candles)
+
+    round_trips = sum(r.calls.values())
+    return {
+        'candles': len(candles),
+        'stream_ms': stream_secs * 1000.0,
+        'stream_round_trips': round_trips,
+        'stream_modeled_ms': stream_secs * 1000.0 + round_trips * rtt_ms,
+        'ring_ms': ring_secs * 1000.0,
+        'rtt_ms': rtt_ms,
+    }
+
+
+def bench_catch_up(n_tokens, backlog_minutes=60, signal_rate=0.05, seed=17):
+    """
+    Restart after `backlog_minutes` of downtime: the previous behaviour (group
+    at '0', drained CONSUMER_BATCH at a time with every candle evaluated)
+    against _catch_up() (CATCHUP_BATCH reads, stale candles skipped).
+    """
+    from django.db import transaction
+    from django.test import override_settings
+    from tradeapp.management.commands.run_algo_engine import CANDLE_STREAM_KEY
+
+    rng = random.Random(seed)
+    token_map = universe(n_tokens)
+    now_ms = int(time.time() * 1000)
+
+    def backlog():
+        r = InMemoryRedis()
+        lows = {}
+        for token, symbol in token_map.items():
+            lows[token] = low = rng.uniform(50, 3000)
+            pdh = low * 1.005 if rng.random() < signal_rate else low * 0.9
+            r.hset(PREV_DAY_HASH, symbol, json.dumps({'high': pdh}))
+        seq = itertools.count()
+        labels = minute_labels(backlog_minutes)
+        for minute in range(backlog_minutes, 0, -1):
+            for token, symbol in token_map.items():
+                low = lows[token]
+                r.xadd(CANDLE_STREAM_KEY, encode_candle({"symbol": symbol, "token": token, "open": low * 1.002,
+                                                         "high": low * 1.01, "low": low, "close": low * 1.008,
+                                                         "volume": 1000, "ts": labels[-minute]}),
+                       id=f"{now_ms - minute * 60000}-{next(seq)}")
+        return r
+
+    result = {'backlog_candles': backlog_minutes * n_tokens}
+    with override_settings(BROKER_BACKEND='paper'), transaction.atomic():
+        r = backlog()
+        client = _make_client(r)
+        r.groups[(CANDLE_STREAM_KEY, client.group_name)]['cursor'] = 0  # as if created at '0'
+        started = time.perf_counter()
+        while client._consume_batch(block=None):
+            pass
+        result['replay_all_seconds'] = time.perf_counter() - started
+        result['replay_all_signals'] = len(client.pending_trades)
+
+        r = backlog()
+        client = _make_client(r)
+        r.groups[(CANDLE_STREAM_KEY, client.group_name)]['cursor'] = 0  # worst case: stale checkpoint
+        started = time.perf_counter()
+        client._catch_up()
+        result['catch_up_seconds'] = time.perf_counter() - started
+        result['catch_up_signals'] = len(client.pending_trades)
+        transaction.set_rollback(True)
+    return result
+
+
+def bench_indicators(n_tokens, minutes=60, seed=19):
+    """IndicatorBook.update() per minute batch of the whole universe, after `minutes` of history."""
+    from tradeapp.indicators import IndicatorBook
+
+    rng = random.Random(seed)
+    token_map = universe(n_tokens)
+    book = IndicatorBook(token_map)
+    prices = {token: rng.uniform(50, 3000) for token in token_map}
+    batches = []
+    for label in minute_labels(minutes):
+        batch = []
+        for token, symbol in token_map.items():
+            o = prices[token]
+            c = prices[token] = o * (1.0 + rng.gauss(0, 0.002))
+            batch.append({"symbol": symbol, "token": token, "open": o, "high": max(o, c) * 1.001,
+                          "low": min(o, c) * 0.999, "close": c, "volume": rng.randint(100, 5000), "ts": label})
+        batches.append(batch)
+    elapsed = _timed(lambda: [book.update(batch) for batch in batches])
+    return {'candles': n_tokens * minutes, 'ms_per_minute_batch': elapsed / minutes * 1000.0,
+            'us_per_candle': elapsed / (n_tokens * minutes) * 1e6}
+
+
+def run_all(token_counts=(450, 1000, 5000), minutes=3, ticks_per_token=20):
+    quiet = [logging.getLogger(name) for name in ('algo_engine', 'data_engine')]
+    levels = [lg.level for lg in quiet]
+    for lg in quiet:
+        lg.setLevel(logging.WARNING)
+    try:
+        results = {'codec': bench_codec(), 'positions': bench_position_memory(), 'universes': {}}
+        for n in token_counts:
+            results['universes'][str(n)] = {
+                'on_data': bench_on_data(n, minutes, ticks_per_token),
+                'flush_candle': bench_flush_candle(n, minutes),
+                'algo_minute': bench_algo_minute(n),
+                'consumer_round_trips': bench_consumer_round_trips(n),
+                'signal_latency': bench_signal_latency(n),
+                'catch_up': bench_catch_up(n),
+                'indicators': bench_indicators(n),
+            }
+        return results
+    finally:
+        for lg, level in zip(quiet, levels):
+            lg.setLevel(level)
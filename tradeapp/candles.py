@@ -0,0 +1,228 @@
+"""
+Tick -> 1 minute candle aggregation and the candle stream wire format.
+
+Shared by the data engine (producer), the algo engine (consumer) and the
+benchmark suite, so all three exercise exactly the same code.
+
+A candle's identity is (token, minute). The producer refuses to publish a
+token's minute twice (CANDLE_EMITTED_KEY remembers the last minute per token
+across reconnects and restarts), and the consumer marks each (token, minute)
+it evaluates in a per-day bitmap (`ProcessedCandles`), so a redelivered or
+replayed stream entry is dropped without a database lookup.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import pytz
+from django.conf import settings
+
+from tradeapp.profiling import timed
+from tradeapp.metrics import registry
+
+logger = logging.getLogger('data_engine')
+
+IST = pytz.timezone("Asia/Kolkata")
+CANDLE_STREAM_KEY = getattr(settings, "BREAKOUT_CANDLE_STREAM", "candle_1m")
+LIVE_OHLC_KEY = getattr(settings, "BREAKOUT_LIVE_OHLC_KEY", "live_ohlc_data")
+CANDLE_EMITTED_KEY = "candle_emitted"  # token -> last minute label published
+MINUTES_PER_DAY = 1440
+PROCESSED_TTL_SECS = 2 * 86400
+
+
+def encode_candle(payload):
+    return {'data': json.dumps(payload)}
+
+
+def decode_candle(fields):
+    return json.loads(fields['data'])
+
+
+def current_minute():
+    return datetime.now(IST).strftime('%Y-%m-%d %H:%M:00%z')
+
+
+@lru_cache(maxsize=64)
+def minute_epoch(label):
+    """Epoch seconds of a candle's minute label (a batch shares one label, so this is a cache hit)."""
+    return int(datetime.strptime(label, '%Y-%m-%d %H:%M:00%z').timestamp())
+
+
+@lru_cache(maxsize=64)
+def minute_label(epoch):
+    return datetime.fromtimestamp(epoch, IST).strftime('%Y-%m-%d %H:%M:00%z')
+
+
+def candle_minute(label):
+    """('YYYY-MM-DD', minute of day) of a '%Y-%m-%d %H:%M:00%z' label, without strptime."""
+    return label[:10], int(label[11:13]) * 60 + int(label[14:16])
+
+
+class ProcessedCandles:
+    """
+    Per-day bitmap of the (token, minute) candles an algo engine has evaluated.
+
+    Bit `universe position * 1440 + minute of day` of the Redis string
+    `{prefix}:{universe fingerprint}:{day}` (SETBIT's bit order), mirrored in
+    a local bytearray: 1440 bits per token, about 900 KB a day for 5000
+    tokens. The fingerprint hashes the universe's token order, so a restart
+    after the universe changed (refresh_instruments, TRADING_UNIVERSE) starts
+    a fresh bitmap instead of reading other tokens' bits. The day's bitmap is
+    read once; new bits are written by `save()` into the caller's pipeline, so
+    they go out with the batch's XACK. A candle from the next day saves what
+    is still unsaved of the old one before its bitmap is dropped.
+    """
+
+    def __init__(self, r, prefix, token_map):
+        self.r = r  # decode_responses=False: the bitmap is binary
+        self.index = {token: i for i, token in enumerate(token_map)}
+        fingerprint = hashlib.blake2b("\n".join(token_map).encode(), digest_size=6).hexdigest()
+        self.prefix = f"{prefix}:{fingerprint}"
+        self.day = None
+        self.bits = bytearray()
+        self.unsaved = []
+
+    def _load(self, day):
+        if self.unsaved:
+            # Left unsaved, the last minutes before midnight would be evaluated again after a restart
+            self.save(self.r.pipeline(transaction=False)).execute()
+        raw = self.r.get(f"{self.prefix}:{day}")
+        self.day = day
+        self.bits = bytearray(raw or b'')
+        self.unsaved = []
+
+    def mark(self, candle):
+        """Marks the candle processed. False if it already was (or its day's bitmap says so)."""
+        i = self.index.get(candle['token'])
+        if i is None:
+            return True  # outside the universe: nothing to key it by
+        day, minute = candle_minute(candle['ts'])
+        if day != self.day:
+            self._load(day)
+        offset = i * MINUTES_PER_DAY + minute
+        byte, mask = offset >> 3, 0x80 >> (offset & 7)
+        bits = self.bits
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        elif bits[byte] & mask:
+            return False
+        bits[byte] |= mask
+        self.unsaved.append(offset)
+        return True
+
+    def unmark(self, candle):
+        i = self.index.get(candle['token'])
+        if i is None:
+            return
+        offset = i * MINUTES_PER_DAY + candle_minute(candle['ts'])[1]
+        self.bits[offset >> 3] &= ~(0x80 >> (offset & 7)) & 0xFF
+        self.unsaved.remove(offset)
+
+    def save(self, pipe):
+        """Queues SETBITs for everything marked since the last save onto `pipe`."""
+        if self.unsaved:
+            key = f"{self.prefix}:{self.day}"
+            for offset in self.unsaved:
+                pipe.setbit(key, offset, 1)
+            pipe.expire(key, PROCESSED_TTL_SECS)
+            self.unsaved = []
+        return pipe
+
+
+class CandleBuilder:
+    """
+    Folds websocket ticks into per-token minute candles and publishes each
+    candle to the stream plus the live LTP snapshot when its minute rolls over.
+    """
+
+    def __init__(self, r, token_map, clock=current_minute, log_candles=True, ring=None):
+        self.r = r
+        self.token_map = token_map
+        self.clock = clock
+        self.log_candles = log_candles
+        self.candle_buffer = {}
+        # Last minute published per token, shared by every session of the producer
+        self.emitted = r.hgetall(CANDLE_EMITTED_KEY) or {}
+        # Co-located mode: a tradeapp.shm_ring.CandleRing the algo engine reads directly
+        self.ring = ring
+
+    @timed()
+    def flush_candle(self, token, data):
+        start = time.perf_counter()
+        # A reconnect or restart can seal a minute that already went out
+        if self.emitted.get(token, '') >= data['ts']:
+            registry.inc('candles_duplicate_total')
+            return
+        symbol = self.token_map.get(token, token)
+        payload = {
+            "symbol": symbol, "token": token, "open": data['open'],
+            "high": data['high'], "low": data['low'], "close": data['close'],
+            "volume": data['volume'], "ts": data['ts']
+        }
+        if self.ring is not None:
+            self.ring.publish(token, data)
+
+        # Push to Stream (in co-located mode only for durability and replay), same round trip as the dedupe mark
+        pipe = self.r.pipeline(transaction=False)
+        pipe.xadd(CANDLE_STREAM_KEY, encode_candle(payload))
+        pipe.hset(CANDLE_EMITTED_KEY, token, data['ts'])
+        pipe.execute()
+        # Only once it is out: if Redis failed, the next tick retries this candle
+        self.emitted[token] = data['ts']
+
+        # Update Snapshot
+        current_snapshot = self.r.get(LIVE_OHLC_KEY)
+        snapshot_dict = json.loads(current_snapshot) if current_snapshot else {}
+        snapshot_dict[symbol] = {"ltp": data['close'], "high": data['high'], "low": data['low']}
+        self.r.set(LIVE_OHLC_KEY, json.dumps(snapshot_dict))
+        registry.inc('candles_emitted_total')
+        registry.observe('flush_candle_seconds', time.perf_counter() - start)
+
+        # LOGGING: Show activity (Critical for debugging)
+        if self.log_candles:
+            logger.info(f"🕯️ CANDLE: {symbol} | Time: {data['ts']} | Close: {data['close']}")
+
+    @timed()
+    def on_tick(self, message):
+        token = message.get('token')
+        if token not in self.token_map: return
+        registry.inc('ticks_received_total')
+
+        ltp = float(message.get('last_traded_price', 0))
+        daily_vol = float(message.get('vol_traded', 0))
+
+        if ltp == 0: return
+
+        current_min = self.clock()
+        candle_buffer = self.candle_buffer
+
+        if token not in candle_buffer:
+            candle_buffer[token] = {
+                'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp,
+                'volume': daily_vol, 'ts': current_min, 'start_vol': daily_vol
+            }
+
+        candle = candle_buffer[token]
+
+        # Minute Change Detection
+        if candle['ts'] != current_min:
+            prev_candle = candle.copy()
+            prev_candle['volume'] = daily_vol - candle['start_vol']
+            self.flush_candle(token, prev_candle)
+
+            # Reset for new minute
+            candle_buffer[token] = {
+                'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp,
+                'volume': daily_vol, 'ts': current_min, 'start_vol': daily_vol
+            }
+        else:
+            # Update High/Low/Close
+            candle['high'] = max(candle['high'], ltp)
+            candle['low'] = min(candle['low'], ltp)
+            candle['close'] = ltp
+            if self.ring is not None:
+                # Tick-fresh LTP for the co-located algo engine (Redis only sees closes)
+                self.ring.set_ltp(token, ltp, candle['high'], candle['low'])
@@ -92,4 +92,15 @@ FINAL_DICTIONARY_OBJECT = {
     'WELCORP-EQ': '11821', 'WESTLIFE-EQ': '11580', 'WHIRLPOOL-EQ': '18011', 'WIPRO-EQ': '3787',
     'WOCKPHARMA-EQ': '7506', 'YESBANK-EQ': '11915', 'ZEEL-EQ': '3812', 'ZENSARTECH-EQ': '1076',
     'ZENTEC-EQ': '7508'
-}
\ No newline at end of file
+}
+
+# Named universes (lists of NSE symbols) for tradeapp.instruments; anything else is an EXCHANGE[:SEGMENT] spec
+UNIVERSES = {
+    'breakout': tuple(FINAL_DICTIONARY_OBJECT),
+}
+
+# Breakout Strategy Parameters (shared by the live engine and the backtester)
+ENTRY_OFFSET_PCT = 0.0001
+STOP_OFFSET_PCT = 0.0002
+TARGET_R_MULTIPLE = 2.5
+SIGNAL_EXPIRY_MINUTES = 6
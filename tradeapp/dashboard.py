@@ -0,0 +1,181 @@
+"""
+Per-user dashboard snapshot cached in Redis.
+
+The JSON feed polled by the dashboard is built once per change instead of
+once per poll. Snapshots live under a generation number:
+
+    dashboard:{user_id}:gen          INCR'd on every Trade change
+    dashboard:{user_id}:{gen}        hash {etag, body}, expires after DASHBOARD_CACHE_TTL
+
+Bumping the generation (rather than deleting the snapshot) means a poll that
+read the DB just before a change can only store its stale result under the
+old generation, which nobody reads again. The ETag is a digest of the body,
+so a rebuild with identical content still answers 304.
+
+Every change is also published as a delta on `dashboard_events:{user_id}`
+for the server-push stream.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Trade
+
+logger = logging.getLogger(__name__)
+
+GEN_KEY = "dashboard:{user_id}:gen"
+SNAPSHOT_KEY = "dashboard:{user_id}:{gen}"
+EVENTS_CHANNEL = "dashboard_events:{user_id}"
+CACHE_TTL = getattr(settings, 'DASHBOARD_CACHE_TTL', 300)
+
+OPEN_STATUSES = ['OPEN', 'PENDING_EXIT']
+HISTORY_STATUSES = ['CLOSED', 'EXPIRED', 'CANCELLED', 'FAILED_ENTRY']
+
+
+def _redis():
+    from .angel_utils import get_redis_client
+    return get_redis_client()
+
+
+def fmt_date(dt):
+    return dt.strftime('%H:%M') if dt else '--'
+
+
+def scanner_row(t):
+    return {
+        'id': t.id,
+        'ts': fmt_date(t.candle_ts),
+        'symbol': t.symbol,
+        'pdh': float(t.prev_day_high or 0),
+        'range': f"{float(t.candle_low or 0)} - {float(t.candle_high or 0)}",
+        'level': float(t.entry_level),
+        'status': 'Watching'
+    }
+
+
+def position_row(t):
+    return {
+        'id': t.id,
+        'symbol': t.symbol,
+        'qty': t.quantity,
+        'entry': float(t.entry_price or 0),
+        'stop': float(t.stop_level),
+        'target': float(t.target_level),
+        'status': t.status
+    }
+
+
+def history_row(t):
+    return {
+        'id': t.id,
+        'time': fmt_date(t.updated_at),
+        'symbol': t.symbol,
+        'status': t.status,
+        'pnl': float(t.pnl or 0),
+        'reason': t.exit_reason or t.status
+    }
+
+
+def trade_delta(t):
+    """Push event placing one trade in the section its status belongs to (None removes it)."""
+    if t.status == 'PENDING':
+        section, row = 'scanner', scanner_row(t)
+    elif t.status in OPEN_STATUSES:
+        section, row = 'positions', position_row(t)
+    elif t.status in HISTORY_STATUSES:
+        section, row = 'history', history_row(t)
+    else:
+        section, row = None, None
+    return {'type': 'trade', 'id': t.id, 'section': section, 'row': row}
+
+
+def build_payload(user_id):
+    """The three dashboard queries; each is served by the (user, status, created_at) index."""
+    trades = Trade.objects.filter(user_id=user_id).order_by('-created_at')
+    return {
+        'scanner': [scanner_row(t) for t in trades.filter(status='PENDING')],
+        'positions': [position_row(t) for t in trades.filter(status__in=OPEN_STATUSES)],
+        'history': [history_row(t) for t in trades.filter(status__in=HISTORY_STATUSES)[:20]],
+    }
+
+
+def _render(user_id):
+    body = json.dumps(build_payload(user_id), separators=(',', ':'))
+    etag = '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+    return etag, body
+
+
+def current_etag(user_id, r=None):
+    """ETag of the cached snapshot, or None. One round trip pair, no DB."""
+    r = r or _redis()
+    gen = r.get(GEN_KEY.format(user_id=user_id)) or 0
+    return r.hget(SNAPSHOT_KEY.format(user_id=user_id, gen=gen), 'etag')
+
+
+def get_snapshot(user_id, r=None):
+    """(etag, body) from the cache, rebuilding from the DB on a miss."""
+    try:
+        r = r or _redis()
+        gen = r.get(GEN_KEY.format(user_id=user_id)) or 0
+        key = SNAPSHOT_KEY.format(user_id=user_id, gen=gen)
+        cached = r.hgetall(key)
+        if cached.get('etag') and 'body' in cached:
+            return cached['etag'], cached['body']
+    except Exception as e:
+        logger.error(f"Dashboard cache read failed: {e}")
+        return _render(user_id)
+
+    etag, body = _render(user_id)
+    try:
+        pipe = r.pipeline()
+        pipe.hset(key, mapping={'etag': etag, 'body': body})
+        pipe.expire(key, CACHE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Dashboard cache write failed: {e}")
+    return etag, body
+
+
+def invalidate(user_id, r=None):
+    try:
+        (r or _redis()).incr(GEN_KEY.format(user_id=user_id))
+    except Exception as e:
+        logger.error(f"Dashboard cache invalidation failed: {e}")
+
+
+def publish_event(user_id, event, r=None):
+    """Fire-and-forget push to the user's live dashboards (see tradeapp/live.py)."""
+    try:
+        (r or _redis()).publish(EVENTS_CHANNEL.format(user_id=user_id), json.dumps(event, separators=(',', ':')))
+    except Exception as e:
+        logger.error(f"Dashboard event publish failed: {e}")
+
+
+def invalidate_on_commit(user_id, events=()):
+    """
+    Once the surrounding transaction (if any) commits: drop the cached snapshot
+    and push `events`, so neither a rebuild nor a browser sees uncommitted state.
+    """
+    events = list(events)
+
+    def _apply():
+        r = _redis()
+        invalidate(user_id, r)
+        for event in events:
+            publish_event(user_id, event, r)
+    transaction.on_commit(_apply)
+
+
+@receiver(post_save, sender=Trade)
+def _trade_saved(sender, instance, **kwargs):
+    invalidate_on_commit(instance.user_id, [trade_delta(instance)])
+
+
+@receiver(post_delete, sender=Trade)
+def _trade_deleted(sender, instance, **kwargs):
+    invalidate_on_commit(instance.user_id, [{'type': 'trade', 'id': instance.id, 'section': None, 'row': None}])
@@ -0,0 +1,198 @@
+"""
+Incremental on-disk store of daily and minute candles per instrument.
+
+Layout under settings.HISTORY_DIR:
+    manifest.json                 {interval: {token: [[first_day, last_day], ...]}}
+    <interval>/<token>.bin        n (int64) followed by six column-major blocks:
+                                  ts (int64 epoch secs), open, high, low, close, volume (float64)
+
+The manifest records which calendar days have already been fetched (holidays
+included), so `ensure()` only asks the broker for the missing delta. Readers
+get contiguous `array` columns straight from one file read.
+"""
+import json
+import logging
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+
+import pytz
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IST = pytz.timezone("Asia/Kolkata")
+FIELDS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+
+# Largest span SmartAPI serves per getCandleData call, in days
+MAX_SPAN_DAYS = {
+    'ONE_MINUTE': 30, 'THREE_MINUTE': 60, 'FIVE_MINUTE': 100, 'TEN_MINUTE': 100,
+    'FIFTEEN_MINUTE': 200, 'THIRTY_MINUTE': 200, 'ONE_HOUR': 400, 'ONE_DAY': 2000,
+}
+
+
+def _empty():
+    return {'ts': array('q'), **{f: array('d') for f in FIELDS[1:]}}
+
+
+def _to_epoch(raw):
+    return int(datetime.fromisoformat(raw).timestamp()) if isinstance(raw, str) else int(raw)
+
+
+def _merge_ranges(ranges):
+    out = []
+    for start, end in sorted(ranges):
+        if out and start <= out[-1][1] + timedelta(days=1):
+            out[-1][1] = max(out[-1][1], end)
+        else:
+            out.append([start, end])
+    return out
+
+
+def _missing(ranges, start, end):
+    """Sub-ranges of [start, end] not covered by the (merged) ranges."""
+    gaps, cursor = [], start
+    for lo, hi in ranges:
+        if hi < cursor or lo > end:
+            continue
+        if lo > cursor:
+            gaps.append((cursor, lo - timedelta(days=1)))
+        cursor = max(cursor, hi + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class HistoryStore:
+    def __init__(self, root=None):
+        self.root = root or getattr(settings, 'HISTORY_DIR', 'history')
+        self._lock = threading.Lock()
+        self._manifest = self._load_manifest()
+
+    # --- Manifest -----------------------------------------------------------
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.root, 'manifest.json')
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path) as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {
+            interval: {token: [[date.fromisoformat(a), date.fromisoformat(b)] for a, b in ranges]
+                       for token, ranges in tokens.items()}
+            for interval, tokens in raw.items()
+        }
+
+    def save_manifest(self):
+        with self._lock:
+            raw = {
+                interval: {token: [[a.isoformat(), b.isoformat()] for a, b in ranges] for token, ranges in tokens.items()}
+                for interval, tokens in self._manifest.items()
+            }
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(raw, f)
+        os.replace(tmp, self._manifest_path)
+
+    def covered(self, token, interval):
+        with self._lock:
+            return [list(r) for r in self._manifest.get(interval, {}).get(str(token), [])]
+
+    # --- Column files ---------------------------------------------------------
+
+    def _path(self, token, interval):
+        return os.path.join(self.root, interval, f"{token}.bin")
+
+    def load(self, token, interval, start=None, end=None):
+        """Returns {field: array} for the token, optionally sliced to [start, end] dates."""
+        cols = _empty()
+        try:
+            with open(self._path(token, interval), 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return cols
+        n = memoryview(raw)[:8].cast('q')[0]
+        offset = 8
+        for field in FIELDS:
+            cols[field].frombytes(raw[offset:offset + n * 8])
+            offset += n * 8
+        if start is None and end is None:
+            return cols
+
+        lo = IST.localize(datetime.combine(start, datetime.min.time())).timestamp() if start else float('-inf')
+        hi = IST.localize(datetime.combine(end + timedelta(days=1), datetime.min.time())).timestamp() if end else float('inf')
+        ts = cols['ts']
+        i, j = bisect_left(ts, lo), bisect_left(ts, hi)
+        return {field: col[i:j] for field, col in cols.items()}
+
+    def load_candles(self, token, interval, start=None, end=None):
+        """Same data as load() as getCandleData-style rows: [[ts, o, h, l, c, v], ...]."""
+        cols = self.load(token, interval, start, end)
+        return [list(row) for row in zip(*(cols[f] for f in FIELDS))]
+
+    def _write(self, token, interval, cols):
+        path = self._path(token, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(array('q', [len(cols['ts'])]).tobytes())
+            for field in FIELDS:
+                f.write(cols[field].tobytes())
+        os.replace(tmp, path)
+
+    def merge(self, token, interval, candles):
+        """Upserts getCandleData rows, keyed by timestamp (newer rows win)."""
+        if not candles:
+            return
+        cols = self.load(token, interval)
+        rows = {ts: (o, h, l, c, v) for ts, o, h, l, c, v in zip(*(cols[f] for f in FIELDS))}
+        for c in candles:
+            rows[_to_epoch(c[0])] = tuple(float(x) for x in c[1:6])
+        merged = _empty()
+        for ts in sorted(rows):
+            merged['ts'].append(ts)
+            for field, value in zip(FIELDS[1:], rows[ts]):
+                merged[field].append(value)
+        self._write(token, interval, merged)
+
+    # --- Incremental fetch ----------------------------------------------------
+
+    def ensure(self, broker, token, interval, start, end, limiter=None):
+        """
+        Fetches only the days in [start, end] not yet in the manifest. Today's
+        session is stored but never marked covered, since it is still forming.
+        `limiter` (e.g. a TokenBucket) is acquired before every broker call.
+        Returns False if any broker call failed.
+        """
+        token = str(token)
+        gaps = _missing(self.covered(token, interval), start, end)
+        span = timedelta(days=MAX_SPAN_DAYS.get(interval, 30) - 1)
+        today = datetime.now(IST).date()
+        for gap_start, gap_end in gaps:
+            cursor = gap_start
+            while cursor <= gap_end:
+                chunk_end = min(cursor + span, gap_end)
+                if limiter is not None:
+                    limiter.acquire()
+                candles = broker.get_candles(token, interval, cursor, chunk_end)
+                if candles is None:
+                    logger.warning(f"History fetch failed for {token} {interval} {cursor}..{chunk_end}")
+                    return False
+                self.merge(token, interval, candles)
+                done_to = min(chunk_end, today - timedelta(days=1))
+                if done_to >= cursor:
+                    with self._lock:
+                        ranges = self._manifest.setdefault(interval, {}).setdefault(token, [])
+                        ranges.append([cursor, done_to])
+                        self._manifest[interval][token] = _merge_ranges(ranges)
+                cursor = chunk_end + timedelta(days=1)
+        return True
@@ -0,0 +1,141 @@
+"""
+Shared keep-alive HTTP pool for SmartAPI calls.
+
+SmartConnect._request calls the module-level `requests.request()`, which
+builds a throwaway Session per call, so every placeOrder / orderBook /
+getCandleData pays a fresh TCP + TLS handshake. `install()` points the
+`requests` name inside SmartApi.smartConnect at a shim that sends through one
+process-wide Session whose adapter keeps BROKER_HTTP_POOL_SIZE connections open.
+
+`KeepAlive` pre-warms the pool shortly before market open (one concurrent
+HEAD per pooled connection, so each gets its own socket) and, during market
+hours, re-touches the connections whenever the pool has been idle for
+BROKER_HTTP_KEEPALIVE_SECS, before the server's idle timeout closes them.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dtime
+
+import pytz
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+IST = pytz.timezone("Asia/Kolkata")
+POOL_SIZE = getattr(settings, 'BROKER_HTTP_POOL_SIZE', 4)
+KEEPALIVE_SECS = getattr(settings, 'BROKER_HTTP_KEEPALIVE_SECS', 30)
+# Optional CA bundle, e.g. for a local HTTPS stand-in with a self-signed cert
+CA_BUNDLE = getattr(settings, 'SMARTAPI_CA_BUNDLE', None)
+PREWARM_AT = dtime(9, 10)
+WARM_UNTIL = dtime(15, 35)
+
+
+def new_session(pool_size=POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class PooledRequests:
+    """Stands in for the `requests` module inside SmartApi.smartConnect."""
+
+    def __init__(self, session, ca_bundle=CA_BUNDLE):
+        self.session = session
+        self.ca_bundle = ca_bundle
+        self.last_used = 0.0
+
+    def request(self, method, url, **kwargs):
+        if self.ca_bundle and kwargs.get('verify', True) is True:
+            kwargs['verify'] = self.ca_bundle
+        self.last_used = time.monotonic()
+        return self.session.request(method, url, **kwargs)
+
+    def __getattr__(self, name):
+        # Session, adapters, exceptions ... still come from the real module
+        return getattr(requests, name)
+
+
+_pooled = None
+_lock = threading.Lock()
+
+
+def install(pool_size=POOL_SIZE):
+    """Routes every SmartConnect request in this process through the shared pool. Idempotent."""
+    global _pooled
+    import SmartApi.smartConnect as smart
+    with _lock:
+        if _pooled is None:
+            _pooled = PooledRequests(new_session(pool_size))
+        smart.requests = _pooled
+        return _pooled
+
+
+def uninstall():
+    import SmartApi.smartConnect as smart
+    smart.requests = requests
+
+
+def warm(pooled, url, connections, timeout=5):
+    """Opens (or refreshes) `connections` pooled sockets with concurrent HEADs. Returns how many answered."""
+    verify = pooled.ca_bundle or True
+
+    def touch(_):
+        try:
+            pooled.session.head(url, timeout=timeout, verify=verify, allow_redirects=False)
+            return True
+        except requests.RequestException as e:
+            logger.warning(f"Keepalive to {url} failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        ok = sum(pool.map(touch, range(connections)))
+    pooled.last_used = time.monotonic()
+    return ok
+
+
+class KeepAlive(threading.Thread):
+    def __init__(self, pooled, url, connections=POOL_SIZE, interval=KEEPALIVE_SECS, clock=None):
+        super().__init__(name="http-keepalive", daemon=True)
+        self.pooled = pooled
+        self.url = url
+        self.connections = connections
+        self.interval = interval
+        self.clock = clock or (lambda: datetime.now(IST))
+
+    def due(self):
+        now = self.clock().time()
+        idle = time.monotonic() - self.pooled.last_used
+        return PREWARM_AT <= now <= WARM_UNTIL and idle >= self.interval
+
+    def run(self):
+        while True:
+            try:
+                if self.due():
+                    ok = self.warm()
+                    logger.debug(f"🔥 Warmed {ok}/{self.connections} broker connections")
+            except Exception as e:
+                logger.error(f"Keepalive error: {e}")
+            time.sleep(min(self.interval, 5))
+
+    def warm(self):
+        return warm(self.pooled, self.url, self.connections)
+
+
+_keepalive = None
+
+
+def start_keepalive(url, connections=POOL_SIZE):
+    """Installs the pool and starts one keepalive thread per process."""
+    global _keepalive
+    pooled = install(connections)
+    with _lock:
+        if _keepalive is None:
+            _keepalive = KeepAlive(pooled, url, connections)
+            _keepalive.start()
+    return _keepalive
@@ -0,0 +1,193 @@
+"""
+Streaming minute-candle indicators for the whole trading universe.
+
+`IndicatorBook` holds one `array('d')` column per indicator (and per piece of
+running state), indexed by universe position, the same order the engines and
+the candle ring use. `update()` folds a minute batch into every column in one
+pass, each candle in O(1):
+
+    ema_fast, ema_slow   EMA(EMA_FAST) / EMA(EMA_SLOW) of close, seeded with the SMA
+    rsi                  Wilder RSI(RSI_PERIOD)
+    atr                  Wilder ATR(ATR_PERIOD) over minute true range
+    vwap                 session VWAP of typical price, reset on the first candle of each day
+    high_n, low_n        highest high / lowest low of the last WINDOW candles (monotonic deques)
+    avg_volume           mean volume of the last WINDOW candles (ring buffer + running sum)
+
+Each symbol remembers the last minute it folded, so replayed, duplicated or
+out-of-order candles are ignored and the book can be fed everything a
+consumer batch holds. `warm_up()` replays the newest stored minute candles
+(tradeapp/history.py) at startup, so values are meaningful from the first live
+candle.
+"""
+import logging
+from array import array
+from collections import deque
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+
+from .candles import minute_epoch
+
+logger = logging.getLogger(__name__)
+
+IST = pytz.timezone("Asia/Kolkata")
+IST_OFFSET_SECS = 19800
+
+EMA_FAST = getattr(settings, 'INDICATOR_EMA_FAST', 9)
+EMA_SLOW = getattr(settings, 'INDICATOR_EMA_SLOW', 21)
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+WINDOW = getattr(settings, 'INDICATOR_WINDOW', 20)
+# Candles per symbol replayed by warm_up(): enough for the slowest average to settle
+WARMUP_CANDLES = getattr(settings, 'INDICATOR_WARMUP_CANDLES', 200)
+WARMUP_DAYS = 7
+
+COLUMNS = ('ema_fast', 'ema_slow', 'rsi', 'atr', 'vwap', 'high_n', 'low_n', 'avg_volume')
+READY_AFTER = max(EMA_SLOW, RSI_PERIOD + 1, ATR_PERIOD, WINDOW)
+
+
+def _zeros(n):
+    return array('d', bytes(8 * n))
+
+
+class IndicatorBook:
+    def __init__(self, token_map):
+        self.tokens = list(token_map)
+        self.index = {token: i for i, token in enumerate(self.tokens)}
+        self.symbol_index = {symbol: i for i, symbol in enumerate(token_map.values())}
+        n = len(self.tokens)
+        for name in COLUMNS:
+            setattr(self, name, _zeros(n))
+        # Running state
+        self.count = array('q', bytes(8 * n))
+        self.last_minute = array('q', bytes(8 * n))  # epoch minute of the last folded candle
+        self.session_day = array('q', bytes(8 * n))
+        self.prev_close = _zeros(n)
+        self.avg_gain = _zeros(n)
+        self.avg_loss = _zeros(n)
+        self.pv = _zeros(n)       # sum of typical price * volume this session
+        self.volume = _zeros(n)   # sum of volume this session
+        self.vol_ring = _zeros(n * WINDOW)
+        self.vol_sum = _zeros(n)
+        self.highs = [deque() for _ in range(n)]  # (count, high), decreasing
+        self.lows = [deque() for _ in range(n)]   # (count, low), increasing
+
+    def __len__(self):
+        return len(self.tokens)
+
+    # --- Updates --------------------------------------------------------------
+
+    def update(self, candles):
+        """Folds a batch of stream-style candle dicts. Returns how many were new."""
+        index, fold = self.index, self._fold
+        folded = 0
+        for candle in candles:
+            i = index.get(candle['token'])
+            if i is None:
+                continue
+            epoch = minute_epoch(candle['ts'])
+            folded += fold(i, epoch // 60, (epoch + IST_OFFSET_SECS) // 86400, float(candle['open']),
+                           float(candle['high']), float(candle['low']), float(candle['close']),
+                           float(candle['volume']))
+        return folded
+
+    def _fold(self, i, minute, day, o, h, l, c, v):
+        if minute <= self.last_minute[i]:
+            return False  # replayed, duplicated or late
+        self.last_minute[i] = minute
+        n = self.count[i] + 1
+        self.count[i] = n
+        prev = self.prev_close[i] if n > 1 else c
+        self.prev_close[i] = c
+
+        # Averages run as a plain mean over their first `period` samples, then smooth
+        ema = self.ema_fast[i]
+        self.ema_fast[i] = ema + (c - ema) / (n if n <= EMA_FAST else (EMA_FAST + 1) / 2.0)
+        ema = self.ema_slow[i]
+        self.ema_slow[i] = ema + (c - ema) / (n if n <= EMA_SLOW else (EMA_SLOW + 1) / 2.0)
+
+        if n > 1:
+            change, k = c - prev, n - 1
+            period = k if k <= RSI_PERIOD else RSI_PERIOD
+            gain, loss = self.avg_gain[i], self.avg_loss[i]
+            gain += ((change if change > 0 else 0.0) - gain) / period
+            loss += ((-change if change < 0 else 0.0) - loss) / period
+            self.avg_gain[i], self.avg_loss[i] = gain, loss
+            self.rsi[i] = 100.0 - 100.0 / (1.0 + gain / loss) if loss else (100.0 if gain else 50.0)
+        else:
+            self.rsi[i] = 50.0
+
+        tr = max(h - l, abs(h - prev), abs(l - prev))
+        atr = self.atr[i]
+        self.atr[i] = atr + (tr - atr) / (n if n <= ATR_PERIOD else ATR_PERIOD)
+
+        if day != self.session_day[i]:
+            self.session_day[i] = day
+            self.pv[i] = self.volume[i] = 0.0
+        self.pv[i] += (h + l + c) / 3.0 * v
+        self.volume[i] += v
+        self.vwap[i] = self.pv[i] / self.volume[i] if self.volume[i] else c
+
+        slot = i * WINDOW + (n - 1) % WINDOW
+        self.vol_sum[i] += v - self.vol_ring[slot]
+        self.vol_ring[slot] = v
+        self.avg_volume[i] = self.vol_sum[i] / (n if n < WINDOW else WINDOW)
+
+        highs, lows = self.highs[i], self.lows[i]
+        while highs and highs[-1][1] <= h:
+            highs.pop()
+        highs.append((n, h))
+        if highs[0][0] <= n - WINDOW:
+            highs.popleft()
+        while lows and lows[-1][1] >= l:
+            lows.pop()
+        lows.append((n, l))
+        if lows[0][0] <= n - WINDOW:
+            lows.popleft()
+        self.high_n[i] = highs[0][1]
+        self.low_n[i] = lows[0][1]
+        return True
+
+    def warm_up(self, store, candles=WARMUP_CANDLES, days=WARMUP_DAYS, now=None):
+        """Folds each token's newest stored ONE_MINUTE candles. Returns how many symbols had any."""
+        end = (now or datetime.now(IST)).date()
+        start = end - timedelta(days=days)
+        warmed = 0
+        for i, token in enumerate(self.tokens):
+            cols = store.load(token, "ONE_MINUTE", start, end)
+            if not cols['ts']:
+                continue
+            rows = zip(*(cols[f][-candles:] for f in ('ts', 'open', 'high', 'low', 'close', 'volume')))
+            for ts, o, h, l, c, v in rows:
+                self._fold(i, ts // 60, (ts + IST_OFFSET_SECS) // 86400, o, h, l, c, v)
+            warmed += 1
+        if self.tokens and not warmed:
+            logger.warning(f"No ONE_MINUTE history stored for {start}..{end}; indicators start cold "
+                           f"(run fetch_pdh before the open to fetch the warm-up window)")
+        return warmed
+
+    # --- Queries --------------------------------------------------------------
+
+    def value(self, name, symbol):
+        """One indicator for one symbol, or None before its first candle."""
+        i = self.symbol_index.get(symbol)
+        return getattr(self, name)[i] if i is not None and self.count[i] else None
+
+    def get(self, symbol):
+        """{indicator: value, 'count': candles folded} for `symbol`, or None before its first candle."""
+        i = self.symbol_index.get(symbol)
+        if i is None or not self.count[i]:
+            return None
+        row = {name: getattr(self, name)[i] for name in COLUMNS}
+        row['count'] = self.count[i]
+        return row
+
+    def ready(self, symbol):
+        """True once every indicator has seen a full period."""
+        i = self.symbol_index.get(symbol)
+        return i is not None and self.count[i] >= READY_AFTER
+
+    def column(self, name):
+        """The whole column, by universe position, for cross-sectional screens."""
+        return getattr(self, name)
@@ -0,0 +1,282 @@
+"""
+Instrument master: every tradable instrument from Angel's scrip-master JSON.
+
+`refresh()` parses the scrip master (downloaded from INSTRUMENT_MASTER_URL or
+read from a local INSTRUMENT_MASTER_FILE copy) into column arrays and writes
+them to INSTRUMENT_CACHE_PATH. Engines only ever `get_master()`, which
+decodes that file once per process:
+
+    header  struct '<4sHIId'  magic, version, n_instruments, source date ordinal, created
+    strings u32 length + '\\n'-joined utf-8, four times: tokens, symbols, exchanges, segments
+    data    exchange u8[n], segment u16[n], lot size u32[n], tick size float64[n]
+The whole payload is zlib-compressed.
+
+Row i is the instrument's dense integer id. Tokens are only unique within an
+exchange, so both lookups are keyed by (exchange, ...). Without a cache the
+master falls back to the hardcoded FINAL_DICTIONARY_OBJECT (NSE equities).
+
+Universes are named lists (constants.UNIVERSES) or `EXCHANGE[:SEGMENT]`
+specs such as "NSE:EQ"; `universe()` returns the {token: symbol} map the
+engines key candles by, in a stable order. A universe spans one exchange, and
+`trading_exchange()` names it for the websocket subscription and broker calls
+(named lists are NSE equities).
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import namedtuple
+from datetime import date
+
+import requests
+from django.conf import settings
+
+from .constants import FINAL_DICTIONARY_OBJECT, UNIVERSES
+
+logger = logging.getLogger(__name__)
+
+MASTER_URL = getattr(settings, 'INSTRUMENT_MASTER_URL',
+                     'https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json')
+MASTER_FILE = getattr(settings, 'INSTRUMENT_MASTER_FILE', None)
+CACHE_PATH = getattr(settings, 'INSTRUMENT_CACHE_PATH', 'instruments.bin')
+DEFAULT_UNIVERSE = getattr(settings, 'TRADING_UNIVERSE', 'breakout')
+
+MAGIC = b'INST'
+VERSION = 1
+HEADER = struct.Struct('<4sHIId')
+DEFAULT_TICK = 0.05
+# SmartAPI websocket exchangeType codes, for the exchanges an engine can trade
+EXCHANGE_TYPES = {'NSE': 1, 'NFO': 2, 'BSE': 3, 'BFO': 4, 'MCX': 5, 'NCDEX': 7, 'CDS': 13}
+
+Instrument = namedtuple('Instrument', 'id token symbol exchange segment lot_size tick_size')
+
+
+def _segment(row):
+    # Derivatives carry an instrument type; cash symbols carry theirs as a suffix (-EQ, -BE, ...)
+    if row.get('instrumenttype'):
+        return row['instrumenttype']
+    symbol = row.get('symbol', '')
+    return symbol.rsplit('-', 1)[1] if '-' in symbol else 'EQ'
+
+
+class InstrumentMaster:
+    def __init__(self, tokens, symbols, exchange_names, segment_names, exchange, segment, lot_size, tick_size,
+                 asof=0, created=0.0):
+        self.tokens = tokens
+        self.symbols = symbols
+        self.exchange_names = exchange_names
+        self.segment_names = segment_names
+        self.exchange = exchange      # array('B') of indexes into exchange_names
+        self.segment = segment        # array('H') of indexes into segment_names
+        self.lot_size = lot_size      # array('I')
+        self.tick_size = tick_size    # array('d'), rupees
+        self.asof = asof
+        self.created = created
+        self._universes = {}
+        self.by_token = {}
+        self.by_symbol = {}
+        for i, (token, symbol, e) in enumerate(zip(tokens, symbols, exchange)):
+            name = exchange_names[e]
+            self.by_token[(name, token)] = i
+            self.by_symbol[(name, symbol)] = i
+
+    def __len__(self):
+        return len(self.tokens)
+
+    # --- Lookups --------------------------------------------------------------
+
+    def id_for_token(self, token, exchange='NSE'):
+        return self.by_token.get((exchange, str(token)))
+
+    def id_for_symbol(self, symbol, exchange='NSE'):
+        return self.by_symbol.get((exchange, symbol))
+
+    def token(self, symbol, exchange='NSE'):
+        i = self.by_symbol.get((exchange, symbol))
+        return None if i is None else self.tokens[i]
+
+    def symbol(self, token, exchange='NSE'):
+        i = self.by_token.get((exchange, str(token)))
+        return None if i is None else self.symbols[i]
+
+    def get(self, i):
+        return Instrument(i, self.tokens[i], self.symbols[i], self.exchange_names[self.exchange[i]],
+                          self.segment_names[self.segment[i]], self.lot_size[i], self.tick_size[i])
+
+    # --- Universes ------------------------------------------------------------
+
+    def select(self, exchange=None, segment=None):
+        """Ids of every instrument on `exchange` (and in `segment`), in master order."""
+        e = self.exchange_names.index(exchange) if exchange in self.exchange_names else None
+        s = self.segment_names.index(segment) if segment in self.segment_names else None
+        if (exchange and e is None) or (segment and s is None):
+            return []
+        return [i for i in range(len(self.tokens))
+                if (e is None or self.exchange[i] == e) and (s is None or self.segment[i] == s)]
+
+    def universe(self, name=DEFAULT_UNIVERSE):
+        """{token: symbol} for a named list or an EXCHANGE[:SEGMENT] spec, built once per name."""
+        if name not in self._universes:
+            self._universes[name] = self._build_universe(name)
+        return self._universes[name]
+
+    @staticmethod
+    def universe_exchange(name=DEFAULT_UNIVERSE):
+        """The exchange a universe trades on."""
+        if name in UNIVERSES:
+            return 'NSE'
+        exchange = name.partition(':')[0]
+        if exchange not in EXCHANGE_TYPES:
+            raise ValueError(f"Universe '{name}': no feed or order routing for exchange '{exchange}'")
+        return exchange
+
+    def _build_universe(self, name):
+        if name in UNIVERSES:
+            ids = []
+            for symbol in UNIVERSES[name]:
+                i = self.by_symbol.get(('NSE', symbol))
+                if i is None:
+                    logger.warning(f"⚠️ {symbol} not in the instrument master, left out of '{name}'")
+                else:
+                    ids.append(i)
+        else:
+            exchange, _, segment = name.partition(':')
+            ids = self.select(exchange, segment or None)
+            if not ids:
+                raise ValueError(f"Unknown universe '{name}'")
+        return {self.tokens[i]: self.symbols[i] for i in ids}
+
+    # --- Build / (de)serialize ------------------------------------------------
+
+    @classmethod
+    def from_rows(cls, rows, asof=None):
+        """From scrip-master rows ({token, symbol, exch_seg, instrumenttype, lotsize, tick_size, ...})."""
+        tokens, symbols = [], []
+        exchange, segment = array('B'), array('H')
+        lot_size, tick_size = array('I'), array('d')
+        exchange_names, segment_names = {}, {}
+        for row in rows:
+            tokens.append(str(row['token']))
+            symbols.append(row['symbol'])
+            exchange.append(exchange_names.setdefault(row['exch_seg'], len(exchange_names)))
+            segment.append(segment_names.setdefault(_segment(row), len(segment_names)))
+            lot_size.append(max(1, int(float(row.get('lotsize') or 1))))
+            # The scrip master quotes tick size in paise
+            tick = float(row.get('tick_size') or 0) / 100.0
+            tick_size.append(tick if tick > 0 else DEFAULT_TICK)
+        return cls(tokens, symbols, list(exchange_names), list(segment_names), exchange, segment,
+                   lot_size, tick_size, date.today().toordinal() if asof is None else asof, time.time())
+
+    @classmethod
+    def fallback(cls):
+        """The hardcoded NSE equity list, for when no scrip master has been fetched yet."""
+        rows = [{'token': token, 'symbol': symbol, 'exch_seg': 'NSE', 'lotsize': 1, 'tick_size': DEFAULT_TICK * 100}
+                for symbol, token in FINAL_DICTIONARY_OBJECT.items()]
+        return cls.from_rows(rows, asof=0)
+
+    def encode(self):
+        parts = [HEADER.pack(MAGIC, VERSION, len(self.tokens), self.asof, self.created)]
+        for strings in (self.tokens, self.symbols, self.exchange_names, self.segment_names):
+            blob = "\n".join(strings).encode()
+            parts += [struct.pack('<I', len(blob)), blob]
+        parts += [col.tobytes() for col in (self.exchange, self.segment, self.lot_size, self.tick_size)]
+        return zlib.compress(b"".join(parts), 6)
+
+    @classmethod
+    def decode(cls, blob):
+        raw = zlib.decompress(blob)
+        magic, version, n, asof, created = HEADER.unpack_from(raw, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported instrument payload {magic!r} v{version}")
+        offset = HEADER.size
+        strings = []
+        for _ in range(4):
+            (size,) = struct.unpack_from('<I', raw, offset)
+            offset += 4
+            strings.append(raw[offset:offset + size].decode().split("\n") if size else [])
+            offset += size
+        cols = []
+        for typecode in ('B', 'H', 'I', 'd'):
+            col = array(typecode)
+            col.frombytes(raw[offset:offset + n * col.itemsize])
+            offset += n * col.itemsize
+            cols.append(col)
+        return cls(*strings, *cols, asof=asof, created=created)
+
+
+# --- Cache ----------------------------------------------------------------------
+
+def read_cache(path=CACHE_PATH):
+    try:
+        with open(path, 'rb') as f:
+            return InstrumentMaster.decode(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Instrument cache {path} unreadable: {e}")
+        return None
+
+
+def write_cache(master, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(master.encode())
+    os.replace(tmp, path)  # readers never see a half-written cache
+
+
+def refresh(source=None, path=CACHE_PATH, timeout=60):
+    """Parses the scrip master from `source` (file path or URL) and rewrites the cache."""
+    source = source or MASTER_FILE or MASTER_URL
+    if source.startswith(('http://', 'https://')):
+        resp = requests.get(source, timeout=timeout)
+        resp.raise_for_status()
+        rows = resp.json()
+    else:
+        with open(source) as f:
+            rows = json.load(f)
+    master = InstrumentMaster.from_rows(rows)
+    write_cache(master, path)
+    _set_master(master)
+    return master
+
+
+_master = None
+_lock = threading.Lock()
+
+
+def _set_master(master):
+    global _master
+    with _lock:
+        _master = master
+
+
+def get_master():
+    """The process-wide master: the binary cache, else the local scrip-master file, else the fallback."""
+    global _master
+    with _lock:
+        if _master is None:
+            _master = read_cache()
+            if _master is None and MASTER_FILE and os.path.exists(MASTER_FILE):
+                logger.info(f"📒 Building instrument cache from {MASTER_FILE}")
+                with open(MASTER_FILE) as f:
+                    _master = InstrumentMaster.from_rows(json.load(f))
+                write_cache(_master)
+            if _master is None:
+                logger.warning("⚠️ No instrument cache (run refresh_instruments); using the built-in NSE list")
+                _master = InstrumentMaster.fallback()
+        return _master
+
+
+def trading_universe(name=DEFAULT_UNIVERSE):
+    """{token: symbol} the engines trade (settings.TRADING_UNIVERSE by default)."""
+    return get_master().universe(name)
+
+
+def trading_exchange(name=DEFAULT_UNIVERSE):
+    """Exchange of the universe the engines trade: 'NSE', 'BSE', 'NFO', ..."""
+    return InstrumentMaster.universe_exchange(name)
@@ -0,0 +1,153 @@
+"""
+Append-only trade journal.
+
+Every lifecycle step of a Trade is a TradeEvent row:
+
+    SIGNAL      PENDING         levels, candle and PDH the signal was taken on
+    ORDER       PENDING_ENTRY   entry_order_id, quantity
+    FILL        OPEN            entry_price, quantity
+    EXIT_ORDER  PENDING_EXIT    exit_order_id, exit_reason
+    EXIT_FILL   CLOSED          exit_price, pnl
+    EXPIRE / CANCEL / REJECT    EXPIRED, CANCELLED, FAILED_ENTRY / FAILED_EXIT
+
+The engine records events against its `Position` records (tradeapp/positions.py)
+into a `Journal` as they happen (stamping the time it saw them) and flushes
+once per pass: one INSERT for new signals, one for
+the events and one UPDATE for the Trade rows that changed, all in one
+transaction. Trade stays the read model the dashboard and engine restart use;
+`project()` / `rebuild()` derive it from the events alone, and
+`transition_latencies()` answers how long each step took.
+"""
+import logging
+import statistics
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Trade, TradeEvent
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_FIELDS = ('symbol', 'token', 'candle_ts', 'candle_open', 'candle_high', 'candle_low', 'candle_close',
+                 'prev_day_high', 'entry_level', 'stop_level', 'target_level')
+
+
+class Journal:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.new = []
+        self.events = []  # (position, kind, status, at, data); rows are built at flush, once ids exist
+        self.dirty = {}   # id(position) -> (position, fields changed since the last flush)
+        self.closed = []
+
+    def __len__(self):
+        return len(self.events)
+
+    def signal(self, position, at=None):
+        """A new PENDING position; its Trade row is inserted with the next flush."""
+        at = at or timezone.now()
+        position.status = 'PENDING'
+        position.created_at = position.updated_at = at
+        self.new.append(position)
+        self.events.append((position, 'SIGNAL', 'PENDING', at, {f: getattr(position, f) for f in SIGNAL_FIELDS}))
+
+    def record(self, position, kind, status, at=None, **changes):
+        """Applies one transition to the in-memory position and queues its event."""
+        at = at or timezone.now()
+        for field, value in changes.items():
+            setattr(position, field, value)
+        position.status = status
+        position.updated_at = at
+        self.events.append((position, kind, status, at, changes))
+        if position.id is not None:
+            _, fields = self.dirty.setdefault(id(position), (position, set()))
+            fields.update(changes, ('status', 'updated_at'))
+        if status == 'CLOSED':
+            self.closed.append(position)
+
+    def flush(self):
+        """Writes everything recorded since the last flush in one transaction. Returns the event count."""
+        if not self.events:
+            return 0
+        from .analytics import record_close
+        from .dashboard import invalidate_on_commit, trade_delta
+
+        new, events, dirty, closed = self.new, self.events, list(self.dirty.values()), self.closed
+        touched = {id(p): p for p in new}
+        try:
+            with transaction.atomic():
+                if new:
+                    rows = Trade.objects.bulk_create([p.to_trade() for p in new])
+                    for position, row in zip(new, rows):
+                        position.id = row.id
+                TradeEvent.objects.bulk_create(
+                    TradeEvent(trade_id=p.id, kind=kind, status=status, at=at, data=data)
+                    for p, kind, status, at, data in events
+                )
+                if dirty:
+                    fields = sorted(set().union(*(f for _, f in dirty)))
+                    Trade.objects.bulk_update([p.to_trade(fields) for p, _ in dirty], fields)
+                    touched.update((id(p), p) for p, _ in dirty)
+                for position in closed:
+                    record_close(position)
+                # Bulk writes skip post_save, so the dashboard is invalidated and notified here
+                invalidate_on_commit(self.user_id, [trade_delta(p) for p in touched.values()])
+        except Exception:
+            # Rolled back: keep everything for the next flush, as if the inserts never ran
+            for position in new:
+                position.id = None
+            raise
+        self.new, self.events, self.dirty, self.closed = [], [], {}, []
+        return len(events)
+
+
+# --- Projection ---------------------------------------------------------------
+
+def project(trade, events):
+    """Replays `events` (oldest first) onto `trade` and returns it."""
+    for event in events:
+        for field, value in event.data.items():
+            setattr(trade, field, Trade._meta.get_field(field).to_python(value))
+        trade.status = event.status
+        trade.updated_at = event.at
+    return trade
+
+
+def rebuild(trades=None):
+    """Re-derives the state of journaled trades from their events. Returns how many were rebuilt."""
+    trades = Trade.objects.filter(events__isnull=False).distinct() if trades is None else trades
+    by_trade = defaultdict(list)
+    for event in TradeEvent.objects.filter(trade__in=trades).order_by('trade_id', 'id').iterator(chunk_size=2000):
+        by_trade[event.trade_id].append(event)
+    rebuilt = [project(trade, by_trade[trade.id]) for trade in Trade.objects.filter(id__in=by_trade)]
+    fields = sorted({f for events in by_trade.values() for e in events for f in e.data} | {'status', 'updated_at'})
+    with transaction.atomic():
+        Trade.objects.bulk_update(rebuilt, fields, batch_size=500)
+    return len(rebuilt)
+
+
+# --- Latencies ----------------------------------------------------------------
+
+def transition_latencies(user=None, days=1):
+    """{'SIGNAL->ORDER': {'count', 'median_ms', 'p95_ms', 'max_ms'}, ...} over events in the last `days`."""
+    events = TradeEvent.objects.filter(at__gte=timezone.now() - timedelta(days=days))
+    if user is not None:
+        events = events.filter(trade__user=user)
+    samples = defaultdict(list)
+    prev = (None, None, None)
+    for trade_id, kind, at in events.order_by('trade_id', 'id').values_list('trade_id', 'kind', 'at').iterator(chunk_size=2000):
+        if prev[0] == trade_id:
+            samples[f"{prev[1]}->{kind}"].append((at - prev[2]).total_seconds() * 1000.0)
+        prev = (trade_id, kind, at)
+
+    def summary(values):
+        values.sort()
+        return {
+            'count': len(values),
+            'median_ms': round(statistics.median(values), 1),
+            'p95_ms': round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+            'max_ms': round(values[-1], 1),
+        }
+    return {step: summary(values) for step, values in sorted(samples.items())}
@@ -0,0 +1,241 @@
+"""
+Pre-open reference levels for the whole universe.
+
+From daily history (tradeapp/history.py) this computes, per symbol, the last
+*completed* session's OHLC (PDH/PDL/PDC), classic floor pivots, Wilder ATR and
+average volume / turnover. Work is done column-wise: each symbol's recent
+sessions are aligned into fixed-width `array` columns and every level is one
+pass over those columns.
+
+The result is published as a single versioned binary blob so engines load the
+whole table with one GET at startup (and reload it when the small
+`{LEVELS_KEY}:created` key changes):
+
+    header  struct '<4sHHIId'  magic, version, n_fields, n_symbols, asof ordinal, created
+    symbols u32 length + '\\n'-joined utf-8
+    fields  u32 length + ','-joined field names
+    data    n_fields * n_symbols float64, column-major
+The whole payload is zlib-compressed. Both keys expire after LEVELS_TTL_SECS,
+and `ReferenceLevels.is_current()` rejects a table left over from an earlier
+session.
+"""
+import logging
+import struct
+import time
+import zlib
+from array import array
+from datetime import datetime, timedelta, time as dtime
+
+import pytz
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IST = pytz.timezone("Asia/Kolkata")
+LEVELS_KEY = getattr(settings, "BREAKOUT_REF_LEVELS_KEY", "ref_levels")
+LEVELS_CREATED_KEY = f"{LEVELS_KEY}:created"
+# Long enough to carry Friday's levels over a long weekend
+LEVELS_TTL_SECS = 4 * 86400
+MAGIC = b'REFL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIId')
+MARKET_CLOSE = dtime(15, 30)
+
+ATR_PERIOD = 14
+AVG_PERIOD = 20
+
+FIELDS = ('pdo', 'pdh', 'pdl', 'pdc', 'pivot', 'r1', 's1', 'r2', 's2',
+          'atr', 'avg_volume', 'avg_turnover', 'session')
+
+
+def last_completed_day(now=None):
+    """Newest date whose session has closed: today after 15:30 IST, otherwise yesterday."""
+    now = now or datetime.now(IST)
+    return now.date() if now.time() >= MARKET_CLOSE else now.date() - timedelta(days=1)
+
+
+def last_session_day(now=None):
+    """last_completed_day() stepped back over the weekend. Exchange holidays are not known here."""
+    day = last_completed_day(now)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def is_current(asof, created=None, now=None):
+    """
+    True if levels for session `asof` (date ordinal), built at epoch `created`,
+    are the latest completed session's. Levels built after that session's close
+    are current even when `asof` is older: the day was an exchange holiday.
+    """
+    expected = last_session_day(now)
+    if asof >= expected.toordinal():
+        return True
+    close = IST.localize(datetime.combine(expected, MARKET_CLOSE)).timestamp()
+    return created is not None and created >= close
+
+
+def _completed_rows(cols, cutoff):
+    """Index one past the last daily candle dated on or before `cutoff`."""
+    ts = cols['ts']
+    end = len(ts)
+    # Intraday runs see today's forming candle last; it must not become "PDH"
+    while end and datetime.fromtimestamp(ts[end - 1], IST).date() > cutoff:
+        end -= 1
+    return end
+
+
+def compute_levels(daily_by_symbol, now=None):
+    """
+    daily_by_symbol: {symbol: HistoryStore.load(...) columns}. Returns
+    (symbols, {field: array('d')}) aligned by index; symbols with no completed
+    session are left out.
+    """
+    cutoff = last_completed_day(now)
+    width = max(ATR_PERIOD + 1, AVG_PERIOD)
+
+    # 1. Align the trailing `width` completed sessions of every symbol into columns
+    symbols = []
+    o, h, l, c, v, day = ([] for _ in range(6))
+    for symbol, cols in daily_by_symbol.items():
+        end = _completed_rows(cols, cutoff)
+        if not end:
+            continue
+        start = max(0, end - width)
+        symbols.append(symbol)
+        o.append(cols['open'][start:end])
+        h.append(cols['high'][start:end])
+        l.append(cols['low'][start:end])
+        c.append(cols['close'][start:end])
+        v.append(cols['volume'][start:end])
+        day.append(datetime.fromtimestamp(cols['ts'][end - 1], IST).date().toordinal())
+
+    # 2. One pass per output column
+    out = {f: array('d') for f in FIELDS}
+    out['pdo'].extend(x[-1] for x in o)
+    out['pdh'].extend(x[-1] for x in h)
+    out['pdl'].extend(x[-1] for x in l)
+    out['pdc'].extend(x[-1] for x in c)
+    out['session'].extend(day)
+
+    pivot = array('d', ((hi + lo + cl) / 3.0 for hi, lo, cl in zip(out['pdh'], out['pdl'], out['pdc'])))
+    out['pivot'] = pivot
+    out['r1'].extend(2 * p - lo for p, lo in zip(pivot, out['pdl']))
+    out['s1'].extend(2 * p - hi for p, hi in zip(pivot, out['pdh']))
+    out['r2'].extend(p + (hi - lo) for p, hi, lo in zip(pivot, out['pdh'], out['pdl']))
+    out['s2'].extend(p - (hi - lo) for p, hi, lo in zip(pivot, out['pdh'], out['pdl']))
+
+    for hs, ls, cs in zip(h, l, c):
+        # True range needs the previous close; the first bar falls back to high-low
+        tr = [hs[0] - ls[0]] + [max(hs[i] - ls[i], abs(hs[i] - cs[i - 1]), abs(ls[i] - cs[i - 1])) for i in range(1, len(hs))]
+        seed = tr[:ATR_PERIOD]
+        atr = sum(seed) / len(seed)
+        for x in tr[ATR_PERIOD:]:
+            atr = (atr * (ATR_PERIOD - 1) + x) / ATR_PERIOD
+        out['atr'].append(atr)
+
+    for vs, cs in zip(v, c):
+        vs, cs = vs[-AVG_PERIOD:], cs[-AVG_PERIOD:]
+        out['avg_volume'].append(sum(vs) / len(vs))
+        out['avg_turnover'].append(sum(a * b for a, b in zip(vs, cs)) / len(vs))
+
+    return symbols, out
+
+
+def encode_levels(symbols, cols, asof=None, created=None):
+    asof = asof or (max(cols['session']) if symbols else 0)
+    created = created or time.time()
+    sym_blob = "\n".join(symbols).encode()
+    field_blob = ",".join(FIELDS).encode()
+    parts = [HEADER.pack(MAGIC, VERSION, len(FIELDS), len(symbols), int(asof), created),
+             struct.pack('<I', len(sym_blob)), sym_blob,
+             struct.pack('<I', len(field_blob)), field_blob]
+    parts.extend(cols[f].tobytes() for f in FIELDS)
+    return zlib.compress(b"".join(parts), 6)
+
+
+class ReferenceLevels:
+    """Decoded levels table: `index[symbol]` -> row, `cols[field][row]` -> value."""
+
+    def __init__(self, symbols, cols, asof, created):
+        self.symbols = symbols
+        self.cols = cols
+        self.asof = asof
+        self.created = created
+        self.index = {s: i for i, s in enumerate(symbols)}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def is_current(self, now=None):
+        return is_current(self.asof, self.created, now)
+
+    def get(self, symbol, field='pdh'):
+        i = self.index.get(symbol)
+        return None if i is None else self.cols[field][i]
+
+    def column_map(self, field):
+        """{symbol: value} for one field, for dict lookups on a hot path."""
+        return dict(zip(self.symbols, self.cols[field]))
+
+    def current_map(self, field):
+        """
+        column_map() for the rows of the table's own session only. A symbol that
+        did not trade that day (suspended, newly listed) keeps an older row, and
+        its value would be that older session's.
+        """
+        asof = self.asof
+        return {symbol: value for symbol, value, session in zip(self.symbols, self.cols[field], self.cols['session'])
+                if session == asof}
+
+    @classmethod
+    def decode(cls, blob):
+        raw = zlib.decompress(blob)
+        magic, version, n_fields, n, asof, created = HEADER.unpack_from(raw, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported levels payload {magic!r} v{version}")
+        offset = HEADER.size
+        (size,) = struct.unpack_from('<I', raw, offset)
+        offset += 4
+        symbols = raw[offset:offset + size].decode().split("\n") if n else []
+        offset += size
+        (size,) = struct.unpack_from('<I', raw, offset)
+        offset += 4
+        fields = raw[offset:offset + size].decode().split(",")
+        offset += size
+        cols = {}
+        for field in fields:
+            col = array('d')
+            col.frombytes(raw[offset:offset + n * 8])
+            cols[field] = col
+            offset += n * 8
+        return cls(symbols, cols, asof, created)
+
+
+def publish_levels(raw_redis, symbols, cols):
+    created = time.time()
+    blob = encode_levels(symbols, cols, created=created)
+    pipe = raw_redis.pipeline()
+    pipe.set(LEVELS_KEY, blob, ex=LEVELS_TTL_SECS)
+    pipe.set(LEVELS_CREATED_KEY, repr(created), ex=LEVELS_TTL_SECS)
+    pipe.execute()
+    return len(blob)
+
+
+def levels_version(redis_client):
+    """The published table's `created` stamp (one small GET), to tell when to reload it."""
+    try:
+        return redis_client.get(LEVELS_CREATED_KEY)
+    except Exception as e:
+        logger.error(f"Reference levels version check failed: {e}")
+        return None
+
+
+def load_levels(raw_redis):
+    """One GET; returns ReferenceLevels or None. `raw_redis` must not decode responses."""
+    try:
+        blob = raw_redis.get(LEVELS_KEY)
+        return ReferenceLevels.decode(blob) if blob else None
+    except Exception as e:
+        logger.error(f"Reference levels load failed: {e}")
+        return None
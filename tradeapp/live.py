@@ -0,0 +1,131 @@
+"""
+Server-push fan-out for the live dashboard.
+
+Each web process holds ONE Redis pattern subscription to
+`dashboard_events:*` (published by tradeapp/dashboard.py and the algo
+engine) and hands every message to the asyncio queues of that user's
+connected browser sessions. A connected-but-idle session is just a task
+awaiting its queue, so there is no per-session Redis or DB work between events.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+
+import redis.asyncio as aioredis
+
+from .dashboard import EVENTS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 256
+RECONNECT_DELAY_SECS = 1
+
+
+def _async_redis():
+    # Same connection options as angel_utils._redis_pool; ssl_cert_reqs only exists for rediss://
+    options = dict(decode_responses=True, socket_keepalive=True, socket_connect_timeout=5, health_check_interval=30)
+    redis_url = os.environ.get('REDIS_URL')
+    if redis_url:
+        if redis_url.startswith('rediss://'):
+            options['ssl_cert_reqs'] = None
+        return aioredis.from_url(redis_url, **options)
+    return aioredis.Redis(host='localhost', port=6379, db=0, **options)
+
+
+class Broadcaster:
+    def __init__(self, client_factory=_async_redis):
+        self.client_factory = client_factory
+        self.sessions = defaultdict(set)
+        self._task = None
+        self._loop = None
+        self.ready = None
+
+    def subscribe(self, user_id):
+        """Registers a session queue; starts the shared listener on first use in this loop."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            # runserver gives each async request its own loop; ASGI servers keep one
+            self._loop = loop
+            self.ready = asyncio.Event()
+            self._task = loop.create_task(self._listen())
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.sessions[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.sessions.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.sessions[user_id]
+
+    def dispatch(self, channel, data):
+        user_id = int(channel.rsplit(':', 1)[1])
+        for queue in list(self.sessions.get(user_id, ())):
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                # A stalled browser: end its stream, it reconnects to a fresh snapshot
+                self.unsubscribe(user_id, queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _listen(self):
+        pattern = EVENTS_CHANNEL.format(user_id='*')
+        while self.sessions:
+            client = self.client_factory()
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(pattern)
+                self.ready.set()
+                logger.info(f"📡 Dashboard fan-out subscribed to {pattern}")
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self.dispatch(message['channel'], message['data'])
+                    if not self.sessions:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dashboard fan-out error: {e}")
+                await asyncio.sleep(RECONNECT_DELAY_SECS)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+
+broadcaster = Broadcaster()
+
+
+def sse(data, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {data}\n\n"
+
+
+async def event_stream(user_id, load_snapshot, heartbeat_secs=15):
+    """
+    SSE body: the current snapshot, then one `data:` frame per delta.
+    The snapshot is read only once the subscription is live, so no delta falls
+    between the two. Comment frames keep proxies (e.g. Heroku's 55s idle
+    cut-off) from closing the stream.
+    """
+    queue = broadcaster.subscribe(user_id)
+    try:
+        try:
+            await asyncio.wait_for(broadcaster.ready.wait(), heartbeat_secs)
+        except asyncio.TimeoutError:
+            logger.warning("Dashboard fan-out not ready, sending snapshot anyway")
+        _, snapshot = await load_snapshot()
+        yield sse(snapshot, 'snapshot')
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), heartbeat_secs)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if data is None:
+                return
+            yield sse(data)
+    finally:
+        broadcaster.unsubscribe(user_id, queue)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from tradeapp.analytics import rebuild
+import time
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily and per-symbol trade summaries from Trade history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to rebuild (default: all users)')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if not user:
+                self.stdout.write(self.style.ERROR(f"No such user: {options['user']}"))
+                return
+
+        started = time.monotonic()
+        count = rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f"✅ Summarized {count} closed trades in {time.monotonic() - started:.1f}s."))
@@ -0,0 +1,133 @@
+from django.core.management.base import BaseCommand
+from tradeapp import http_pool
+from datetime import datetime, time as dtime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import SmartApi.smartConnect as smart
+import json
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+ORDER_REPLY = json.dumps({"status": True, "message": "SUCCESS", "errorcode": "",
+                          "data": {"orderid": "STANDIN1", "script": "SBIN-EQ"}}).encode()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open like the real API
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def _reply(self, body=b""):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(ORDER_REPLY)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local HTTPS stand-in; `connect_delay` adds a per-connection setup cost (network RTTs)."""
+    daemon_threads = True
+
+    def __init__(self, addr, context, connect_delay):
+        super().__init__(addr, StandInHandler)
+        self.context = context
+        self.connect_delay = connect_delay
+        self.connections = 0
+
+    def get_request(self):
+        sock, addr = self.socket.accept()
+        self.connections += 1
+        time.sleep(self.connect_delay)
+        return self.context.wrap_socket(sock, server_side=True), addr
+
+
+def _self_signed(directory):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+
+class Command(BaseCommand):
+    help = 'Measures first-order latency after idle, with and without the keep-alive pool, against a local HTTPS stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10, help='Orders per mode, each after an idle gap')
+        parser.add_argument('--idle', type=float, default=0.5, help='Idle seconds before each order')
+        parser.add_argument('--connect-delay-ms', type=float, default=30.0, help='Simulated per-connection setup cost')
+        parser.add_argument('--pool-size', type=int, default=http_pool.POOL_SIZE)
+
+    def _place(self, client):
+        started = time.perf_counter()
+        client.placeOrder({"variety": "NORMAL", "tradingsymbol": "SBIN-EQ", "symboltoken": "3045",
+                           "transactiontype": "BUY", "exchange": "NSE", "ordertype": "MARKET",
+                           "producttype": "INTRADAY", "duration": "DAY", "price": 0, "quantity": 1})
+        return (time.perf_counter() - started) * 1000.0
+
+    def _run(self, client, orders, idle, keepalive=None):
+        samples = []
+        for _ in range(orders):
+            time.sleep(idle)
+            if keepalive is not None and keepalive.due():
+                keepalive.warm()
+            samples.append(self._place(client))
+        return samples
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            cert, key = _self_signed(tmp)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+            server = StandInServer(("127.0.0.1", 0), context, options['connect_delay_ms'] / 1000.0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            root = f"https://127.0.0.1:{server.server_address[1]}"
+            client = smart.SmartConnect(api_key="standin", root=root)
+            client.setAccessToken("standin")
+
+            # 1. Stock SmartConnect: a new connection per call
+            http_pool.uninstall()
+            os.environ['REQUESTS_CA_BUNDLE'] = cert
+            before = server.connections
+            cold = self._run(client, options['orders'], options['idle'])
+            cold_conns = server.connections - before
+            del os.environ['REQUESTS_CA_BUNDLE']
+
+            # 2. Shared pool, pre-warmed, kept alive through the idle gaps
+            pooled = http_pool.PooledRequests(http_pool.new_session(options['pool_size']), ca_bundle=cert)
+            smart.requests = pooled
+            # Pinned mid-session clock so the keepalive schedule applies whatever the time of day
+            mid_session = lambda: datetime.combine(datetime.now().date(), dtime(10, 0))
+            keepalive = http_pool.KeepAlive(pooled, root, options['pool_size'], interval=options['idle'] / 2, clock=mid_session)
+            before = server.connections
+            warmed = keepalive.warm()
+            warm = self._run(client, options['orders'], options['idle'], keepalive)
+            warm_conns = server.connections - before
+            http_pool.uninstall()
+            server.shutdown()
+
+        def row(name, samples, conns):
+            self.stdout.write(f"{name:<10} first {samples[0]:7.1f} ms | median {statistics.median(samples):7.1f} ms"
+                              f" | max {max(samples):7.1f} ms | connections opened {conns}")
+
+        self.stdout.write(self.style.WARNING(f"📡 {options['orders']} orders, {options['idle']}s idle before each, "
+                                             f"{options['connect_delay_ms']:.0f} ms simulated connect cost"))
+        row("no pool", cold, cold_conns)
+        row("pooled", warm, warm_conns)
+        self.stdout.write(self.style.SUCCESS(f"✅ Pre-warmed {warmed}/{options['pool_size']} connections; "
+                                             f"median saving {statistics.median(cold) - statistics.median(warm):.1f} ms per order"))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from tradeapp.models import APICredential
+from tradeapp.ratelimit import get_quota
 from SmartApi.smartWebSocketV2 import SmartWebSocketV2
 import requests
 import logging
@@ -45,6 +46,10 @@ class Command(BaseCommand):
         }
         try:
             url = "https://apiconnect.angelbroking.com/rest/secure/angelbroking/user/v1/getProfile"
+            # Shares the broker budget with the running engines
+            waited = get_quota().acquire('session')
+            if waited > 0.01:
+                self.stdout.write(f"   (waited {waited:.2f}s for broker quota)")
             resp = requests.get(url, headers=headers)
             
             if resp.status_code == 200:
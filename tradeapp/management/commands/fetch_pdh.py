@@ -1,65 +1,112 @@
 from django.core.management.base import BaseCommand
+from django.conf import settings
 from tradeapp.models import APICredential
-from tradeapp.angel_utils import AngelConnect, get_redis_client
-from tradeapp.constants import FINAL_DICTIONARY_OBJECT
+from tradeapp.angel_utils import create_broker, get_redis_client
+from tradeapp.instruments import trading_universe
+from tradeapp.metrics import registry as metrics
+from tradeapp.history import HistoryStore
+from tradeapp.levels import compute_levels, publish_levels, last_completed_day, LEVELS_TTL_SECS
+from tradeapp.indicators import WARMUP_DAYS
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 import json
 import time
 import logging
 
+# Enough calendar days for ATR(14) and 20-session averages
+LOOKBACK_DAYS = 45
+
 logger = logging.getLogger('pdh_fetcher')
 
 class Command(BaseCommand):
-    help = 'Fetches Previous Day High (PDH) and Low (PDL)'
+    help = ('Pre-open job: refreshes daily history and publishes PDH/PDL, pivots, ATR and volume levels; '
+            'also fetches the minute window the algo engine warms its indicators from')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'HISTORY_FETCH_WORKERS', 6))
+        parser.add_argument('--retries', type=int, default=2, help='Extra passes over failed symbols')
+        parser.add_argument('--warmup-days', type=int, default=WARMUP_DAYS,
+                            help='Calendar days of ONE_MINUTE history to keep for indicator warm-up (0 skips it)')
+
+    def _fetch(self, angel, store, start, end, warmup_start, symbol, token):
+        # Only the days missing from the local store hit the API; the broker
+        # quota paces them (history class, below orders and reconciliation)
+        try:
+            ok = store.ensure(angel, token, "ONE_DAY", start, end)
+            # The window IndicatorBook.warm_up reads at engine start; after the
+            # first run only the newest session is missing
+            if warmup_start is not None:
+                ok = store.ensure(angel, token, "ONE_MINUTE", warmup_start, end) and ok
+            return symbol, ok
+        except Exception as e:
+            logger.error(f"Error {symbol}: {e}")
+            return symbol, False
 
     def handle(self, *args, **options):
         r = get_redis_client()
         creds = APICredential.objects.first()
-        
+
         if not creds or not creds.access_token:
             self.stdout.write(self.style.ERROR('No Valid Credentials Found.'))
             return
 
-        angel = AngelConnect(creds.api_key, creds.access_token, creds.refresh_token, creds.feed_token)
-        
-        self.stdout.write(self.style.SUCCESS(f'Fetching PDH for {len(FINAL_DICTIONARY_OBJECT)} stocks...'))
-        
-        PREV_DAY_HASH = "prev_day_ohlc" 
-        count = 0
-        
-        for symbol, token in FINAL_DICTIONARY_OBJECT.items():
-            try:
-                candles = angel.get_historical_data(token, interval="ONE_DAY")
-                
-                if candles and len(candles) > 0:
-                    # Logic: Get the last COMPLETED day.
-                    # candles[-1] is the most recent data point.
-                    # If fetching during market hours, candles[-1] is TODAY (Incomplete).
-                    # We need YESTERDAY (candles[-2]) if candles[-1] date matches today.
-                    
-                    # For simplicity in this fix, we take the last available candle 
-                    # assuming the intention is the "most recent previous high reference"
-                    
-                    last_candle = candles[-1]
-                    
-                    data = {
-                        "high": last_candle[2],
-                        "low": last_candle[3],
-                        "close": last_candle[4],
-                        "date": last_candle[0]
-                    }
-                    
-                    r.hset(PREV_DAY_HASH, symbol, json.dumps(data))
-                    count += 1
-                    
-                    if count % 20 == 0:
-                        self.stdout.write(f"Processed {count}...")
-                        
-                    time.sleep(0.35) # Rate Limit
-                else:
-                    print(f"No history for {symbol}")
-
-            except Exception as e:
-                print(f"Error {symbol}: {e}")
-                time.sleep(1)
-
-        self.stdout.write(self.style.SUCCESS(f'Successfully cached PDH for {count} stocks.'))
\ No newline at end of file
+        angel = create_broker(creds)
+        store = HistoryStore()
+        # Quota waits show up next to the engines' on the metrics endpoint
+        metrics.start_publisher('pdh_fetcher', r)
+        universe = {symbol: token for token, symbol in trading_universe().items()}
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshing daily and warm-up history for {len(universe)} stocks "
+            f"({options['workers']} workers @ {getattr(settings, 'HISTORY_API_RATE', 3.0)}/s)..."
+        ))
+
+        PREV_DAY_HASH = getattr(settings, "BREAKOUT_PREV_DAY_HASH", "prev_day_ohlc")
+        started = time.monotonic()
+        end = last_completed_day()
+        start = end - timedelta(days=LOOKBACK_DAYS)
+        warmup_start = end - timedelta(days=options['warmup_days']) if options['warmup_days'] > 0 else None
+        todo = list(universe.items())
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for attempt in range(options['retries'] + 1):
+                if not todo:
+                    break
+                if attempt:
+                    self.stdout.write(self.style.WARNING(f"Retrying {len(todo)} failed symbols (pass {attempt})..."))
+                results = pool.map(lambda item: self._fetch(angel, store, start, end, warmup_start, *item), todo)
+                todo = [(s, universe[s]) for s, ok in results if not ok]
+
+        store.save_manifest()
+
+        for symbol, _ in todo:
+            self.stdout.write(self.style.ERROR(f"No history for {symbol}"))
+
+        # Levels for the whole universe in one columnar pass. The cutoff drops
+        # today's forming candle, so an intraday run still gets yesterday's PDH.
+        daily = {symbol: store.load(token, "ONE_DAY", start, end) for symbol, token in universe.items()}
+        symbols, levels = compute_levels(daily)
+
+        # Legacy per-symbol hash, kept for tooling and as the engine's fallback
+        results = {
+            symbol: json.dumps({
+                "high": levels['pdh'][i],
+                "low": levels['pdl'][i],
+                "close": levels['pdc'][i],
+                "date": date.fromordinal(int(levels['session'][i])).isoformat()
+            })
+            for i, symbol in enumerate(symbols)
+        }
+
+        # One round trip each for the whole universe
+        if results:
+            r.hset(PREV_DAY_HASH, mapping=results)
+            r.expire(PREV_DAY_HASH, LEVELS_TTL_SECS)
+            size = publish_levels(get_redis_client(decode_responses=False), symbols, levels)
+            self.stdout.write(f"Published reference levels ({size / 1024:.1f} KB)")
+
+        elapsed = time.monotonic() - started
+        count, total, longest = metrics.summaries.get('quota_wait_history_seconds', (0, 0.0, 0.0))
+        if count:
+            self.stdout.write(f"Broker quota: {count} history calls, waited {total:.1f}s in total (max {longest:.2f}s)")
+        self.stdout.write(self.style.SUCCESS(f'Successfully cached levels for {len(results)} stocks in {elapsed:.1f}s.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from tradeapp.angel_utils import get_redis_client
+from tradeapp.profiling import CONTROL_KEY
+import json
+
+
+class Command(BaseCommand):
+    help = 'Asks a running engine to profile itself for a bounded window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('engine', choices=['algo_engine', 'data_engine'])
+        parser.add_argument('--seconds', type=float, default=30)
+        parser.add_argument('--interval-ms', type=float, default=5, help='Stack sampling interval')
+
+    def handle(self, *args, **options):
+        r = get_redis_client()
+        key = CONTROL_KEY.format(engine=options['engine'])
+        # Expire the request so a stopped engine doesn't pick it up hours later
+        ttl = int(options['seconds']) + 60
+        r.set(key, json.dumps({'seconds': options['seconds'], 'interval_ms': options['interval_ms']}), ex=ttl)
+        self.stdout.write(self.style.SUCCESS(f"🔬 Profile requested for {options['engine']} ({options['seconds']:.0f}s)"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from tradeapp import instruments
+from collections import Counter
+import time
+
+class Command(BaseCommand):
+    help = "Downloads (or reads) Angel's scrip master and rewrites the binary instrument cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help='Scrip-master JSON file or URL (default: INSTRUMENT_MASTER_FILE, else INSTRUMENT_MASTER_URL)')
+        parser.add_argument('--universe', default=instruments.DEFAULT_UNIVERSE, help='Universe to report on')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        master = instruments.refresh(options['source'])
+        built = time.monotonic() - started
+
+        started = time.monotonic()
+        instruments.read_cache()
+        loaded = time.monotonic() - started
+
+        by_exchange = Counter(master.exchange_names[e] for e in master.exchange)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(master)} instruments cached to {instruments.CACHE_PATH} in {built:.1f}s "
+            f"(reload {loaded * 1000:.0f} ms)"
+        ))
+        self.stdout.write("   " + ", ".join(f"{name} {count}" for name, count in by_exchange.most_common()))
+        universe = master.universe(options['universe'])
+        self.stdout.write(f"   Universe '{options['universe']}': {len(universe)} instruments")
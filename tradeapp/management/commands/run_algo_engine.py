@@ -3,17 +3,32 @@ import time
 import logging
 import threading
 from math import floor
-from datetime import datetime as dt, timedelta
+from datetime import datetime as dt, time as dtime
 from typing import Dict, Any
 
 import pytz
 import redis
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.db.models import Sum
 from django.conf import settings
+from django.utils import timezone
 
 from tradeapp.models import APICredential, Trade, StrategySettings
-from tradeapp.angel_utils import AngelConnect, get_redis_client
+from tradeapp.angel_utils import create_broker, get_redis_client
+from tradeapp.constants import ENTRY_OFFSET_PCT, STOP_OFFSET_PCT, TARGET_R_MULTIPLE, SIGNAL_EXPIRY_MINUTES
+from tradeapp.risk import RiskBook
+from tradeapp.candles import decode_candle, minute_epoch, ProcessedCandles
+from tradeapp.profiling import timed, start_profile_controller
+from tradeapp.metrics import registry as metrics
+from tradeapp.levels import load_levels, levels_version, is_current, last_session_day
+from tradeapp.instruments import trading_universe
+from tradeapp.shm_ring import CandleRing
+from tradeapp.scheduler import TimerWheel
+from tradeapp.journal import Journal
+from tradeapp.indicators import IndicatorBook
+from tradeapp.history import HistoryStore
+from tradeapp.positions import Position
+from tradeapp.dashboard import publish_event
 
 # Logging Setup
 logging.basicConfig(level=logging.INFO)
@@ -23,63 +38,210 @@ IST = pytz.timezone("Asia/Kolkata")
 CANDLE_STREAM_KEY = getattr(settings, "BREAKOUT_CANDLE_STREAM", "candle_1m")
 LIVE_OHLC_KEY = getattr(settings, "BREAKOUT_LIVE_OHLC_KEY", "live_ohlc_data")
 PREV_DAY_HASH = "prev_day_ohlc"
-ENTRY_OFFSET_PCT = 0.0001
-STOP_OFFSET_PCT = 0.0002
+# Live reads size themselves between these from the observed backlog
+CONSUMER_BATCH = getattr(settings, "BREAKOUT_CONSUMER_BATCH", 100)
+CONSUMER_BATCH_MAX = getattr(settings, "BREAKOUT_CONSUMER_BATCH_MAX", 2000)
+# Pending entries are checked whenever the consumer catches up, and at least this often while it drains
+PENDING_CHECK_SECS = getattr(settings, "BREAKOUT_PENDING_CHECK_SECS", 1.0)
+RECONCILE_INTERVAL_SECS = 5
+MTM_PUBLISH_SECS = 1
+# Restart catch-up: backlog read size, and how old a candle may be and still raise a signal
+CATCHUP_BATCH = getattr(settings, "BREAKOUT_CATCHUP_BATCH", 1000)
+CATCHUP_FRESH_SECS = getattr(settings, "BREAKOUT_CATCHUP_FRESH_SECS", SIGNAL_EXPIRY_MINUTES * 60)
+CHECKPOINT_KEY = "algo_checkpoint:{user_id}"
+CHECKPOINT_SECS = 5
+# A symbol with no PDH anywhere is looked up again after this long (fetch_pdh may not have run yet)
+PDH_RETRY_SECS = 30
+# Candles whose evaluation raised are retried from the group's PEL once idle this long, this many times
+RETRY_IDLE_MS = 5000
+RETRY_ATTEMPTS = 3
+# Co-located mode: how often the ring's producer is checked, and how long without a new candle
+# during the session counts as stalled
+RING_CHECK_SECS = 5
+RING_STALL_SECS = 120
+# How often the engine checks whether fetch_pdh has republished the reference levels
+LEVELS_CHECK_SECS = 30
+PROCESSED_KEY = "algo_processed:{user_id}"
+# Open positions are squared off at this IST time (and entries halted for the day)
+SQUARE_OFF_TIME = dtime.fromisoformat(getattr(settings, "BREAKOUT_SQUARE_OFF_TIME", "15:15"))
+
+
+def _stream_id_ms(msg_id):
+    return int(msg_id.split('-')[0])
+
 
 class CashBreakoutClient:
-    def __init__(self, user, api_creds):
+    def __init__(self, user, api_creds, redis_client=None, ring=None):
+        self.started_at = time.monotonic()
         self.user = user
         self.api_creds = api_creds
-        self.angel = AngelConnect(
-            api_key=api_creds.api_key, 
-            access_token=api_creds.access_token,
-            refresh_token=api_creds.refresh_token,
-            feed_token=api_creds.feed_token
-        )
-        self.redis_client = get_redis_client()
+        self.angel = create_broker(api_creds)
+        self.redis_client = redis_client or get_redis_client()
+        # Co-located mode: candles and LTPs come from shared memory, not the stream
+        self.ring = ring
         self.settings, _ = StrategySettings.objects.get_or_create(user=user)
         self.running = True
-        self.last_reconcile_time = time.time()
+        # Expiries, periodic work and session boundaries; run() drains what is due each loop
+        self.timers = TimerWheel()
+        # kind -> (interval, handler); each run schedules the next
+        self.periodic = {
+            'reconcile': (RECONCILE_INTERVAL_SECS, self._reconcile),
+            'mtm': (MTM_PUBLISH_SECS, self._publish_mtm),
+            'pending': (PENDING_CHECK_SECS, self._try_enter_pending),
+            'levels': (LEVELS_CHECK_SECS, self._check_reference_levels),
+        }
+        if ring is None:
+            self.periodic['checkpoint'] = (CHECKPOINT_SECS, self._save_checkpoint)
+            self.periodic['retry'] = (RETRY_IDLE_MS / 1000.0, self._retry_failed)
+        else:
+            self.periodic['ring'] = (RING_CHECK_SECS, self._check_ring)
+            self.ring_attached = True
+            self.ring_progress = (ring.write_seq, time.monotonic())
+        # Stream id -> evaluation attempts, for candles left pending by a failure
+        self.attempts = {}
+        self._last_mtm = None
         self.open_trades = {}
         self.pending_trades = {}
+        self.risk = RiskBook(self.settings)
+        # Set once the halt's square-off went out; later exits are retried by _reconcile()
+        self.exit_issued = False
+        self.journal = Journal(self.user.id)
         self.group_name = f"CB_GROUP:{self.user.id}"
         self.consumer_name = f"CB_CONSUMER:{threading.get_ident()}"
-        
+        self.checkpoint_key = CHECKPOINT_KEY.format(user_id=self.user.id)
+        self.last_acked_id = None
+        # Adaptive reads: next batch size, the stream lag last sampled, and the last minute's candle count
+        self.batch_size = CONSUMER_BATCH
+        self.backlog = 0
+        self.expected_burst = CONSUMER_BATCH
+        self.caught_up = False
+        # Minute currently draining: label, candles and reads so far, when its newest candle was evaluated
+        self.drain = None
+        # (token, minute) candles already evaluated today, so replays never signal twice
+        self.processed = ProcessedCandles(redis_client or get_redis_client(decode_responses=False),
+                                          PROCESSED_KEY.format(user_id=self.user.id), trading_universe())
+
         try:
-            self.redis_client.xgroup_create(CANDLE_STREAM_KEY, self.group_name, id='0', mkstream=True)
-            logger.info("✅ Redis Consumer Group Created/Ready")
+            start_id = self._group_start_id()
+            self.redis_client.xgroup_create(CANDLE_STREAM_KEY, self.group_name, id=start_id, mkstream=True)
+            logger.info(f"✅ Redis Consumer Group Created at {start_id}")
         except redis.exceptions.ResponseError:
             pass # Group already exists
 
         self._load_trades_from_db()
+        self._load_reference_levels(redis_client)
+        self._warm_up_indicators()
+
+    def _group_start_id(self):
+        """
+        Where a new consumer group starts: the saved checkpoint if it is still
+        fresh, otherwise the freshness bound. Never '0', which would replay the
+        whole stream into stale signals.
+        """
+        floor = f"{int((time.time() - CATCHUP_FRESH_SECS) * 1000)}-0"
+        saved = self.redis_client.hget(self.checkpoint_key, 'id')
+        if saved and _stream_id_ms(saved) >= _stream_id_ms(floor):
+            return saved
+        return floor
+
+    def _save_checkpoint(self):
+        if self.last_acked_id:
+            self.redis_client.hset(self.checkpoint_key, mapping={'id': self.last_acked_id, 'at': time.time()})
 
     def _load_trades_from_db(self):
         active_trades = Trade.objects.filter(
             user=self.user, 
             status__in=["OPEN", "PENDING_EXIT", "PENDING", "PENDING_ENTRY"]
         )
-        for trade in active_trades:
+        for trade in map(Position.from_trade, active_trades):
             if trade.status == "PENDING":
                 self.pending_trades[trade.symbol] = trade
-            elif trade.status in ["OPEN", "PENDING_EXIT"]:
+                self.timers.schedule(trade.expires_at, 'expire', trade)
+            else:
                 self.open_trades[trade.symbol] = trade
-        logger.info(f"📂 Loaded State: {len(self.open_trades)} Open, {len(self.pending_trades)} Pending")
+                if trade.status in ["OPEN", "PENDING_EXIT"] and trade.entry_price:
+                    self.risk.on_fill(trade.symbol, "BUY", trade.quantity, trade.entry_price)
 
+        # Seed today's risk counters once; everything after this is incremental
+        today = Trade.objects.filter(user=self.user, created_at__date=timezone.localdate())
+        self.risk.seed(
+            today.exclude(entry_order_id__isnull=True).count(),
+            today.filter(status="CLOSED").aggregate(total=Sum('pnl'))['total']
+        )
+        logger.info(f"📂 Loaded State: {len(self.open_trades)} Open, {len(self.pending_trades)} Pending, {self.risk.trade_count} Trades Today")
+
+    @timed()
     def _get_live_ohlc(self) -> Dict[str, Any]:
+        if self.ring is not None:
+            return self.ring.ltp_view()
         try:
             raw = self.redis_client.get(LIVE_OHLC_KEY)
             return json.loads(raw) if raw else {}
         except Exception:
             return {}
 
+    def _load_reference_levels(self, redis_client=None):
+        # One GET of the pre-open blob replaces a hash lookup per candle
+        self.levels_redis = redis_client or get_redis_client(decode_responses=False)
+        self.levels_version = levels_version(self.levels_redis)
+        levels = self.levels = load_levels(self.levels_redis)
+        # Everything cached from the previous table (or its fallback lookups) goes with it
+        self.prev_day_high = {}
+        self.pdh_retry_at = {}  # symbol -> monotonic time its next lookup is due
+        if levels is None:
+            logger.warning("⚠️ No reference levels blob, falling back to per-symbol lookups")
+        elif not levels.is_current():
+            logger.error(f"⛔ Reference levels are for session {dt.fromordinal(levels.asof).date()}, expected "
+                         f"{last_session_day()}; ignoring them until fetch_pdh republishes")
+        else:
+            # Rows left from an earlier session go to the per-symbol lookups, which check each entry's date
+            self.prev_day_high = levels.current_map('pdh')
+            stale = len(levels) - len(self.prev_day_high)
+            logger.info(f"📐 Reference levels for {len(self.prev_day_high)} symbols (session "
+                        f"{dt.fromordinal(levels.asof).date()})" + (f", {stale} stale rows skipped" if stale else ""))
+
+    def _check_reference_levels(self):
+        # One small GET: reload when fetch_pdh republished, or when the loaded table goes out of date
+        stale = self.levels is not None and self.prev_day_high and not self.levels.is_current()
+        if stale or levels_version(self.levels_redis) != self.levels_version:
+            self._load_reference_levels(self.levels_redis)
+
+    def _warm_up_indicators(self):
+        # EMA/RSI/ATR/VWAP/range/volume per symbol, for any strategy: self.indicators.get(symbol)
+        self.indicators = IndicatorBook(trading_universe())
+        started = time.perf_counter()
+        warmed = self.indicators.warm_up(HistoryStore())
+        logger.info(f"📈 Indicators warmed from stored minute history for {warmed}/{len(self.indicators)} symbols "
+                    f"in {time.perf_counter() - started:.2f}s")
+
+    def _prefetch_prev_day_high(self, symbols):
+        # One HMGET per batch for symbols the levels blob did not cover
+        now = time.monotonic()
+        missing = list({s for s in symbols if s not in self.prev_day_high and self.pdh_retry_at.get(s, 0) <= now})
+        if not missing:
+            return
+        for symbol, raw in zip(missing, self.redis_client.hmget(PREV_DAY_HASH, missing)):
+            pdh = None
+            if raw:
+                try:
+                    entry = json.loads(raw)
+                    session = entry.get('date')
+                    # Entries from an earlier session are as stale as the blob they were published with
+                    if not session or is_current(dt.fromisoformat(session[:10]).toordinal()):
+                        pdh = float(entry.get('high', 0)) or None
+                except (ValueError, AttributeError):
+                    pass
+            if pdh is None:
+                # Not published yet, or stale: ask again on a later batch
+                self.pdh_retry_at[symbol] = now + PDH_RETRY_SECS
+            else:
+                self.prev_day_high[symbol] = pdh
+                self.pdh_retry_at.pop(symbol, None)
+
     def _get_prev_day_high(self, symbol):
-        raw = self.redis_client.hget(PREV_DAY_HASH, symbol)
-        if raw:
-            try:
-                data = json.loads(raw)
-                return float(data.get('high', 0))
-            except: pass
-        return None
+        if symbol not in self.prev_day_high:
+            self._prefetch_prev_day_high([symbol])
+        return self.prev_day_high.get(symbol)
 
     def _calculate_quantity(self, entry_price, sl_price):
         risk_per_share = abs(entry_price - sl_price)
@@ -87,13 +249,32 @@ class CashBreakoutClient:
         qty = floor(float(self.settings.per_trade_sl_amount) / risk_per_share)
         return int(qty)
 
-    def _process_candle(self, candle):
+    @timed()
+    def _process_candle(self, candle, seen_at=None):
+        """`seen_at`: when the candle was published, for backlog candles replayed after a restart."""
+        # 0. Exactly once per (token, minute), whatever the stream redelivers
+        if not self.processed.mark(candle):
+            metrics.inc('candles_duplicate_total')
+            return
+        try:
+            self._evaluate_candle(candle, seen_at)
+        except Exception:
+            # Left pending by the caller, so its redelivery must be evaluated
+            self.processed.unmark(candle)
+            raise
+
+    def _evaluate_candle(self, candle, seen_at):
         symbol = candle['symbol']
         
         # 1. Skip Duplicate
         if symbol in self.pending_trades or symbol in self.open_trades:
             return
 
+        allowed, reason = self.risk.can_enter()
+        if not allowed:
+            logger.debug(f"⚠️ Skipping {symbol}: {reason}")
+            return
+
         # 2. Check PDH (Crucial Step)
         pdh = self._get_prev_day_high(symbol)
         
@@ -115,86 +296,535 @@ class CashBreakoutClient:
         if not (open_ < pdh): return
         
         # 4. Trigger Found
-        logger.info(f"🚀 SIGNAL DETECTED: {symbol} | Close {close} > PDH {pdh}")
+        ind = self.indicators.get(symbol)
+        context = f" | RSI {ind['rsi']:.0f} ATR {ind['atr']:.2f} VWAP {ind['vwap']:.2f}" if ind else ""
+        logger.info(f"🚀 SIGNAL DETECTED: {symbol} | Close {close} > PDH {pdh}{context}")
         
         entry_level = high * (1.0 + ENTRY_OFFSET_PCT)
         stop_level = low - (low * STOP_OFFSET_PCT)
-        target_level = entry_level + (2.5 * (entry_level - stop_level))
+        target_level = entry_level + (TARGET_R_MULTIPLE * (entry_level - stop_level))
         
-        # Create DB Entry
-        trade = Trade.objects.create(
-            user=self.user,
+        # Journal the signal; the row is written with the batch's flush
+        trade = Position(
+            user_id=self.user.id,
             symbol=symbol,
             token=candle['token'],
-            candle_ts=timezone.now(),
+            candle_ts=seen_at or timezone.now(),
             candle_open=open_, candle_high=high, candle_low=low, candle_close=close,
             prev_day_high=pdh,
             entry_level=entry_level,
             stop_level=stop_level,
             target_level=target_level,
-            status="PENDING"
         )
+        self.journal.signal(trade)
+        metrics.inc('signals_total')
         self.pending_trades[symbol] = trade
+        self.timers.schedule(trade.expires_at, 'expire', trade)
         logger.info(f"📝 Trade Registered PENDING: {symbol} @ {entry_level}")
 
+    @timed()
     def _try_enter_pending(self):
+        if not self.pending_trades and not self.open_trades:
+            return  # nothing to trigger or mark: skip the snapshot GET
         live_data = self._get_live_ohlc()
         to_remove = []
         
+        # Expiry is the timer wheel's job (_run_timers), live data or not
         for symbol, trade in self.pending_trades.items():
             if symbol not in live_data: continue
             
             ltp = float(live_data[symbol].get('ltp', 0))
             
-            # Expiry
-            if timezone.now() > trade.candle_ts + timedelta(minutes=6):
-                trade.status = "EXPIRED"
-                trade.save()
-                to_remove.append(symbol)
-                logger.info(f"⌛ Expired: {symbol}")
-                continue
-
             # Entry Trigger
-            if ltp > float(trade.entry_level):
-                qty = self._calculate_quantity(ltp, float(trade.stop_level))
+            if ltp > trade.entry_level:
+                allowed, reason = self.risk.can_enter()
+                if not allowed:
+                    continue
+                qty = self._calculate_quantity(ltp, trade.stop_level)
                 if qty > 0:
                     try:
                         logger.info(f"⚡ Placing BUY Order: {symbol} Qty: {qty}...")
                         order_id = self.angel.place_order(trade.token, trade.symbol, qty, "BUY")
-                        trade.status = "PENDING_ENTRY"
-                        trade.entry_order_id = order_id
-                        trade.quantity = qty
-                        trade.save()
+                        metrics.inc('orders_placed_total')
+                        self.journal.record(trade, "ORDER", "PENDING_ENTRY", entry_order_id=order_id, quantity=qty)
+                        self.risk.on_entry_order()
+                        self.open_trades[symbol] = trade
                         logger.info(f"✅ Order Placed: {symbol} ID: {order_id}")
                     except Exception as e:
                         logger.error(f"❌ Order Failed {symbol}: {e}")
-                        trade.status = "FAILED_ENTRY"
-                        trade.save()
+                        metrics.inc('orders_failed_total')
+                        self.journal.record(trade, "REJECT", "FAILED_ENTRY", exit_reason=str(e)[:100])
                 to_remove.append(symbol)
 
         for s in to_remove:
             del self.pending_trades[s]
+        self._flush_journal()
+
+        # Mark-to-market open positions (O(open positions), not O(universe))
+        for symbol in self.open_trades:
+            if symbol in live_data:
+                self.risk.on_price(symbol, float(live_data[symbol].get('ltp', 0)))
+
+    def _check_portfolio_exit(self):
+        if self.exit_issued:
+            return
+        self.risk.check_pnl_exit()
+        if self.risk.halted:
+            self.exit_issued = True
+            self._square_off_all(self.risk.halt_reason)
+
+    def _publish_mtm(self):
+        # Live dashboards get position marks at most once a second, and only when they moved
+        positions = {
+            symbol: {'ltp': round(last, 2), 'pnl': round(qty * (last - avg), 2)}
+            for symbol, (qty, avg, last) in self.risk.positions.items()
+        }
+        mtm = {'type': 'mtm', 'positions': positions, 'total_pnl': round(self.risk.total_pnl, 2)}
+        if mtm != self._last_mtm:
+            publish_event(self.user.id, mtm, self.redis_client)
+            self._last_mtm = mtm
+
+    # --- Timers ---------------------------------------------------------------
+
+    def _schedule_session(self):
+        """Today's entry window and square-off time (the engine is restarted every trading day)."""
+        today = dt.now(IST).date()
+        now = time.time()
+        for kind, at in (('session_open', self.risk.start_time), ('session_close', self.risk.end_time),
+                         ('square_off', SQUARE_OFF_TIME)):
+            epoch = IST.localize(dt.combine(today, at)).timestamp()
+            if epoch > now:
+                self.timers.schedule(epoch, kind)
+        # From here on can_enter() reads the flag instead of the clock
+        self.risk.session_open = self.risk.in_session(dt.now(IST))
+
+    def _run_timers(self):
+        now = time.time()
+        expired = []
+        for timer in self.timers.advance(now):
+            kind = timer.kind
+            if kind == 'expire':
+                # Lazily cancelled: the signal may have been entered or cancelled since
+                if self.pending_trades.get(timer.payload.symbol) is timer.payload:
+                    expired.append(timer.payload)
+                continue
+            try:
+                if kind in self.periodic:
+                    secs, handler = self.periodic[kind]
+                    # Rescheduled first, so a failing handler still runs next interval
+                    self.timers.schedule(now + secs, kind)
+                    handler()
+                elif kind in ('session_open', 'session_close'):
+                    self.risk.session_open = kind == 'session_open'
+                    logger.info(f"🔔 Entry window {'open' if self.risk.session_open else 'closed'}")
+                elif kind == 'square_off':
+                    # _check_portfolio_exit squares off everything once halted
+                    self.risk.halt("Square-off time")
+            except Exception as e:
+                logger.error(f"Timer {kind} failed: {e}")
+        if expired:
+            self._expire(expired)
+
+    def _expire(self, positions):
+        # One timestamp and one flush: a single bulk UPDATE for every signal due this pass
+        at = timezone.now()
+        for trade in positions:
+            self.journal.record(trade, "EXPIRE", "EXPIRED", at=at)
+            del self.pending_trades[trade.symbol]
+        logger.info(f"⌛ Expired {len(positions)}: {', '.join(t.symbol for t in positions)}")
+        self._flush_journal()
+
+    def _square_off_all(self, reason):
+        # Watched signals are cancelled in the same flush as the square-off orders
+        if self.pending_trades:
+            now = timezone.now()
+            for t in self.pending_trades.values():
+                self.journal.record(t, "CANCEL", "CANCELLED", at=now, exit_reason=reason)
+            logger.info(f"🧹 Cancelled {len(self.pending_trades)} pending signals: {reason}")
+            self.pending_trades.clear()
+        self._place_exits(reason, ("OPEN",))
+
+    def _place_exits(self, reason, statuses):
+        for symbol, trade in self.open_trades.items():
+            if trade.status not in statuses:
+                continue
+            try:
+                logger.info(f"⚡ Square-off SELL: {symbol} Qty: {trade.quantity}...")
+                order_id = self.angel.place_order(trade.token, trade.symbol, trade.quantity, "SELL")
+                metrics.inc('orders_placed_total')
+                self.journal.record(trade, "EXIT_ORDER", "PENDING_EXIT", exit_order_id=order_id, exit_reason=reason)
+            except Exception as e:
+                logger.error(f"❌ Square-off Failed {symbol}: {e}")
+                metrics.inc('orders_failed_total')
+                self.journal.record(trade, "REJECT", "FAILED_EXIT", exit_reason=str(e)[:100])
+        self._flush_journal()
+
+    def _reconcile(self):
+        self._reconcile_orders()
+        # After the square-off: SELL again where the exit failed, or where an entry filled since
+        if self.exit_issued and any(t.status in ("OPEN", "FAILED_EXIT") for t in self.open_trades.values()):
+            logger.info(f"🔁 Retrying square-off: {self.risk.halt_reason}")
+            self._place_exits(self.risk.halt_reason, ("OPEN", "FAILED_EXIT"))
 
-    # ... (Reconcile and Monitor methods remain similar, but add logger.info messages) ...
-    # I've shortened them here for brevity, but the logic is the same
+    @timed()
+    def _reconcile_orders(self):
+        waiting = {}
+        for trade in self.open_trades.values():
+            if trade.status == "PENDING_ENTRY" and trade.entry_order_id:
+                waiting[trade.entry_order_id] = trade
+            elif trade.status == "PENDING_EXIT" and trade.exit_order_id:
+                waiting[trade.exit_order_id] = trade
+        if not waiting:
+            return
+
+        statuses = self.angel.get_order_statuses(waiting.keys())
+        closed = []
+        for order_id, info in statuses.items():
+            trade = waiting[order_id]
+            status = info['status'].lower()
+            if status == 'complete':
+                price = info['average_price']
+                if trade.status == "PENDING_ENTRY":
+                    self.journal.record(trade, "FILL", "OPEN", entry_price=price,
+                                        quantity=info['filled_quantity'] or trade.quantity)
+                    self.risk.on_fill(trade.symbol, "BUY", trade.quantity, price)
+                    logger.info(f"🟢 Entry Filled: {trade.symbol} @ {price}")
+                else:
+                    pnl = (price - (trade.entry_price or price)) * trade.quantity
+                    self.journal.record(trade, "EXIT_FILL", "CLOSED", exit_price=price, pnl=pnl)
+                    self.risk.on_fill(trade.symbol, "SELL", trade.quantity, price)
+                    closed.append(trade.symbol)
+                    logger.info(f"🏁 Exit Filled: {trade.symbol} @ {price} PnL {pnl:.2f}")
+            elif status in ('rejected', 'cancelled'):
+                failed = "FAILED_ENTRY" if trade.status == "PENDING_ENTRY" else "FAILED_EXIT"
+                self.journal.record(trade, "REJECT", failed, exit_reason=(info.get('text') or status)[:100])
+                if failed == "FAILED_ENTRY":
+                    closed.append(trade.symbol)
+
+        for symbol in closed:
+            del self.open_trades[symbol]
+        # Closed trades are folded into the analytics summaries inside the flush
+        self._flush_journal()
+
+    def _sample_stream_health(self):
+        # Runs on the metrics publisher thread every few seconds
+        for group in self.redis_client.xinfo_groups(CANDLE_STREAM_KEY):
+            if group['name'] != self.group_name:
+                continue
+            lag = group.get('lag') or 0
+            self.backlog = lag
+            metrics.set_gauge('stream_pending', group['pending'])
+            metrics.set_gauge('stream_lag', lag)
+            if not lag:
+                metrics.set_gauge('stream_lag_seconds', 0.0)
+                continue
+            last_id = self.redis_client.xinfo_stream(CANDLE_STREAM_KEY)['last-generated-id']
+            newest_ms = int(last_id.split('-')[0])
+            delivered_ms = int(group['last-delivered-id'].split('-')[0])
+            metrics.set_gauge('stream_lag_seconds', max(0, newest_ms - delivered_ms) / 1000.0)
+
+    def _consume_batch(self, block=1000):
+        """
+        One XREADGROUP batch: a single pipelined PDH lookup for the batch, then
+        one multi-id XACK once the batch's journal flush has committed. A candle
+        whose processing fails stays pending instead of being acknowledged, and
+        _retry_failed() picks it up again.
+        """
+        if self.ring is not None:
+            return self._consume_ring(block)
+        requested = self.batch_size
+        messages = self.redis_client.xreadgroup(
+            self.group_name, self.consumer_name, {CANDLE_STREAM_KEY: '>'}, count=requested, block=block
+        )
+        if not messages:
+            self._size_next_batch((), requested)
+            return 0
+        batch = [(msg_id, decode_candle(msg_data)) for _, msg_list in messages for msg_id, msg_data in msg_list]
+        metrics.inc('candles_consumed_total', len(batch))
+        # Indicators first, so strategies evaluating the batch see its candles folded in
+        self.indicators.update(candle for _, candle in batch)
+        self._prefetch_prev_day_high([candle['symbol'] for _, candle in batch])
+
+        done = []
+        for msg_id, candle in batch:
+            try:
+                self._process_candle(candle)
+                done.append(msg_id)
+            except Exception as e:
+                logger.error(f"Candle {msg_id} failed, left pending: {e}")
+        self._flush_journal()
+        self._ack(done)
+        if done:
+            self.last_acked_id = done[-1]
+        self._size_next_batch([candle for _, candle in batch], requested)
+        return len(batch)
+
+    def _catch_up(self):
+        """
+        Drains whatever the stream holds for this group before the first live
+        pass, in CATCHUP_BATCH reads. Candles older than CATCHUP_FRESH_SECS are
+        acknowledged without evaluation; fresher ones can still register signals
+        (stamped with their publish time, so the usual expiry applies). Nothing
+        here places orders: entries only start in run()'s live loop.
+        """
+        processed = skipped = 0
+
+        def replay(entries):
+            nonlocal processed, skipped
+            done, stale = self._replay(entries, int((time.time() - CATCHUP_FRESH_SECS) * 1000))
+            processed += len(done) - stale
+            skipped += stale
+
+        # 1. Deliveries a previous run read but never acknowledged (one engine per user)
+        cursor = '0-0'
+        while True:
+            cursor, entries, *_ = self.redis_client.xautoclaim(
+                CANDLE_STREAM_KEY, self.group_name, self.consumer_name, 0, cursor, count=CATCHUP_BATCH)
+            replay(entries)
+            if cursor == '0-0':
+                break
+
+        # 2. Everything published while the engine was down
+        while True:
+            messages = self.redis_client.xreadgroup(
+                self.group_name, self.consumer_name, {CANDLE_STREAM_KEY: '>'}, count=CATCHUP_BATCH)
+            entries = [entry for _, msg_list in messages for entry in msg_list] if messages else []
+            replay(entries)
+            if len(entries) < CATCHUP_BATCH:
+                break
+
+        self._save_checkpoint()
+        ttl = time.monotonic() - self.started_at
+        metrics.set_gauge('time_to_live_seconds', ttl)
+        metrics.inc('catchup_candles_skipped_total', skipped)
+        logger.info(f"⏩ Caught up in {ttl:.2f}s after start: {processed} backlog candles evaluated, "
+                    f"{skipped} stale skipped, {len(self.pending_trades)} pending signals")
+
+    def _catch_up_ring(self):
+        """
+        Co-located counterpart of _catch_up(). A ring reader starts at the
+        oldest candle the ring still holds; the processed bitmap drops those a
+        previous run evaluated, and candles older than CATCHUP_FRESH_SECS only
+        feed the indicators. The rest are evaluated as of their minute's close.
+        """
+        floor = time.time() - CATCHUP_FRESH_SECS
+        processed = skipped = 0
+        while True:
+            batch = self.ring.read(limit=CATCHUP_BATCH)
+            self.indicators.update(batch)
+            fresh = [candle for candle in batch if minute_epoch(candle['ts']) + 60 >= floor]
+            skipped += len(batch) - len(fresh)
+            self._prefetch_prev_day_high([candle['symbol'] for candle in fresh])
+            for candle in fresh:
+                try:
+                    self._process_candle(candle, seen_at=dt.fromtimestamp(minute_epoch(candle['ts']) + 60, IST))
+                    processed += 1
+                except Exception as e:
+                    logger.error(f"Candle {candle['symbol']} {candle['ts']} failed on replay: {e}")
+            self._flush_journal()
+            self._ack()
+            if len(batch) < CATCHUP_BATCH:
+                break
+
+        ttl = time.monotonic() - self.started_at
+        metrics.set_gauge('time_to_live_seconds', ttl)
+        metrics.inc('catchup_candles_skipped_total', skipped)
+        logger.info(f"⏩ Caught up from the ring in {ttl:.2f}s after start: {processed} fresh candles replayed, "
+                    f"{skipped} stale skipped, {len(self.pending_trades)} pending signals")
+
+    def _replay(self, entries, floor_ms):
+        """
+        Evaluates (msg_id, fields) entries read back from the stream: those
+        published before `floor_ms` are acknowledged unevaluated, fresher ones
+        are evaluated as of their publish time. Failures stay pending.
+        Returns (acknowledged ids, how many of them were stale).
+        """
+        batch = [(msg_id, decode_candle(fields)) for msg_id, fields in entries if fields]
+        # Stale candles raise no signals but still belong in the indicator history
+        self.indicators.update(candle for _, candle in batch)
+        fresh = [(msg_id, candle) for msg_id, candle in batch if _stream_id_ms(msg_id) >= floor_ms]
+        self._prefetch_prev_day_high([candle['symbol'] for _, candle in fresh])
+        # Entries trimmed from the stream come back without fields; nothing is left to evaluate
+        done = [msg_id for msg_id, fields in entries if not fields]
+        done += [msg_id for msg_id, _ in batch if _stream_id_ms(msg_id) < floor_ms]
+        stale = len(done)
+        for msg_id, candle in fresh:
+            try:
+                self._process_candle(candle, seen_at=dt.fromtimestamp(_stream_id_ms(msg_id) / 1000.0, IST))
+                done.append(msg_id)
+            except Exception as e:
+                logger.error(f"Candle {msg_id} failed on replay, left pending: {e}")
+        self._flush_journal()
+        self._ack(done)
+        if done:
+            self.last_acked_id = max(done + ([self.last_acked_id] if self.last_acked_id else []),
+                                     key=lambda i: tuple(map(int, i.split('-'))))
+        return done, stale
+
+    def _retry_failed(self):
+        """
+        Re-evaluates candles a live batch left pending (XAUTOCLAIM of entries
+        idle past RETRY_IDLE_MS). After RETRY_ATTEMPTS a candle is acknowledged
+        and counted as dropped rather than retried for the rest of the session.
+        """
+        _, entries, *_ = self.redis_client.xautoclaim(
+            CANDLE_STREAM_KEY, self.group_name, self.consumer_name, RETRY_IDLE_MS, '0-0', count=CATCHUP_BATCH)
+        if not entries:
+            return
+        retry, dropped = [], []
+        for msg_id, fields in entries:
+            # The live read was the first attempt
+            self.attempts[msg_id] = self.attempts.get(msg_id, 1) + 1
+            if self.attempts[msg_id] > RETRY_ATTEMPTS:
+                del self.attempts[msg_id]
+                dropped.append(msg_id)
+            else:
+                retry.append((msg_id, fields))
+        if dropped:
+            self._ack(dropped)
+            metrics.inc('candles_dropped_total', len(dropped))
+            logger.error(f"🗑️ Dropped {len(dropped)} candles after {RETRY_ATTEMPTS} failed evaluations: "
+                         f"{', '.join(dropped[:5])}")
+        if retry:
+            metrics.inc('candles_retried_total', len(retry))
+            done, _ = self._replay(retry, int((time.time() - CATCHUP_FRESH_SECS) * 1000))
+            for msg_id in done:
+                self.attempts.pop(msg_id, None)
+
+    def _consume_ring(self, block=1000):
+        # Same batch shape as the stream path, minus decode and XACK
+        if not self.ring.wait((block or 0) / 1000.0):
+            return 0
+        requested = self.batch_size
+        batch = self.ring.read(limit=requested)
+        metrics.inc('candles_consumed_total', len(batch))
+        self.indicators.update(batch)
+        self._prefetch_prev_day_high([candle['symbol'] for candle in batch])
+        for candle in batch:
+            try:
+                self._process_candle(candle)
+            except Exception as e:
+                logger.error(f"Candle {candle['symbol']} {candle['ts']} failed: {e}")
+        self._flush_journal()
+        self._ack()
+        self.backlog = self.ring.write_seq - self.ring.cursor
+        self._size_next_batch(batch, requested)
+        return len(batch)
+
+    # --- Batch sizing / drain accounting ---
+
+    def _size_next_batch(self, candles, requested):
+        """
+        Sizes the next read from this one. A read that came back full means at
+        least that much is still queued, so the next one doubles; a short read
+        means the consumer has caught up, and the next read is sized for the
+        coming minute's burst (last minute's candle count, or the sampled lag
+        if that is larger). Also tracks how long each minute takes to drain.
+        """
+        if candles:
+            self._track_drain(candles)
+        if len(candles) >= requested:
+            size = requested * 2
+        else:
+            size = max(self.expected_burst, self.drain[1] if self.drain else 0, self.backlog)
+            if candles:
+                self.caught_up = True
+        self.batch_size = min(CONSUMER_BATCH_MAX, max(CONSUMER_BATCH, size))
+        metrics.set_gauge('consumer_batch_size', self.batch_size)
+
+    def _track_drain(self, candles):
+        label = max(candle['ts'] for candle in candles)
+        drain = self.drain
+        if drain is None or label > drain[0]:
+            self._report_drain()
+            drain = self.drain = [label, 0, 0, 0.0]
+        drain[1] += len(candles)
+        drain[2] += 1
+        drain[3] = time.time()
+
+    def _report_drain(self):
+        """Called once the next minute starts arriving: the finished minute's drain time, from its close."""
+        if self.drain is None:
+            return
+        label, candles, reads, done_at = self.drain
+        seconds = max(0.0, done_at - (minute_epoch(label) + 60))
+        self.expected_burst = candles
+        metrics.observe('minute_drain_seconds', seconds)
+        metrics.set_gauge('minute_drain_reads', reads)
+        logger.info(f"⏱️ {label[11:16]} evaluated {seconds:.2f}s after close: {candles} candles in {reads} reads")
+
+    def _ack(self, done=()):
+        # New processed bits and the XACK share one round trip, after the journal has committed
+        if not done and not self.processed.unsaved:
+            return
+        pipe = self.processed.save(self.redis_client.pipeline(transaction=False))
+        if done:
+            pipe.xack(CANDLE_STREAM_KEY, self.group_name, *done)
+        pipe.execute()
+
+    def _flush_journal(self):
+        if len(self.journal):
+            with metrics.timer('db_write_seconds'):
+                self.journal.flush()
+
+    def _sample_ring_health(self):
+        ring = self.ring
+        metrics.set_gauge('stream_lag', ring.write_seq - ring.cursor)
+
+    def _check_ring(self):
+        """Follows a restarted data engine onto its new segment, and flags one that stopped writing."""
+        if self.ring.producer_changed():
+            try:
+                self.ring = self.ring.reattach()
+            except (FileNotFoundError, ValueError) as e:
+                if self.ring_attached:
+                    logger.warning(f"⚠️ Candle ring producer went away, waiting for it to come back: {e}")
+                self.ring_attached = False
+                metrics.set_gauge('ring_attached', 0)
+                return
+            metrics.inc('ring_reattach_total')
+            logger.warning(f"🧩 Data engine restarted, re-attached to candle ring {self.ring.shm.name}")
+            self.ring_progress = (self.ring.write_seq, time.monotonic())
+        self.ring_attached = True
+        metrics.set_gauge('ring_attached', 1)
+
+        seq, since = self.ring_progress
+        now = time.monotonic()
+        if self.ring.write_seq != seq or not self.risk.in_session():
+            self.ring_progress = (self.ring.write_seq, now)
+            metrics.set_gauge('ring_stall_seconds', 0.0)
+            return
+        stalled = now - since
+        metrics.set_gauge('ring_stall_seconds', stalled)
+        # Warn once as the stall crosses the threshold
+        if stalled >= RING_STALL_SECS > stalled - RING_CHECK_SECS:
+            logger.warning(f"⚠️ No candle in the ring for {stalled:.0f}s during the session; is the data engine running?")
 
     def run(self):
         logger.info("--- ALGO ENGINE STARTED ---")
+        metrics.add_collector(self._sample_ring_health if self.ring is not None else self._sample_stream_health)
+        if self.ring is None:
+            self._catch_up()
+        else:
+            self._catch_up_ring()
+        now = time.time()
+        for kind, (secs, _) in self.periodic.items():
+            self.timers.schedule(now + secs, kind)
+        self._schedule_session()
         while self.running:
+            loop_start = time.perf_counter()
             try:
-                # Read from Stream
-                messages = self.redis_client.xreadgroup(
-                    self.group_name, self.consumer_name, {CANDLE_STREAM_KEY: '>'}, count=10, block=1000
-                )
-                if messages:
-                    for _, msg_list in messages:
-                        for msg_id, msg_data in msg_list:
-                            candle = json.loads(msg_data['data'])
-                            self._process_candle(candle)
-                            self.redis_client.xack(CANDLE_STREAM_KEY, self.group_name, msg_id)
-
-                self._try_enter_pending()
+                self._consume_batch()
+
+                self._run_timers()
+                # Entries are re-checked once per drain rather than after every read
+                if self.caught_up:
+                    self.caught_up = False
+                    self._try_enter_pending()
+                self._check_portfolio_exit()
                 # self.monitor_trades() # Uncomment when ready
+
+                metrics.observe('loop_iteration_seconds', time.perf_counter() - loop_start)
                 
                 # Heartbeat log every 60 seconds (optional)
                 # if int(time.time()) % 60 == 0: logger.info("Algo Engine Heartbeat...")
@@ -206,10 +836,20 @@ class CashBreakoutClient:
 class Command(BaseCommand):
     help = 'Runs the Angel Algo Engine'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--colocated', action='store_true',
+                            help="Read candles from the data engine's shared-memory ring instead of the stream")
+
     def handle(self, *args, **options):
         creds = APICredential.objects.first()
         if not creds: 
             logger.error("No Credentials Found")
             return
-        client = CashBreakoutClient(creds.user, creds)
+        ring = None
+        if options.get('colocated'):
+            ring = CandleRing.attach(trading_universe(), wait=60)
+            logger.info(f"🧩 Co-located mode: reading candle ring {ring.shm.name}")
+        client = CashBreakoutClient(creds.user, creds, ring=ring)
+        start_profile_controller('algo_engine', client.redis_client)
+        metrics.start_publisher('algo_engine', client.redis_client)
         client.run()
\ No newline at end of file
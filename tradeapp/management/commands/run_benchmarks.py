@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from tradeapp import benchmarks
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Runs the hot-path micro-benchmarks and writes the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', default='450,1000,5000', help='Comma separated universe sizes')
+        parser.add_argument('--minutes', type=int, default=3)
+        parser.add_argument('--ticks-per-token', type=int, default=20, help='Ticks per token per minute')
+        parser.add_argument('--output', default='bench_output.json')
+
+    def handle(self, *args, **options):
+        token_counts = [int(x) for x in options['tokens'].split(',') if x.strip()]
+        self.stdout.write(self.style.WARNING(f"⏱️ Benchmarking universes {token_counts}..."))
+
+        results = benchmarks.run_all(token_counts, options['minutes'], options['ticks_per_token'])
+        report = {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for n, row in results['universes'].items():
+            self.stdout.write(
+                f"{n:>5} tokens | on_data {row['on_data']['ticks_per_sec']:,.0f} ticks/s"
+                f" | flush {row['flush_candle']['candles_per_sec']:,.0f} candles/s"
+                f" | process {row['algo_minute']['process_candle_ms_per_minute']:.1f} ms/min"
+                f" | pending {row['algo_minute']['try_enter_pending_ms_per_pass']:.2f} ms/pass"
+                f" | redis {row['consumer_round_trips']['round_trips_per_minute']:,} calls/min"
+                f" | hand-off stream {row['signal_latency']['stream_modeled_ms']:.1f} ms"
+                f" vs ring {row['signal_latency']['ring_ms']:.2f} ms"
+                f" | restart {row['catch_up']['replay_all_seconds']:.2f}s -> {row['catch_up']['catch_up_seconds']:.2f}s"
+                f" | indicators {row['indicators']['ms_per_minute_batch']:.1f} ms/min"
+            )
+        mem = results['positions']
+        self.stdout.write(f"watch list memory: Trade {mem['trade_bytes_per_symbol']:,.0f} B vs Position {mem['position_bytes_per_symbol']:,.0f} B per symbol")
+        self.stdout.write(self.style.SUCCESS(f"✅ Results written to {options['output']}"))
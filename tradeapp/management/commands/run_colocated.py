@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from tradeapp.models import APICredential
+from tradeapp.instruments import trading_universe
+from tradeapp.shm_ring import CandleRing
+from tradeapp.management.commands import run_data_engine, run_algo_engine
+from tradeapp.metrics import registry as metrics
+from tradeapp.profiling import start_profile_controller
+from tradeapp.angel_utils import get_redis_client
+import logging
+import threading
+
+logger = logging.getLogger('algo_engine')
+
+class Command(BaseCommand):
+    help = 'Runs the data engine and algo engine in one process, handing candles over through shared memory'
+
+    def handle(self, *args, **options):
+        creds = APICredential.objects.first()
+        if not creds:
+            logger.error("No Credentials Found")
+            return
+
+        ring = CandleRing.create(trading_universe())
+        logger.info(f"🧩 Co-located engines: candle ring {ring.shm.name} ({ring.capacity} slots)")
+
+        # Redis still gets every candle (stream) and snapshot for durability and the dashboard
+        data_engine = run_data_engine.Command()
+        data_engine.ring = ring
+        r = get_redis_client()
+        threading.Thread(target=data_engine.run_forever, args=(r,), name="data-engine", daemon=True).start()
+
+        client = run_algo_engine.CashBreakoutClient(creds.user, creds, ring=ring.reader())
+        start_profile_controller('colocated', client.redis_client)
+        metrics.start_publisher('colocated', client.redis_client)
+        try:
+            client.run()
+        finally:
+            ring.close()
@@ -1,18 +1,14 @@
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from tradeapp.models import APICredential
-from tradeapp.constants import FINAL_DICTIONARY_OBJECT
+from tradeapp.instruments import trading_universe, trading_exchange, EXCHANGE_TYPES
 from tradeapp.angel_utils import get_redis_client
+from tradeapp.candles import CandleBuilder
+from tradeapp.shm_ring import CandleRing
+from tradeapp.profiling import start_profile_controller
+from tradeapp.metrics import registry as metrics
+from tradeapp.session import get_session
 from SmartApi.smartWebSocketV2 import SmartWebSocketV2
-import json
 import logging
 import time
-from datetime import datetime
-import pytz
-
-IST = pytz.timezone("Asia/Kolkata")
-CANDLE_STREAM_KEY = getattr(settings, "BREAKOUT_CANDLE_STREAM", "candle_1m")
-LIVE_OHLC_KEY = getattr(settings, "BREAKOUT_LIVE_OHLC_KEY", "live_ohlc_data")
 
 # Configure Logging to output to Heroku Console
 logging.basicConfig(level=logging.INFO)
@@ -21,8 +17,21 @@ logger = logging.getLogger('data_engine')
 class Command(BaseCommand):
     help = 'Runs Central Data Engine with Detail Logging'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--colocated', action='store_true',
+                            help='Also publish candles and LTPs to the shared-memory ring for a co-located algo engine')
+
     def handle(self, *args, **options):
         r = get_redis_client()
+        self.ring = None
+        if options.get('colocated'):
+            self.ring = CandleRing.create(trading_universe())
+            logger.info(f"🧩 Co-located mode: candle ring {self.ring.shm.name} ({self.ring.capacity} slots)")
+        start_profile_controller('data_engine', r)
+        metrics.start_publisher('data_engine', r)
+        self.run_forever(r)
+
+    def run_forever(self, r):
         logger.info("--- DATA ENGINE INITIALIZED ---")
         
         while True:
@@ -35,85 +44,36 @@ class Command(BaseCommand):
             time.sleep(5)
 
     def run_socket_session(self, r):
-        creds = APICredential.objects.first()
-        if not creds or not creds.access_token or not creds.feed_token:
+        # Tokens come from the shared session cache, so a reconnect after a
+        # refresh needs no DB read; a refresh alone never forces a reconnect.
+        creds = get_session(r).tokens
+        if not creds.get('access_token') or not creds.get('feed_token'):
             logger.warning('Waiting for valid tokens... (Login via Dashboard)')
             return
 
-        token_map = {str(v): k for k, v in FINAL_DICTIONARY_OBJECT.items()}
-        candle_buffer = {}
+        token_map = trading_universe()  # built once per process, not per reconnect
+        exchange = trading_exchange()
 
         try:
             # Log masked token for debugging
-            logger.info(f"Initializing WebSocket with FeedToken: {creds.feed_token[:10]}...")
-            sws = SmartWebSocketV2(creds.access_token, creds.api_key, creds.client_code, creds.feed_token)
+            logger.info(f"Initializing WebSocket with FeedToken: {creds['feed_token'][:10]}...")
+            sws = SmartWebSocketV2(creds['access_token'], creds['api_key'], creds['client_code'], creds['feed_token'])
         except Exception as e:
             logger.error(f"WebSocket Init Failed: {e}")
             return
 
-        def flush_candle(token, data):
-            symbol = token_map.get(token, token)
-            payload = {
-                "symbol": symbol, "token": token, "open": data['open'],
-                "high": data['high'], "low": data['low'], "close": data['close'],
-                "volume": data['volume'], "ts": data['ts']
-            }
-            # Push to Stream
-            r.xadd(CANDLE_STREAM_KEY, {'data': json.dumps(payload)})
-            
-            # Update Snapshot
-            current_snapshot = r.get(LIVE_OHLC_KEY)
-            snapshot_dict = json.loads(current_snapshot) if current_snapshot else {}
-            snapshot_dict[symbol] = {"ltp": data['close'], "high": data['high'], "low": data['low']}
-            r.set(LIVE_OHLC_KEY, json.dumps(snapshot_dict))
-            
-            # LOGGING: Show activity (Critical for debugging)
-            logger.info(f"🕯️ CANDLE: {symbol} | Time: {data['ts']} | Close: {data['close']}")
+        builder = CandleBuilder(r, token_map, ring=self.ring)
 
         def on_data(wsapp, message):
             try:
-                token = message.get('token')
-                if token not in token_map: return
-
-                ltp = float(message.get('last_traded_price', 0))
-                daily_vol = float(message.get('vol_traded', 0)) 
-                
-                if ltp == 0: return
-
-                current_min = datetime.now(IST).strftime('%Y-%m-%d %H:%M:00%z')
-                
-                if token not in candle_buffer:
-                    candle_buffer[token] = {
-                        'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp,
-                        'volume': daily_vol, 'ts': current_min, 'start_vol': daily_vol
-                    }
-                
-                candle = candle_buffer[token]
-
-                # Minute Change Detection
-                if candle['ts'] != current_min:
-                    prev_candle = candle.copy()
-                    prev_candle['volume'] = daily_vol - candle['start_vol']
-                    flush_candle(token, prev_candle)
-                    
-                    # Reset for new minute
-                    candle_buffer[token] = {
-                        'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp,
-                        'volume': daily_vol, 'ts': current_min, 'start_vol': daily_vol
-                    }
-                else:
-                    # Update High/Low/Close
-                    candle['high'] = max(candle['high'], ltp)
-                    candle['low'] = min(candle['low'], ltp)
-                    candle['close'] = ltp
-                    
+                builder.on_tick(message)
             except Exception as e:
                 logger.error(f"Tick Process Error: {e}")
 
         def on_open(wsapp):
             logger.info("✅ WebSocket Connected Successfully")
             tokens = list(token_map.keys())
-            sws.subscribe("correlation_id", 2, [{"exchangeType": 1, "tokens": tokens}])
+            sws.subscribe("correlation_id", 2, [{"exchangeType": EXCHANGE_TYPES[exchange], "tokens": tokens}])
             logger.info(f"📡 Subscribed to {len(tokens)} stocks in MODE 2 (Quote).")
 
         def on_error(wsapp, error):
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand, CommandError
+from tradeapp.models import APICredential
+from tradeapp.angel_utils import create_broker
+from tradeapp.history import HistoryStore
+from datetime import datetime, timedelta
+from tradeapp.instruments import trading_universe
+from tradeapp import backtest
+import csv
+import json
+import time
+import logging
+
+logger = logging.getLogger('param_sweep')
+
+
+def _floats(raw):
+    return [float(x) for x in raw.split(',') if x.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Backtests the breakout strategy over a parameter grid and ranks the results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candles', help='JSON file of {symbol: [[ts, o, h, l, c, v], ...]} minute candles')
+        parser.add_argument('--fetch', action='store_true', help='Use minute history from the local store, fetching any missing days')
+        parser.add_argument('--days', type=int, default=10, help='Calendar days of history for --fetch')
+        parser.add_argument('--save-candles', help='Write fetched candles to this JSON file for reuse')
+        # Defaults sweep just the live engine's parameters
+        defaults = backtest.DEFAULT_PARAMS
+        parser.add_argument('--entry-offsets', default=str(defaults.entry_offset_pct))
+        parser.add_argument('--stop-offsets', default=str(defaults.stop_offset_pct))
+        parser.add_argument('--target-r', default=str(defaults.target_r))
+        parser.add_argument('--expiry', default=str(defaults.expiry_minutes), help='Signal expiry windows in minutes')
+        parser.add_argument('--sl-amounts', default=str(defaults.sl_amount))
+        parser.add_argument('--processes', type=int, default=None)
+        parser.add_argument('--rank-by', default='pnl', choices=['pnl', 'win_rate', 'avg_r', 'max_drawdown', 'trades'])
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--csv', help='Write the full ranked table to this CSV file')
+
+    def _fetch_candles(self, days):
+        creds = APICredential.objects.first()
+        if not creds or not creds.access_token:
+            raise CommandError('No Valid Credentials Found.')
+        angel = create_broker(creds)
+        store = HistoryStore()
+        end = datetime.now().date() - timedelta(days=1)
+        start = end - timedelta(days=days)
+        data = {}
+        for token, symbol in trading_universe().items():
+            store.ensure(angel, token, "ONE_MINUTE", start, end)
+            candles = store.load_candles(token, "ONE_MINUTE", start, end)
+            if candles:
+                data[symbol] = candles
+        store.save_manifest()
+        return data
+
+    def handle(self, *args, **options):
+        if options['fetch']:
+            candles = self._fetch_candles(options['days'])
+            if options['save_candles']:
+                with open(options['save_candles'], 'w') as f:
+                    json.dump(candles, f)
+        elif options['candles']:
+            with open(options['candles']) as f:
+                candles = json.load(f)
+        else:
+            raise CommandError('Provide --candles FILE or --fetch')
+
+        grid = backtest.param_grid(
+            _floats(options['entry_offsets']), _floats(options['stop_offsets']),
+            _floats(options['target_r']), _floats(options['expiry']), _floats(options['sl_amounts'])
+        )
+        self.stdout.write(self.style.WARNING(f"🔬 Sweeping {len(grid)} combinations over {len(candles)} symbols..."))
+
+        started = time.perf_counter()
+        results = backtest.sweep(candles, grid, processes=options['processes'], rank_by=options['rank_by'])
+        elapsed = time.perf_counter() - started
+
+        header = list(backtest.BreakoutParams._fields) + ['pnl', 'trades', 'win_rate', 'avg_r', 'max_drawdown']
+        self.stdout.write(" | ".join(header))
+        for params, stats in results[:options['top']]:
+            self.stdout.write(" | ".join(str(v) for v in list(params) + [stats[k] for k in header[5:]]))
+
+        if options['csv']:
+            with open(options['csv'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['rank'] + header)
+                for rank, (params, stats) in enumerate(results, 1):
+                    writer.writerow([rank] + list(params) + [stats[k] for k in header[5:]])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Swept {len(grid)} combinations in {elapsed:.2f}s ({len(grid) / max(elapsed, 1e-9):.0f}/s)"))
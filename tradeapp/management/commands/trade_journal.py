@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from tradeapp.journal import rebuild, transition_latencies
+from tradeapp.models import Trade
+import time
+
+class Command(BaseCommand):
+    help = 'Reports per-transition trade latencies from the event journal, or rebuilds Trade rows from it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username (default: all users)')
+        parser.add_argument('--days', type=int, default=1, help='Latency window in days')
+        parser.add_argument('--rebuild', action='store_true', help='Re-derive journaled Trade rows from their events')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if not user:
+                self.stdout.write(self.style.ERROR(f"No such user: {options['user']}"))
+                return
+
+        if options['rebuild']:
+            started = time.monotonic()
+            trades = Trade.objects.filter(events__isnull=False).distinct()
+            if user is not None:
+                trades = trades.filter(user=user)
+            count = rebuild(trades)
+            self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt {count} trades from the journal in {time.monotonic() - started:.1f}s."))
+            return
+
+        latencies = transition_latencies(user, options['days'])
+        if not latencies:
+            self.stdout.write(self.style.WARNING(f"No journaled transitions in the last {options['days']} day(s)."))
+            return
+        self.stdout.write(f"{'transition':<24}{'count':>7}{'median':>12}{'p95':>12}{'max':>12}")
+        for step, row in latencies.items():
+            self.stdout.write(f"{step:<24}{row['count']:>7}{row['median_ms']:>10.1f}ms{row['p95_ms']:>10.1f}ms{row['max_ms']:>10.1f}ms")
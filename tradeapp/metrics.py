@@ -0,0 +1,175 @@
+"""
+Engine counters, gauges and timing summaries.
+
+Each engine process records into the in-process `registry` (plain dict
+updates on the hot path) and a daemon thread publishes a snapshot every few
+seconds to its own Redis hash, registered in the METRICS_INSTANCES set. The
+Django `metrics` view reads every live instance in one pipeline and renders
+Prometheus text. Instance hashes expire, so dead processes drop out on their own.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRICS_INSTANCES = "engine_metrics:instances"
+METRICS_KEY = "engine_metrics:{instance}"
+PUBLISH_INTERVAL_SECS = 5
+INSTANCE_TTL_SECS = 30
+
+HELP = {
+    'ticks_received_total': ('counter', 'Websocket ticks received'),
+    'candles_emitted_total': ('counter', 'Minute candles published to the stream'),
+    'candles_consumed_total': ('counter', 'Minute candles read from the stream'),
+    'candles_duplicate_total': ('counter', 'Candles dropped as already published or processed'),
+    'candles_retried_total': ('counter', 'Failed candles re-evaluated from the consumer group PEL'),
+    'candles_dropped_total': ('counter', 'Failed candles acknowledged unevaluated after their last retry'),
+    'signals_total': ('counter', 'Breakout signals registered'),
+    'orders_placed_total': ('counter', 'Orders accepted by the broker'),
+    'orders_failed_total': ('counter', 'Orders rejected or errored'),
+    'stream_pending': ('gauge', 'Delivered but unacknowledged stream entries'),
+    'stream_lag': ('gauge', 'Stream entries not yet delivered to the consumer group'),
+    'stream_lag_seconds': ('gauge', 'Age gap between newest stream entry and last delivered entry'),
+    'ring_attached': ('gauge', '1 while the co-located algo engine maps the live candle ring'),
+    'ring_reattach_total': ('counter', 'Times the algo engine followed a restarted data engine to its new ring'),
+    'ring_stall_seconds': ('gauge', 'Seconds without a new ring candle during the session'),
+    'flush_candle_seconds': ('summary', 'Candle publish time'),
+    'db_write_seconds': ('summary', 'Trade row write time'),
+    'loop_iteration_seconds': ('summary', 'Algo consumer loop iteration time'),
+    'consumer_batch_size': ('gauge', 'Candles the algo engine asks for in its next read'),
+    'minute_drain_seconds': ('summary', 'Time from a minute\'s close until its last candle was evaluated'),
+    'minute_drain_reads': ('gauge', 'Reads the last completed minute took to drain'),
+    'quota_wait_order_seconds': ('summary', 'Broker quota wait before placeOrder'),
+    'quota_wait_session_seconds': ('summary', 'Broker quota wait before session calls'),
+    'quota_wait_reconcile_seconds': ('summary', 'Broker quota wait before orderBook'),
+    'quota_wait_history_seconds': ('summary', 'Broker quota wait before getCandleData'),
+}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.engine = None
+        self.instance = None
+        self.counters = {}
+        self.gauges = {}
+        self.summaries = {}  # name -> [count, sum, max]
+        self._collectors = []
+
+    def inc(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        row = self.summaries.get(name)
+        if row is None:
+            self.summaries[name] = [1, seconds, seconds]
+        else:
+            row[0] += 1
+            row[1] += seconds
+            if seconds > row[2]:
+                row[2] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def add_collector(self, fn):
+        """fn() is called before each publish, e.g. to sample stream lag."""
+        self._collectors.append(fn)
+
+    def snapshot(self):
+        flat = {'engine': self.engine, 'updated': time.time()}
+        flat.update({f"c:{k}": v for k, v in list(self.counters.items())})
+        flat.update({f"g:{k}": v for k, v in list(self.gauges.items())})
+        for name, (count, total, peak) in list(self.summaries.items()):
+            flat[f"s:{name}:count"] = count
+            flat[f"s:{name}:sum"] = total
+            flat[f"s:{name}:max"] = peak
+        return flat
+
+    def publish(self, r):
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        key = METRICS_KEY.format(instance=self.instance)
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(key, mapping=self.snapshot())
+        pipe.expire(key, INSTANCE_TTL_SECS)
+        pipe.sadd(METRICS_INSTANCES, self.instance)
+        pipe.execute()
+
+    def start_publisher(self, engine, r, interval=PUBLISH_INTERVAL_SECS):
+        self.engine = engine
+        self.instance = f"{engine}@{socket.gethostname()}:{os.getpid()}"
+
+        def loop():
+            while True:
+                try:
+                    self.publish(r)
+                except Exception as e:
+                    logger.error(f"Metrics publish failed: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name="metrics-publisher", daemon=True).start()
+
+
+registry = MetricsRegistry()
+
+
+def _labels(engine, instance):
+    return f'engine="{engine}",instance="{instance}"'
+
+
+def render_prometheus(r):
+    """Reads every live engine instance from Redis and renders Prometheus text exposition."""
+    instances = sorted(r.smembers(METRICS_INSTANCES))
+    pipe = r.pipeline(transaction=False)
+    for instance in instances:
+        pipe.hgetall(METRICS_KEY.format(instance=instance))
+    rows = pipe.execute() if instances else []
+
+    series = {}  # metric name -> [line, ...]
+    stale = []
+    for instance, data in zip(instances, rows):
+        if not data:
+            stale.append(instance)  # hash expired: process is gone
+            continue
+        labels = _labels(data.get('engine', ''), instance)
+        series.setdefault('engine_up', []).append(f"engine_up{{{labels}}} 1")
+        series.setdefault('engine_last_publish_timestamp_seconds', []).append(
+            f"engine_last_publish_timestamp_seconds{{{labels}}} {data.get('updated', 0)}")
+        for field, value in data.items():
+            kind, _, name = field.partition(':')
+            if kind == 's':
+                name, _, part = name.rpartition(':')
+                metric = f"algotrader_{name}"
+                if part == 'max':
+                    # Not part of the summary family, exposed as its own gauge
+                    series.setdefault(f"{metric}_max", []).append(f"{metric}_max{{{labels}}} {value}")
+                else:
+                    series.setdefault(metric, []).append(f"{metric}_{part}{{{labels}}} {value}")
+            elif kind in ('c', 'g'):
+                metric = f"algotrader_{name}"
+                series.setdefault(metric, []).append(f"{metric}{{{labels}}} {value}")
+    if stale:
+        r.srem(METRICS_INSTANCES, *stale)
+
+    lines = []
+    for metric in sorted(series):
+        kind, text = HELP.get(metric.replace('algotrader_', '', 1), ('gauge', metric.replace('_', ' ')))
+        lines.append(f"# HELP {metric} {text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(sorted(series[metric]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradeapp', '0002_remove_apicredential_secret_key_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'status', '-created_at'], name='trade_user_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'created_at'], name='trade_user_created'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradeapp', '0003_trade_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trades', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('pnl', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gross_profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gross_loss', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('best', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('worst', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('r_total', models.FloatField(default=0.0)),
+                ('r_trades', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='daily_summary_user_date')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SymbolSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trades', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('pnl', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gross_profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gross_loss', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('best', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('worst', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('r_total', models.FloatField(default=0.0)),
+                ('r_trades', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('symbol', models.CharField(max_length=50)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'symbol'), name='symbol_summary_user_symbol')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:11
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradeapp', '0004_trade_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('SIGNAL', 'Signal'), ('ORDER', 'Entry Order'), ('FILL', 'Entry Fill'), ('EXIT_ORDER', 'Exit Order'), ('EXIT_FILL', 'Exit Fill'), ('EXPIRE', 'Expired'), ('CANCEL', 'Cancelled'), ('REJECT', 'Rejected')], max_length=12)),
+                ('status', models.CharField(max_length=30)),
+                ('at', models.DateTimeField()),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('trade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='tradeapp.trade')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trade', 'at'], name='trade_event_trade_at'), models.Index(fields=['kind', 'at'], name='trade_event_kind_at')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 
 class APICredential(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -65,5 +66,76 @@ class Trade(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Dashboard feed and engine startup: user + status, newest first
+            models.Index(fields=['user', 'status', '-created_at'], name='trade_user_status_created'),
+            # Engine's "today" risk counters: user + created_at range
+            models.Index(fields=['user', 'created_at'], name='trade_user_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} - {self.status}"
+
+# --- Pre-aggregated analytics (see tradeapp/analytics.py) ---
+
+class TradeSummary(models.Model):
+    """Running totals over closed trades; updated once per close, never recomputed on read."""
+    trades = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    pnl = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gross_profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gross_loss = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    best = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    worst = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    r_total = models.FloatField(default=0.0)
+    r_trades = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+class DailySummary(TradeSummary):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'date'], name='daily_summary_user_date')]
+
+    def __str__(self):
+        return f"{self.user.username} {self.date}: {self.pnl}"
+
+class SymbolSummary(TradeSummary):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    symbol = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'symbol'], name='symbol_summary_user_symbol')]
+
+    def __str__(self):
+        return f"{self.user.username} {self.symbol}: {self.pnl}"
+
+# --- Append-only trade journal (see tradeapp/journal.py) ---
+
+class TradeEvent(models.Model):
+    """One lifecycle step of a Trade. Rows are only ever inserted; Trade is their projection."""
+    KIND_CHOICES = [
+        ('SIGNAL', 'Signal'), ('ORDER', 'Entry Order'), ('FILL', 'Entry Fill'),
+        ('EXIT_ORDER', 'Exit Order'), ('EXIT_FILL', 'Exit Fill'),
+        ('EXPIRE', 'Expired'), ('CANCEL', 'Cancelled'), ('REJECT', 'Rejected'),
+    ]
+    trade = models.ForeignKey(Trade, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    status = models.CharField(max_length=30)  # Trade status after this event
+    at = models.DateTimeField()  # when the engine saw it, not when the row was flushed
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)  # only the fields this event set
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trade', 'at'], name='trade_event_trade_at'),
+            models.Index(fields=['kind', 'at'], name='trade_event_kind_at'),
+        ]
+
     def __str__(self):
-        return f"{self.symbol} - {self.status}"
\ No newline at end of file
+        return f"{self.trade_id} {self.kind} @ {self.at}"
@@ -0,0 +1,189 @@
+"""
+Simulated stand-in for AngelConnect.
+
+Exposes the same place_order / get_order_status / get_order_statuses /
+get_historical_data / get_candles surface, but never touches the network. Orders fill
+against the live (or replayed) LTP snapshot after a sampled latency, with
+configurable slippage and rejection. Placing an order is a dict insert, so
+the broker is never the bottleneck in load tests.
+"""
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'latency_ms': 40.0,        # median order-to-fill latency
+    'latency_dist': 'lognormal',  # fixed | uniform | lognormal
+    'latency_jitter': 0.5,     # sigma (lognormal) or +/- fraction (uniform)
+    'slippage_bps': 2.0,       # mean adverse slippage, half-normal
+    'reject_rate': 0.0,        # probability an order is rejected
+    'price_refresh_ms': 200.0, # how stale the cached LTP snapshot may be
+    'seed': None,
+}
+
+
+class PaperOrder:
+    __slots__ = ('order_id', 'token', 'symbol', 'qty', 'side', 'order_type', 'price',
+                 'due', 'status', 'avg_price', 'text')
+
+    def __init__(self, order_id, token, symbol, qty, side, order_type, price, due):
+        self.order_id = order_id
+        self.token = token
+        self.symbol = symbol
+        self.qty = qty
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.due = due
+        self.status = 'open'
+        self.avg_price = 0.0
+        self.text = ''
+
+
+class PaperBroker:
+    def __init__(self, api_key=None, access_token=None, refresh_token=None, feed_token=None,
+                 price_source=None, **overrides):
+        self.api_key = api_key
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.feed_token = feed_token
+        conf = dict(DEFAULTS, **getattr(settings, 'PAPER_BROKER', {}))
+        conf.update(overrides)
+        self.conf = conf
+        self.rng = random.Random(conf['seed'])
+        self.orders = {}
+        self.prices = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # price_source() -> {symbol: {"ltp": ...}}; defaults to the data engine snapshot
+        self.price_source = price_source or self._redis_snapshot
+        self._prices_at = 0.0
+
+    # --- Price feed ---------------------------------------------------------
+
+    def _redis_snapshot(self):
+        from tradeapp.angel_utils import get_redis_client
+        if not hasattr(self, '_redis'):
+            self._redis = get_redis_client()
+        raw = self._redis.get(getattr(settings, "BREAKOUT_LIVE_OHLC_KEY", "live_ohlc_data"))
+        return json.loads(raw) if raw else {}
+
+    def set_price(self, symbol, ltp):
+        """Feeds a replayed tick directly, bypassing the snapshot source."""
+        self.prices[symbol] = float(ltp)
+
+    def _ltp(self, symbol):
+        now = time.monotonic()
+        if self.price_source is not None and (now - self._prices_at) * 1000.0 >= self.conf['price_refresh_ms']:
+            self._prices_at = now
+            try:
+                for sym, row in self.price_source().items():
+                    self.prices[sym] = float(row.get('ltp', 0)) if isinstance(row, dict) else float(row)
+            except Exception as e:
+                logger.error(f"Paper price feed error: {e}")
+        return self.prices.get(symbol)
+
+    # --- Models -------------------------------------------------------------
+
+    def _latency(self):
+        base = self.conf['latency_ms'] / 1000.0
+        jitter = self.conf['latency_jitter']
+        dist = self.conf['latency_dist']
+        if dist == 'uniform':
+            return max(0.0, base * (1.0 + self.rng.uniform(-jitter, jitter)))
+        if dist == 'lognormal' and base > 0:
+            return base * self.rng.lognormvariate(0.0, jitter)
+        return base
+
+    def _slipped(self, side, ltp):
+        slip = abs(self.rng.gauss(0.0, self.conf['slippage_bps'])) / 10000.0
+        return round(ltp * (1.0 + slip if side == 'BUY' else 1.0 - slip), 2)
+
+    def _settle(self, order, now):
+        if order.status != 'open' or now < order.due:
+            return
+        ltp = self._ltp(order.symbol)
+        if not ltp:
+            return  # no market yet, stay working
+        if order.order_type == 'MARKET':
+            order.avg_price = self._slipped(order.side, ltp)
+        elif (order.side == 'BUY' and ltp <= order.price) or (order.side == 'SELL' and ltp >= order.price):
+            order.avg_price = order.price
+        else:
+            return
+        order.status = 'complete'
+
+    # --- AngelConnect surface -----------------------------------------------
+
+    def _refresh_and_save_token(self):
+        return True
+
+    def place_order(self, symbol_token, symbol, quantity, transaction_type, product_type="INTRADAY", order_type="MARKET", price=0.0,
+                    exchange=None):
+        with self._lock:
+            order_id = f"PAPER{next(self._ids)}"
+            order = PaperOrder(order_id, symbol_token, symbol, int(quantity), transaction_type,
+                               order_type, float(price), time.monotonic() + self._latency())
+            if self.rng.random() < self.conf['reject_rate']:
+                order.status = 'rejected'
+                order.text = 'Simulated rejection'
+            self.orders[order_id] = order
+        return order_id
+
+    def _status_dict(self, order):
+        filled = order.qty if order.status == 'complete' else 0
+        return {'status': order.status, 'filled_quantity': filled, 'average_price': order.avg_price, 'text': order.text}
+
+    def get_order_status(self, order_id):
+        order = self.orders.get(order_id)
+        if order is None:
+            return None
+        self._settle(order, time.monotonic())
+        return self._status_dict(order)
+
+    def get_order_statuses(self, order_ids):
+        now = time.monotonic()
+        out = {}
+        for order_id in order_ids:
+            order = self.orders.get(order_id)
+            if order is not None:
+                self._settle(order, now)
+                out[order_id] = self._status_dict(order)
+        return out
+
+    def get_historical_data(self, token, interval="ONE_DAY"):
+        now = datetime.now()
+        return self.get_candles(token, interval, (now - timedelta(days=10)).date(), (now - timedelta(days=1)).date())
+
+    def get_candles(self, token, interval, from_date, to_date, exchange=None):
+        """
+        Deterministic random-walk candles in getCandleData format. Each session
+        is seeded by (token, interval, date), so overlapping requests agree.
+        """
+        candles = []
+        day = from_date
+        base = random.Random(f"{token}").uniform(50, 3000)
+        while day <= to_date:
+            if day.weekday() < 5:
+                rng = random.Random(f"{token}:{interval}:{day.isoformat()}")
+                # Slow drift keyed on the date keeps consecutive sessions roughly continuous
+                price = base * (1.0 + 0.1 * random.Random(f"{token}:{day.toordinal() // 5}").uniform(-1, 1))
+                open_at = datetime(day.year, day.month, day.day, 9, 15)
+                steps = 1 if interval == "ONE_DAY" else 375
+                for m in range(steps):
+                    o = price
+                    price = max(1.0, price * (1.0 + rng.gauss(0, 0.02 / steps ** 0.5)))
+                    h = max(o, price) * (1.0 + abs(rng.gauss(0, 0.002)))
+                    l = min(o, price) * (1.0 - abs(rng.gauss(0, 0.002)))
+                    ts = open_at + timedelta(minutes=m)
+                    candles.append([ts.strftime("%Y-%m-%dT%H:%M:00+05:30"), round(o, 2), round(h, 2), round(l, 2), round(price, 2), rng.randint(1000, 100000)])
+            day += timedelta(days=1)
+        return candles
@@ -0,0 +1,53 @@
+"""
+Engine-side position records.
+
+The algo engine's watch list and open book hold `Position`s rather than
+Trade model instances: `__slots__` objects with plain float / int / str
+fields, so the per-pass loops compare native floats instead of converting
+Decimals, and each watched symbol costs a few hundred bytes instead of a model
+instance with its `_state`. Conversion happens only at the persistence
+boundary: `from_trade()` when the engine loads its book, `to_trade()` when the
+journal flushes.
+
+Attribute names match Trade's, so the dashboard row builders and
+analytics.record_close() accept a Position as they are.
+"""
+from datetime import timedelta
+
+from .constants import SIGNAL_EXPIRY_MINUTES
+from .models import Trade
+
+PRICE_FIELDS = ('candle_open', 'candle_high', 'candle_low', 'candle_close', 'prev_day_high',
+                'entry_level', 'stop_level', 'target_level', 'entry_price', 'exit_price', 'pnl')
+FIELDS = ('id', 'user_id', 'symbol', 'token', 'status', 'candle_ts', 'quantity', 'entry_order_id',
+          'exit_order_id', 'exit_reason', 'created_at', 'updated_at') + PRICE_FIELDS
+
+
+class Position:
+    __slots__ = FIELDS + ('expires_at',)
+
+    def __init__(self, **values):
+        for field in FIELDS:
+            setattr(self, field, values.get(field))
+        if self.quantity is None:
+            self.quantity = 0
+        if self.status is None:
+            self.status = 'PENDING'
+        # Epoch seconds; the pending loop compares it against time.time()
+        self.expires_at = (self.candle_ts + timedelta(minutes=SIGNAL_EXPIRY_MINUTES)).timestamp() if self.candle_ts else 0.0
+
+    @classmethod
+    def from_trade(cls, trade):
+        values = {field: getattr(trade, field) for field in FIELDS}
+        for field in PRICE_FIELDS:
+            if values[field] is not None:
+                values[field] = float(values[field])
+        return cls(**values)
+
+    def to_trade(self, fields=None):
+        """An unsaved Trade carrying `fields` (default: all), for bulk_create / bulk_update."""
+        fields = FIELDS if fields is None else ('id',) + tuple(fields)
+        return Trade(**{field: getattr(self, field) for field in fields if field != 'created_at'})
+
+    def __repr__(self):
+        return f"<Position {self.symbol} {self.status} #{self.id}>"
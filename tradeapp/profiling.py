@@ -0,0 +1,177 @@
+"""
+On-demand profiling for the long-running engines.
+
+A ProfileController thread watches the Redis key `engine_profile:<engine>`
+(set via `manage.py profile_engine`) and SIGUSR1. When triggered it runs a
+statistical stack sampler plus the `@timed` per-function timers for a bounded
+window, dumps both to PROFILE_DIR and switches itself off. Outside a window
+the only cost is one flag check per timed call and one GET every poll.
+"""
+import functools
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTROL_KEY = "engine_profile:{engine}"
+DEFAULT_SECONDS = 30
+DEFAULT_INTERVAL_MS = 5
+
+_timing_enabled = False
+_timers = {}  # label -> [calls, total_secs, max_secs]
+_timers_lock = threading.Lock()
+
+
+def timed(label=None):
+    """Records call count / total / max time for the wrapped function while a profile is running."""
+    def decorator(fn):
+        name = label or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _timing_enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with _timers_lock:
+                    row = _timers.get(name)
+                    if row is None:
+                        _timers[name] = [1, elapsed, elapsed]
+                    else:
+                        row[0] += 1
+                        row[1] += elapsed
+                        if elapsed > row[2]:
+                            row[2] = elapsed
+        return wrapper
+    return decorator
+
+
+class StackSampler(threading.Thread):
+    """Samples every other thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, interval_ms, ignore_threads=()):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval_ms / 1000.0
+        self.ignore = set(ignore_threads)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or thread_id in self.ignore:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileController(threading.Thread):
+    def __init__(self, engine, redis_client=None, poll_secs=2.0, out_dir=None):
+        super().__init__(name=f"profile-controller-{engine}", daemon=True)
+        self.engine = engine
+        self.r = redis_client
+        self.poll_secs = poll_secs
+        self.out_dir = out_dir or getattr(settings, 'PROFILE_DIR', 'profiles')
+        self.key = CONTROL_KEY.format(engine=engine)
+        self._requested = None
+        self._sampler = None
+        self._deadline = 0.0
+        self._started_at = None
+
+    def request(self, seconds=DEFAULT_SECONDS, interval_ms=DEFAULT_INTERVAL_MS):
+        self._requested = {'seconds': seconds, 'interval_ms': interval_ms}
+
+    def install_signal_handler(self, signum=getattr(signal, 'SIGUSR1', None)):
+        # Must be called from the main thread
+        if signum is not None:
+            signal.signal(signum, lambda *_: self.request())
+
+    def _poll_request(self):
+        if self._requested:
+            req, self._requested = self._requested, None
+            return req
+        if self.r is None:
+            return None
+        try:
+            raw = self.r.get(self.key)
+            if raw:
+                self.r.delete(self.key)
+                return json.loads(raw) if raw.startswith('{') else {'seconds': float(raw)}
+        except Exception as e:
+            logger.error(f"Profile control poll failed: {e}")
+        return None
+
+    def run(self):
+        while True:
+            try:
+                if self._sampler is None:
+                    req = self._poll_request()
+                    if req:
+                        self._begin(float(req.get('seconds', DEFAULT_SECONDS)), float(req.get('interval_ms', DEFAULT_INTERVAL_MS)))
+                elif time.monotonic() >= self._deadline:
+                    self._finish()
+            except Exception as e:
+                logger.error(f"Profile controller error: {e}")
+            time.sleep(min(self.poll_secs, 0.5) if self._sampler else self.poll_secs)
+
+    def _begin(self, seconds, interval_ms):
+        global _timing_enabled
+        with _timers_lock:
+            _timers.clear()
+        _timing_enabled = True
+        self._sampler = StackSampler(interval_ms, ignore_threads=[self.ident])
+        self._sampler.start()
+        self._deadline = time.monotonic() + seconds
+        self._started_at = datetime.now()
+        logger.warning(f"🔬 Profiling {self.engine} for {seconds:.0f}s (sampling every {interval_ms:.0f}ms)")
+
+    def _finish(self):
+        global _timing_enabled
+        _timing_enabled = False
+        sampler, self._sampler = self._sampler, None
+        sampler.stop()
+        with _timers_lock:
+            timers = {name: {'calls': c, 'total_ms': t * 1000.0, 'avg_ms': t / c * 1000.0, 'max_ms': m * 1000.0}
+                      for name, (c, t, m) in _timers.items()}
+            _timers.clear()
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self.engine}-{self._started_at:%Y%m%d-%H%M%S}")
+        # Collapsed stacks: feed straight into flamegraph.pl / speedscope
+        with open(base + ".folded", 'w') as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + ".timers.json", 'w') as f:
+            json.dump({'samples': sampler.samples, 'timers': timers}, f, indent=2)
+        logger.warning(f"🔬 Profile written: {base}.folded / .timers.json ({sampler.samples} samples)")
+
+
+def start_profile_controller(engine, redis_client=None):
+    controller = ProfileController(engine, redis_client)
+    if threading.current_thread() is threading.main_thread():
+        controller.install_signal_handler()
+    controller.start()
+    return controller
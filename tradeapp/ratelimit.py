@@ -0,0 +1,166 @@
+"""
+Broker API pacing.
+
+`TokenBucket` paces calls within one process. `BrokerQuota` shares the
+SmartAPI request budget between every process that talks to the broker
+(engines, fetch_pdh, sweep_params, doctor, the login view) through Redis,
+with priority classes:
+
+    class      priority  calls                          own cap (req/s)
+    order      0         placeOrder                     -
+    session    1         generateToken, getProfile      1
+    reconcile  2         orderBook                      1
+    history    3         getCandleData                  HISTORY_API_RATE
+
+Each second is a counter, `broker_quota:{second}`, that grants at most
+BROKER_API_RATE calls. A capped class also has its own counter per second.
+Classes below 'order' leave BROKER_QUOTA_HEADROOM of every second unused.
+They also stand aside while a higher class has a live waiter, meaning a
+caller refused because the shared budget ran out. Waiters sit in
+`broker_quota:waiting:{class}`, scored by their last attempt. So a history
+backfill can hold an order back by at most the second in flight.
+If Redis is unreachable, calls go through unthrottled rather than failing.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+API_RATE = getattr(settings, 'BROKER_API_RATE', 10)
+HEADROOM = getattr(settings, 'BROKER_QUOTA_HEADROOM', 2)
+# name -> (priority, own requests/second cap or None); lower priority number wins
+CLASSES = {
+    'order': (0, None),
+    'session': (1, 1),
+    'reconcile': (2, 1),
+    'history': (3, getattr(settings, 'HISTORY_API_RATE', 3.0)),
+}
+QUOTA_KEY = "broker_quota:{window}"
+CLASS_KEY = "broker_quota:{cls}:{window}"
+WAITING_KEY = "broker_quota:waiting:{cls}"
+WAITER_STALE_SECS = 2.0  # a waiter that has not retried this long ago is gone
+KEY_TTL_SECS = 5
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n=1):
+        """Takes n tokens if available; returns seconds to wait otherwise (0.0 on success)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0.0
+            return (n - self.tokens) / self.rate
+
+    def acquire(self, n=1):
+        """Blocks until n tokens are available. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(n)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class BrokerQuota:
+    def __init__(self, r, rate=API_RATE, headroom=HEADROOM, classes=CLASSES):
+        self.r = r
+        self.rate = int(rate)
+        self.headroom = int(headroom)
+        # Per-second counters can only express whole calls
+        self.classes = {name: (priority, None if cap is None else max(1, int(cap)))
+                        for name, (priority, cap) in classes.items()}
+        self._warned_at = float('-inf')
+
+    def _try(self, cls, now, waiter):
+        """One attempt: True if granted. A refused attempt gives its slots back."""
+        priority, cap = self.classes[cls]
+        window = int(now)
+        limit = self.rate - (self.headroom if priority else 0)
+        higher = [WAITING_KEY.format(cls=name) for name, (p, _) in self.classes.items() if p < priority]
+        quota_key, class_key = QUOTA_KEY.format(window=window), CLASS_KEY.format(cls=cls, window=window)
+
+        pipe = self.r.pipeline()
+        pipe.incr(quota_key)
+        pipe.expire(quota_key, KEY_TTL_SECS)
+        if cap is not None:
+            pipe.incr(class_key)
+            pipe.expire(class_key, KEY_TTL_SECS)
+        for key in higher:
+            pipe.zcount(key, now - WAITER_STALE_SECS, '+inf')
+        replies = pipe.execute()
+        used = replies[0]
+        own = replies[2] if cap is not None else 0
+        blocked = any(replies[4 if cap is not None else 2:])
+        if used <= limit and (cap is None or own <= cap) and not blocked:
+            return True
+
+        pipe = self.r.pipeline()
+        pipe.decr(quota_key)
+        if cap is not None:
+            pipe.decr(class_key)
+        if used > limit:
+            # Only contention for the shared budget holds lower classes back, not our own cap
+            waiting_key = WAITING_KEY.format(cls=cls)
+            pipe.zadd(waiting_key, {waiter: now})
+            pipe.expire(waiting_key, KEY_TTL_SECS)
+        pipe.execute()
+        return False
+
+    def acquire(self, cls):
+        """Blocks until `cls` may make one broker call. Returns the seconds waited."""
+        started = time.monotonic()
+        waiter = f"{os.getpid()}:{threading.get_ident()}"
+        waited_once = False
+        while True:
+            now = time.time()
+            try:
+                if self._try(cls, now, waiter):
+                    if waited_once:
+                        self.r.zrem(WAITING_KEY.format(cls=cls), waiter)
+                    break
+            except redis.RedisError as e:
+                if time.monotonic() - self._warned_at > 60:
+                    logger.warning(f"⚠️ Broker quota unavailable, calling unthrottled: {e}")
+                    self._warned_at = time.monotonic()
+                break
+            waited_once = True
+            # Next second, jittered so refused callers do not all retry at once
+            time.sleep(int(now) + 1 - now + random.uniform(0, 0.01))
+        waited = time.monotonic() - started
+        registry.observe(f'quota_wait_{cls}_seconds', waited)
+        return waited
+
+
+_quota = None
+_quota_lock = threading.Lock()
+
+
+def get_quota():
+    """The process-wide BrokerQuota on the shared Redis."""
+    global _quota
+    with _quota_lock:
+        if _quota is None:
+            from .angel_utils import get_redis_client
+            _quota = BrokerQuota(get_redis_client())
+        return _quota
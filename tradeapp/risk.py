@@ -0,0 +1,130 @@
+"""
+In-memory portfolio risk book for the algo engine.
+
+Keeps trade count, realized PnL, mark-to-market PnL and gross exposure up to
+date incrementally as fills and prices arrive, so every StrategySettings limit
+can be checked in constant time without touching the database.
+"""
+import logging
+from datetime import datetime, time
+
+import pytz
+
+logger = logging.getLogger('algo_engine')
+
+IST = pytz.timezone("Asia/Kolkata")
+
+
+class RiskBook:
+    def __init__(self, settings):
+        self.load_settings(settings)
+        self.trade_count = 0
+        self.realized_pnl = 0.0
+        self.unrealized_pnl = 0.0
+        self.exposure = 0.0
+        self.halted = False
+        self.halt_reason = None
+        # Set by the engine's session timers; None means read the clock
+        self.session_open = None
+        # symbol -> [qty, avg_price, last_price]
+        self.positions = {}
+
+    def load_settings(self, settings):
+        # Decimal -> float once, the hot checks below never touch the model
+        self.active = settings.active
+        # A freshly created StrategySettings still holds its string defaults
+        self.start_time = time.fromisoformat(settings.start_time) if isinstance(settings.start_time, str) else settings.start_time
+        self.end_time = time.fromisoformat(settings.end_time) if isinstance(settings.end_time, str) else settings.end_time
+        self.max_total_trades = settings.max_total_trades
+        self.pnl_exit_enabled = settings.pnl_exit_enabled
+        self.profit_target = float(settings.profit_target_amount)
+        self.stop_loss = float(settings.stop_loss_amount)
+
+    def seed(self, trade_count, realized_pnl):
+        """Restores today's counters after a restart (one DB aggregate at startup)."""
+        self.trade_count = int(trade_count)
+        self.realized_pnl = float(realized_pnl or 0)
+
+    @property
+    def total_pnl(self):
+        return self.realized_pnl + self.unrealized_pnl
+
+    # --- Pre-trade checks ---------------------------------------------------
+
+    def in_session(self, now=None):
+        if now is None and self.session_open is not None:
+            return self.session_open
+        now = now or datetime.now(IST)
+        return self.start_time <= now.time() <= self.end_time
+
+    def can_enter(self, now=None):
+        """Returns (allowed, reason)."""
+        if self.halted:
+            return False, self.halt_reason
+        if not self.active:
+            return False, "Strategy inactive"
+        if self.trade_count >= self.max_total_trades:
+            return False, f"Max trades reached ({self.max_total_trades})"
+        if not self.in_session(now):
+            return False, "Outside trading window"
+        return True, None
+
+    # --- Incremental updates ------------------------------------------------
+
+    def on_entry_order(self):
+        self.trade_count += 1
+
+    def on_fill(self, symbol, transaction_type, qty, price):
+        pos = self.positions.get(symbol)
+        if transaction_type == "BUY":
+            if pos is None:
+                self.positions[symbol] = [qty, price, price]
+            else:
+                # Re-mark at the fill price before averaging in
+                self._mark(pos, price)
+                new_qty = pos[0] + qty
+                pos[1] = (pos[0] * pos[1] + qty * price) / new_qty
+                pos[0] = new_qty
+            self.exposure += qty * price
+            return
+
+        if pos is None:
+            return
+        self._mark(pos, price)
+        qty = min(qty, pos[0])
+        self.realized_pnl += qty * (price - pos[1])
+        self.unrealized_pnl -= qty * (price - pos[1])
+        self.exposure -= qty * price
+        pos[0] -= qty
+        if pos[0] <= 0:
+            del self.positions[symbol]
+
+    def on_price(self, symbol, ltp):
+        pos = self.positions.get(symbol)
+        if pos is not None:
+            self._mark(pos, ltp)
+
+    def _mark(self, pos, price):
+        delta = pos[0] * (price - pos[2])
+        self.unrealized_pnl += delta
+        self.exposure += delta
+        pos[2] = price
+
+    # --- Portfolio exit -----------------------------------------------------
+
+    def check_pnl_exit(self):
+        """Returns a reason string once a portfolio PnL limit is breached, else None."""
+        if self.halted or not self.pnl_exit_enabled:
+            return None
+        pnl = self.total_pnl
+        if pnl >= self.profit_target:
+            return self.halt(f"Portfolio target hit ({pnl:.2f})")
+        if pnl <= -self.stop_loss:
+            return self.halt(f"Portfolio stop hit ({pnl:.2f})")
+        return None
+
+    def halt(self, reason):
+        self.halted = True
+        self.halt_reason = reason
+        logger.warning(f"🛑 RISK HALT: {reason}")
+        return reason
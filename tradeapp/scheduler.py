@@ -0,0 +1,71 @@
+"""
+Hashed timer wheel for the algo engine's time-based events.
+
+Timers hash into `slots` buckets of `tick` seconds each by their deadline.
+`advance(now)` visits only the buckets for ticks that have passed since the
+last call, so a loop iteration with nothing due costs one bucket scan no
+matter how many signals are waiting to expire. Deadlines more than one
+revolution ahead simply stay in their bucket until a later pass.
+
+Cancellation is lazy (the timer is flagged and dropped when its bucket is
+next visited); handlers should also re-check that their target is still live.
+"""
+import time
+
+
+class Timer:
+    __slots__ = ('at', 'kind', 'payload', 'cancelled')
+
+    def __init__(self, at, kind, payload):
+        self.at = at
+        self.kind = kind
+        self.payload = payload
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=512, now=None):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.cursor = int((now if now is not None else time.time()) // tick)  # oldest tick not yet passed
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def schedule(self, at, kind, payload=None):
+        """Fires `kind` on the first advance() at or after epoch second `at`. Returns the Timer."""
+        timer = Timer(at, kind, payload)
+        # Already due: lands in the current bucket and fires on the next advance()
+        index = max(int(at // self.tick), self.cursor)
+        self.slots[index % len(self.slots)].append(timer)
+        self.count += 1
+        return timer
+
+    def advance(self, now=None):
+        """Timers due by `now`, in deadline order."""
+        now = time.time() if now is None else now
+        now_tick = int(now // self.tick)
+        due = []
+        # A gap longer than one revolution still only needs each bucket once
+        for index in range(self.cursor, min(now_tick, self.cursor + len(self.slots) - 1) + 1):
+            bucket = self.slots[index % len(self.slots)]
+            if not bucket:
+                continue
+            keep = []
+            for timer in bucket:
+                if timer.cancelled:
+                    self.count -= 1
+                elif timer.at <= now:
+                    due.append(timer)
+                    self.count -= 1
+                else:
+                    keep.append(timer)
+            bucket[:] = keep
+        # The current tick's bucket may still hold timers due later within it
+        self.cursor = max(self.cursor, now_tick)
+        due.sort(key=lambda timer: timer.at)
+        return due
@@ -0,0 +1,248 @@
+"""
+Shared broker session: one set of SmartAPI tokens for every process.
+
+Tokens live in a Redis hash and every update is announced on a pub/sub
+channel:
+
+    broker_session              {api_key, client_code, access_token, refresh_token,
+                                 feed_token, expires_at, version}
+    broker_session:updates      PUBLISH <version> after each change
+    broker_session:lock         SET NX lease held by whichever process is refreshing
+
+Each process keeps a `SessionCache` mirror, kept current by a subscriber
+thread, so AngelConnect picks up new tokens with an in-memory version check
+instead of a DB or Redis read. A `SessionManager` thread in every process
+refreshes the tokens REFRESH_AHEAD_SECS before they expire; the Redis lock
+means only one of them actually calls the broker, and the DB write happens
+there, off the order path.
+"""
+import base64
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = "broker_session"
+SESSION_CHANNEL = "broker_session:updates"
+LOCK_KEY = "broker_session:lock"
+TOKEN_FIELDS = ('api_key', 'client_code', 'access_token', 'refresh_token', 'feed_token')
+
+REFRESH_AHEAD_SECS = getattr(settings, 'BROKER_TOKEN_REFRESH_AHEAD_SECS', 1800)
+# Used when the access token carries no readable `exp` claim
+DEFAULT_TOKEN_TTL_SECS = 6 * 3600
+CHECK_INTERVAL_SECS = 30
+LOCK_TTL_SECS = 30
+
+
+def token_expiry(jwt):
+    """`exp` claim of a JWT (no signature check; we only need the schedule), or None."""
+    try:
+        payload = jwt.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:
+        return None
+
+
+class SessionCache:
+    """In-process mirror of the Redis session hash."""
+
+    def __init__(self):
+        self.tokens = {}
+        self.expires_at = 0.0
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def apply(self, data):
+        if not data:
+            return
+        version = int(data.get('version', 0))
+        with self.changed:
+            if version < self.version:
+                return
+            self.tokens = {f: data.get(f) for f in TOKEN_FIELDS}
+            self.expires_at = float(data.get('expires_at') or 0)
+            self.version = version
+            self.changed.notify_all()
+
+    def load(self, r):
+        self.apply(r.hgetall(SESSION_KEY))
+
+    def wait_for_change(self, version, timeout):
+        with self.changed:
+            return self.changed.wait_for(lambda: self.version != version, timeout)
+
+    def listen(self, r):
+        def loop():
+            while True:
+                pubsub = r.pubsub(ignore_subscribe_messages=True)
+                try:
+                    pubsub.subscribe(SESSION_CHANNEL)
+                    # Catch anything published before the subscription was live
+                    self.load(r)
+                    for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.load(r)
+                except Exception as e:
+                    logger.error(f"Session listener error: {e}")
+                    time.sleep(1)
+                finally:
+                    pubsub.close()
+
+        threading.Thread(target=loop, name="session-listener", daemon=True).start()
+
+
+def publish_session(r, tokens, expires_at=None):
+    """Writes new tokens to the shared hash and announces them. Returns the new version."""
+    expires_at = expires_at or token_expiry(tokens.get('access_token') or '') or time.time() + DEFAULT_TOKEN_TTL_SECS
+    pipe = r.pipeline()
+    pipe.hset(SESSION_KEY, mapping={**{f: tokens.get(f) or '' for f in TOKEN_FIELDS}, 'expires_at': expires_at})
+    pipe.hincrby(SESSION_KEY, 'version', 1)
+    version = pipe.execute()[1]
+    r.publish(SESSION_CHANNEL, version)
+    return version
+
+
+def tokens_from_creds(creds):
+    return {f: getattr(creds, f) for f in TOKEN_FIELDS}
+
+
+class SessionManager(threading.Thread):
+    def __init__(self, r, cache, refresh_ahead=REFRESH_AHEAD_SECS, check_interval=CHECK_INTERVAL_SECS):
+        super().__init__(name="session-manager", daemon=True)
+        self.r = r
+        self.cache = cache
+        self.refresh_ahead = refresh_ahead
+        self.check_interval = check_interval
+
+    def run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Session manager error: {e}")
+            time.sleep(self.check_interval)
+
+    def seed(self):
+        """First process up copies the DB credentials into the shared cache."""
+        from .models import APICredential
+        creds = APICredential.objects.first()
+        if creds and creds.access_token and self.r.set(LOCK_KEY, 'seed', nx=True, ex=LOCK_TTL_SECS):
+            try:
+                if not self.r.exists(SESSION_KEY):
+                    publish_session(self.r, tokens_from_creds(creds))
+            finally:
+                self.r.delete(LOCK_KEY)
+        self.cache.load(self.r)
+
+    def tick(self):
+        if not self.cache.version:
+            self.seed()
+        if self.cache.tokens.get('refresh_token') and time.time() >= self.cache.expires_at - self.refresh_ahead:
+            self.refresh("expiring")
+
+    def refresh(self, reason, stale_access_token=None, wait=5.0):
+        """
+        Refreshes once across all processes. Returns True when the cache holds
+        tokens newer than `stale_access_token` (ours or another process's).
+        """
+        version = self.cache.version
+        if stale_access_token and self.cache.tokens.get('access_token') != stale_access_token:
+            return True
+        if not self.r.set(LOCK_KEY, 'refresh', nx=True, ex=LOCK_TTL_SECS):
+            # Someone else is refreshing: wait for their publish instead of piling on
+            return self.cache.wait_for_change(version, wait)
+        try:
+            self.cache.load(self.r)
+            if self.cache.version != version:
+                return True
+            tokens = self._generate(reason)
+            if not tokens:
+                return False
+            publish_session(self.r, tokens)
+            self.cache.load(self.r)
+            self._persist(tokens)
+            return True
+        finally:
+            self.r.delete(LOCK_KEY)
+
+    def _generate(self, reason):
+        import SmartApi.smartConnect as smart
+        from .ratelimit import get_quota
+        current = self.cache.tokens
+        logger.info(f"🔄 Refreshing broker session ({reason})...")
+        try:
+            client = smart.SmartConnect(api_key=current['api_key'])
+            client.setAccessToken(current['access_token'])
+            client.setRefreshToken(current['refresh_token'])
+            get_quota().acquire('session')
+            data = client.generateToken(current['refresh_token'])
+        except Exception as e:
+            logger.error(f"❌ Exception during Refresh: {e}")
+            return None
+        if not (data.get('status') or data.get('success')):
+            logger.error(f"❌ Refresh Failed: {data.get('message', 'Unknown Error')}")
+            return None
+        logger.info("✅ Broker session refreshed")
+        return {
+            **current,
+            'access_token': data['data']['jwtToken'],
+            'feed_token': data['data']['feedToken'],
+            'refresh_token': data['data']['refreshToken'],
+        }
+
+    def _persist(self, tokens):
+        from .models import APICredential
+        try:
+            APICredential.objects.filter(api_key=tokens['api_key']).update(
+                access_token=tokens['access_token'],
+                feed_token=tokens['feed_token'],
+                refresh_token=tokens['refresh_token'],
+            )
+        except Exception as e:
+            logger.error(f"Session persist failed: {e}")
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class BrokerSession:
+    """Per-process handle: the cache plus its manager thread."""
+
+    def __init__(self, r):
+        self.r = r
+        self.cache = SessionCache()
+        self.manager = SessionManager(r, self.cache)
+
+    def start(self):
+        self.manager.seed()
+        self.cache.listen(self.r)
+        self.manager.start()
+        return self
+
+    @property
+    def version(self):
+        return self.cache.version
+
+    @property
+    def tokens(self):
+        return self.cache.tokens
+
+    def request_refresh(self, stale_access_token):
+        """Reactive path (a call failed with Invalid Token)."""
+        return self.manager.refresh("rejected", stale_access_token=stale_access_token)
+
+
+def get_session(r=None):
+    """The process-wide BrokerSession, started on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            from .angel_utils import get_redis_client
+            _session = BrokerSession(r or get_redis_client()).start()
+        return _session
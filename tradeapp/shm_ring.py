@@ -0,0 +1,239 @@
+"""
+Shared-memory hand-off between a co-located data engine and algo engine.
+
+One named segment (settings.COLOCATED_SHM_NAME) holds:
+
+    header   magic, version, capacity, n_tokens, write_seq, instance   (64 bytes)
+    ltp      n_tokens x (ltp, high, low) float64, indexed by universe position
+    ring     capacity x 64-byte candle slots
+
+The data engine is the only writer. A slot is written as: slot seq := 0,
+payload, slot seq := n + 1, then the header's write_seq := n + 1. A reader
+copies a slot and accepts it only if the slot seq read before and after the
+copy is n + 1, so a slot being overwritten is never half-read. A reader more
+than `capacity` behind is lapped; it skips ahead and reports the gap.
+
+A restarted data engine unlinks the segment and creates a new one under the
+same name, while an attached reader keeps mapping the old one. Every segment
+carries a random producer `instance` (zeroed when its producer closes it), so
+`producer_changed()` can tell and the reader can `reattach()`. Nothing records
+how far a reader got, so a new reader starts at the oldest candle the ring
+still holds; the algo engine's processed bitmap drops what it already evaluated.
+
+This relies on the writer's stores becoming visible in program order, which
+holds on x86-64 (the only place the engines run).
+"""
+import logging
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from django.conf import settings
+
+from .candles import minute_epoch, minute_label
+
+logger = logging.getLogger(__name__)
+
+SHM_NAME = getattr(settings, 'COLOCATED_SHM_NAME', 'algotrader_candles')
+CAPACITY = getattr(settings, 'COLOCATED_RING_CAPACITY', 16384)
+
+MAGIC = 0x43524E47  # 'CRNG'
+VERSION = 2
+HEADER = struct.Struct('<IHxxIIQQ')      # magic, version, capacity, n_tokens, write_seq, instance
+HEADER_SIZE = 64
+WRITE_SEQ = struct.Struct('<Q')
+WRITE_SEQ_OFFSET = 16
+INSTANCE = struct.Struct('<Q')
+INSTANCE_OFFSET = 24
+LTP = struct.Struct('<ddd')
+SLOT = struct.Struct('<QIxxxxqddddd')   # seq, token, minute epoch, o, h, l, c, volume
+SLOT_SIZE = 64
+SEQ = struct.Struct('<Q')
+
+# Segments created by this process; see _open()
+_owned = set()
+
+
+class CandleRing:
+    def __init__(self, shm, token_map, owner=False):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, version, self.capacity, n_tokens, _, self.instance = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{shm.name} is not a v{VERSION} candle ring")
+        # Both engines derive the same token order from the shared universe
+        self.tokens = list(token_map)
+        if len(self.tokens) != n_tokens:
+            raise ValueError(f"Ring built for {n_tokens} tokens, universe has {len(self.tokens)}")
+        self.token_map = token_map
+        self.index = {token: i for i, token in enumerate(self.tokens)}
+        self.symbol_index = {symbol: i for i, symbol in enumerate(token_map.values())}
+        self.ltp_offset = HEADER_SIZE
+        self.ring_offset = HEADER_SIZE + n_tokens * LTP.size
+        self.cursor = max(0, self.write_seq - self.capacity)
+
+    @staticmethod
+    def size_for(n_tokens, capacity):
+        return HEADER_SIZE + n_tokens * LTP.size + capacity * SLOT_SIZE
+
+    @classmethod
+    def create(cls, token_map, name=SHM_NAME, capacity=CAPACITY):
+        size = cls.size_for(len(token_map), capacity)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed producer: start over
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        instance = int.from_bytes(os.urandom(8), 'little') or 1
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, capacity, len(token_map), 0, instance)
+        _owned.add(shm._name)
+        return cls(shm, token_map, owner=True)
+
+    @staticmethod
+    def _open(name):
+        shm = shared_memory.SharedMemory(name=name)
+        # Python < 3.13 would unlink the producer's segment when this process exits. The
+        # tracker keys by name, so when the producer is in this process (run_colocated) its
+        # own registration is left alone for its unlink() to remove.
+        if shm._name not in _owned:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+    @classmethod
+    def attach(cls, token_map, name=SHM_NAME, wait=None):
+        """Attaches to the producer's segment, retrying for up to `wait` seconds."""
+        deadline = time.monotonic() + (wait or 0)
+        while True:
+            try:
+                shm = cls._open(name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+        return cls(shm, token_map)
+
+    def producer_changed(self):
+        """True once this mapping is no longer the live segment: its producer closed it, or a new one replaced it."""
+        if INSTANCE.unpack_from(self.buf, INSTANCE_OFFSET)[0] != self.instance:
+            return True
+        try:
+            shm = self._open(self.shm.name)
+        except FileNotFoundError:
+            return True
+        try:
+            return INSTANCE.unpack_from(shm.buf, INSTANCE_OFFSET)[0] != self.instance
+        finally:
+            shm.close()
+
+    def reattach(self):
+        """
+        A reader on the segment now under this ring's name, starting from the
+        oldest candle it still holds (the new producer's first candles were
+        written while this reader was looking elsewhere). Closes this mapping.
+        """
+        shm = self._open(self.shm.name)
+        try:
+            ring = CandleRing(shm, self.token_map)
+        except ValueError:
+            shm.close()
+            raise
+        self.close()
+        return ring
+
+    def reader(self):
+        """Another cursor over the same segment (co-located engines in one process)."""
+        return CandleRing(self.shm, self.token_map)
+
+    def close(self):
+        if self.owner:
+            # Tells readers still mapping this segment that it is retired
+            INSTANCE.pack_into(self.buf, INSTANCE_OFFSET, 0)
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            _owned.discard(self.shm._name)
+
+    # --- Producer -------------------------------------------------------------
+
+    @property
+    def write_seq(self):
+        return WRITE_SEQ.unpack_from(self.buf, WRITE_SEQ_OFFSET)[0]
+
+    def set_ltp(self, token, ltp, high, low):
+        i = self.index.get(token)
+        if i is not None:
+            LTP.pack_into(self.buf, self.ltp_offset + i * LTP.size, ltp, high, low)
+
+    def publish(self, token, data):
+        """Appends one sealed candle and updates the token's LTP row."""
+        n = self.write_seq
+        offset = self.ring_offset + (n % self.capacity) * SLOT_SIZE
+        buf = self.buf
+        SEQ.pack_into(buf, offset, 0)
+        SLOT.pack_into(buf, offset, 0, int(token), minute_epoch(data['ts']), data['open'],
+                       data['high'], data['low'], data['close'], data['volume'])
+        SEQ.pack_into(buf, offset, n + 1)
+        self.set_ltp(token, data['close'], data['high'], data['low'])
+        WRITE_SEQ.pack_into(buf, WRITE_SEQ_OFFSET, n + 1)
+
+    # --- Consumer -------------------------------------------------------------
+
+    def read(self, limit=None):
+        """Candles written since the last read, oldest first, as stream-style dicts."""
+        head = self.write_seq
+        if head - self.cursor > self.capacity:
+            dropped = head - self.capacity - self.cursor
+            logger.warning(f"⚠️ Candle ring lapped, skipped {dropped} candles")
+            self.cursor = head - self.capacity
+        end = head if limit is None else min(head, self.cursor + limit)
+        out = []
+        buf = self.buf
+        while self.cursor < end:
+            n = self.cursor
+            offset = self.ring_offset + (n % self.capacity) * SLOT_SIZE
+            seq, token, minute, o, h, l, c, v = SLOT.unpack_from(buf, offset)
+            if seq != n + 1 or SEQ.unpack_from(buf, offset)[0] != n + 1:
+                # Overwritten under us: the producer has lapped this reader
+                self.cursor = self.write_seq - self.capacity + 1
+                continue
+            token = str(token)
+            out.append({"symbol": self.token_map.get(token, token), "token": token, "open": o, "high": h,
+                        "low": l, "close": c, "volume": v, "ts": minute_label(minute)})
+            self.cursor = n + 1
+        return out
+
+    def wait(self, timeout, poll=0.001):
+        """Blocks until a candle is available or `timeout` passes. Returns True if one is."""
+        deadline = time.monotonic() + timeout
+        while self.write_seq == self.cursor:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def ltp_view(self):
+        return LtpView(self)
+
+
+class LtpView:
+    """Read-only {symbol: {"ltp", "high", "low"}} over the shared LTP rows, resolved lazily per lookup."""
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def __contains__(self, symbol):
+        i = self.ring.symbol_index.get(symbol)
+        return i is not None and LTP.unpack_from(self.ring.buf, self.ring.ltp_offset + i * LTP.size)[0] > 0
+
+    def __getitem__(self, symbol):
+        i = self.ring.symbol_index[symbol]
+        ltp, high, low = LTP.unpack_from(self.ring.buf, self.ring.ltp_offset + i * LTP.size)
+        return {"ltp": ltp, "high": high, "low": low}
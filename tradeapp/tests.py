@@ -1,3 +1,668 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import time
+from array import array
+from datetime import date, datetime, time as dtime
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import pytz
+import redis
+import requests
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import views
+from .backtest import COL_PDH, COL_SESSION_END, BreakoutParams, pack_candles, param_grid, simulate, sweep
+from .benchmarks import InMemoryRedis
+from .candles import ProcessedCandles
+from .history import HistoryStore, _merge_ranges, _missing
+from .http_pool import KeepAlive, PooledRequests, warm
+from .indicators import IndicatorBook
+from .instruments import InstrumentMaster, trading_exchange
+from .journal import Journal, rebuild
+from .levels import FIELDS as LEVEL_FIELDS, ReferenceLevels, encode_levels, is_current
+from .live import Broadcaster, _async_redis, event_stream
+from .management.commands.fetch_pdh import Command as FetchPdh
+from .management.commands.run_algo_engine import CashBreakoutClient
+from .metrics import METRICS_INSTANCES, MetricsRegistry, render_prometheus
+from .models import Trade, TradeEvent
+from .positions import Position
+from .ratelimit import BrokerQuota, TokenBucket
+from .risk import RiskBook
+from .scheduler import TimerWheel
+from .shm_ring import CandleRing
+
+IST = pytz.timezone("Asia/Kolkata")
+
+
+def session(day, start, rows):
+    """getCandleData rows for consecutive minutes from `start` ('HH:MM') on `day`."""
+    hour, minute = map(int, start.split(':'))
+    return [[f"{day}T{hour + (minute + i) // 60:02d}:{(minute + i) % 60:02d}:00+05:30", o, h, l, c, 1000]
+            for i, (o, h, l, c) in enumerate(rows)]
+
+
+class BacktestTests(SimpleTestCase):
+    # Thursday sets PDH 100; Friday opens below it and closes the first minute above
+    candles = {'A-EQ': session('2026-10-15', '09:15', [(95, 100, 94, 99), (99, 99.5, 97, 98)])
+                       + session('2026-10-16', '09:15', [(99, 101, 98, 100.5), (101.5, 103, 101, 102),
+                                                         (104, 108, 103, 107.5)])}
+    params = BreakoutParams(0.0, 0.0, 2.0, 5, 100.0)
+
+    def test_pack_candles_carries_previous_session_high(self):
+        cols, signals = pack_candles(self.candles)
+        self.assertEqual(list(cols[COL_PDH][2:]), [100.0] * 3)
+        self.assertEqual(list(cols[COL_SESSION_END]), [1, 1, 4, 4, 4])
+        self.assertEqual(list(signals), [2])
+
+    def test_simulate_fills_above_signal_high_and_exits_at_target(self):
+        cols, signals = pack_candles(self.candles)
+        stats = simulate(SimpleNamespace(cols=cols, signals=signals), self.params)
+        # Fill at the 101.5 open, stop 98: 28 shares for 100 of risk, out at the 108 target
+        self.assertEqual(stats, {'pnl': 154.0, 'trades': 1, 'win_rate': 1.0, 'avg_r': round(5.5 / 3.5, 4),
+                                 'max_drawdown': 0.0})
+
+    def test_sweep_ranks_every_combination(self):
+        grid = param_grid([0.0], [0.0], [2.0, 10.0], [5], [100.0])
+        results = sweep(self.candles, grid, processes=2)
+        self.assertEqual(len(results), 2)
+        # An out-of-reach target holds to the session close, which paid more here
+        self.assertEqual(results[0][0].target_r, 10.0)
+        self.assertEqual(results[0][1]['pnl'], 168.0)
+
+    def test_drawdown_follows_trades_in_time_order_across_symbols(self):
+        def loser(day, start, pdh):
+            # Fills above the signal high and stops out in the same bar: 28 shares lose 98
+            return session(day, start, [(pdh - 1, pdh + 1, pdh - 2, pdh + 0.5), (pdh + 1.5, pdh + 2, pdh - 3, pdh - 2.5)])
+
+        def winner(day, start, pdh):
+            return session(day, start, [(pdh - 1, pdh + 1, pdh - 2, pdh + 0.5), (pdh + 1.5, pdh + 20, pdh + 1, pdh + 10)])
+
+        candles = {
+            'A-EQ': session('2026-10-15', '09:15', [(98, 100, 97, 99)]) + loser('2026-10-16', '09:15', 100)
+                    + loser('2026-10-19', '09:15', 102),
+            'B-EQ': session('2026-10-15', '09:15', [(48, 50, 47, 49)]) + winner('2026-10-16', '09:30', 50),
+        }
+        cols, signals = pack_candles(candles)
+        stats = simulate(SimpleNamespace(cols=cols, signals=signals), self.params)
+        # -98, +154, -98: B's win lands between A's two losses
+        self.assertEqual((stats['trades'], stats['pnl'], stats['max_drawdown']), (3, -42.0, 98.0))
+
+
+class RiskBookTests(SimpleTestCase):
+    def make_book(self, **overrides):
+        values = dict(active=True, start_time='09:15:00', end_time='15:15:00', max_total_trades=2,
+                      pnl_exit_enabled=True, profit_target_amount=1000, stop_loss_amount=500)
+        values.update(overrides)
+        return RiskBook(SimpleNamespace(**values))
+
+    def at(self, hour, minute=0):
+        return IST.localize(datetime(2026, 10, 19, hour, minute))
+
+    def test_string_session_defaults_are_parsed(self):
+        book = self.make_book()
+        self.assertEqual(book.start_time, dtime(9, 15))
+        self.assertEqual(book.can_enter(self.at(10)), (True, None))
+        self.assertEqual(book.can_enter(self.at(9))[0], False)
+
+    def test_trade_count_limit(self):
+        book = self.make_book()
+        book.on_entry_order()
+        book.on_entry_order()
+        allowed, reason = book.can_enter(self.at(10))
+        self.assertFalse(allowed)
+        self.assertIn("Max trades", reason)
+
+    def test_inactive_strategy_never_enters(self):
+        self.assertEqual(self.make_book(active=False).can_enter(self.at(10)), (False, "Strategy inactive"))
+
+    def test_session_flag_overrides_the_clock(self):
+        book = self.make_book()
+        book.session_open = False
+        self.assertFalse(book.can_enter()[0])
+
+    def test_pnl_tracking_and_portfolio_stop(self):
+        book = self.make_book()
+        book.on_fill('A', 'BUY', 10, 100.0)
+        book.on_price('A', 80.0)
+        self.assertAlmostEqual(book.unrealized_pnl, -200.0)
+        book.on_fill('A', 'SELL', 10, 50.0)
+        self.assertAlmostEqual(book.realized_pnl, -500.0)
+        self.assertAlmostEqual(book.total_pnl, -500.0)
+        with self.assertLogs('algo_engine', 'WARNING'):
+            self.assertIn("stop", book.check_pnl_exit())
+        self.assertEqual(book.can_enter(self.at(10))[0], False)
+
+
+class PortfolioExitTests(SimpleTestCase):
+    def make_engine(self):
+        # Just the state the square-off path touches; no broker, Redis or database
+        engine = CashBreakoutClient.__new__(CashBreakoutClient)
+        engine.risk = SimpleNamespace(halted=False, halt_reason=None, check_pnl_exit=mock.Mock())
+        engine.exit_issued = False
+        engine.pending_trades = {}
+        engine.open_trades = {'A-EQ': SimpleNamespace(symbol='A-EQ', token='1', quantity=5, status='OPEN'),
+                              'B-EQ': SimpleNamespace(symbol='B-EQ', token='2', quantity=3, status='PENDING_ENTRY',
+                                                      entry_order_id='E2')}
+        engine.angel = mock.Mock()
+        engine.angel.get_order_statuses.return_value = {}
+        engine.journal = mock.Mock()
+        engine.journal.record.side_effect = lambda trade, kind, status, **changes: setattr(trade, 'status', status)
+        engine._flush_journal = mock.Mock()
+        return engine
+
+    def test_square_off_goes_out_once_and_failures_are_retried_on_reconcile(self):
+        engine = self.make_engine()
+        engine.risk.halted, engine.risk.halt_reason = True, "Portfolio stop hit (-600.00)"
+        engine.angel.place_order.side_effect = RuntimeError('rejected')
+        with self.assertLogs('algo_engine', 'ERROR'):
+            engine._check_portfolio_exit()
+        engine._check_portfolio_exit()
+        self.assertEqual(engine.angel.place_order.call_count, 1)
+        self.assertEqual(engine.open_trades['A-EQ'].status, 'FAILED_EXIT')
+
+        # The entry left working at the halt fills; the next reconcile exits both
+        engine.angel.place_order.side_effect = None
+        engine.angel.place_order.return_value = 'X1'
+        engine.angel.get_order_statuses.return_value = {
+            'E2': {'status': 'complete', 'average_price': 50.0, 'filled_quantity': 3}}
+        engine.risk.on_fill = mock.Mock()
+        engine._reconcile()
+        self.assertEqual([c.args[1] for c in engine.angel.place_order.call_args_list[1:]], ['A-EQ', 'B-EQ'])
+        self.assertEqual({t.status for t in engine.open_trades.values()}, {'PENDING_EXIT'})
+
+
+class MetricsTests(SimpleTestCase):
+    def test_snapshot_flattens_counters_gauges_and_summaries(self):
+        registry = MetricsRegistry()
+        registry.inc('signals_total')
+        registry.inc('signals_total', 2)
+        registry.set_gauge('stream_lag', 4)
+        registry.observe('db_write_seconds', 0.5)
+        registry.observe('db_write_seconds', 1.5)
+        snapshot = registry.snapshot()
+        self.assertEqual((snapshot['c:signals_total'], snapshot['g:stream_lag']), (3, 4))
+        self.assertEqual([snapshot[f's:db_write_seconds:{part}'] for part in ('count', 'sum', 'max')], [2, 2.0, 1.5])
+
+    def test_render_labels_each_instance_and_forgets_expired_ones(self):
+        r = mock.Mock()
+        r.smembers.return_value = {'algo@host:1', 'algo@host:2'}
+        r.pipeline.return_value.execute.return_value = [
+            {'engine': 'algo', 'updated': '1', 'c:signals_total': '3', 's:db_write_seconds:count': '2',
+             's:db_write_seconds:sum': '2.0', 's:db_write_seconds:max': '1.5'},
+            {},
+        ]
+        text = render_prometheus(r)
+        labels = 'engine="algo",instance="algo@host:1"'
+        self.assertIn('# TYPE algotrader_signals_total counter', text)
+        self.assertIn(f'algotrader_signals_total{{{labels}}} 3', text)
+        self.assertIn(f'algotrader_db_write_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'algotrader_db_write_seconds_max{{{labels}}} 1.5', text)
+        self.assertNotIn('algo@host:2', text)
+        r.srem.assert_called_once_with(METRICS_INSTANCES, 'algo@host:2')
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_view_needs_the_token_or_a_staff_login(self):
+        factory = RequestFactory()
+        anonymous = SimpleNamespace(is_authenticated=False, is_staff=False)
+        staff = SimpleNamespace(is_authenticated=True, is_staff=True)
+        requests_and_codes = [
+            (factory.get('/metrics/', {'token': 'guess'}), anonymous, 403),
+            (factory.get('/metrics/', HTTP_AUTHORIZATION='Bearer s3cret'), anonymous, 200),
+            (factory.get('/metrics/'), staff, 200),
+        ]
+        with mock.patch('tradeapp.views.get_redis_client'), \
+                mock.patch('tradeapp.views.render_prometheus', return_value="engine_up 1\n"):
+            for request, user, code in requests_and_codes:
+                request.user = user
+                self.assertEqual(views.metrics(request).status_code, code)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_paced(self):
+        bucket = TokenBucket(rate=2, burst=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        wait = bucket.try_acquire()
+        self.assertGreater(wait, 0.0)
+        self.assertLessEqual(wait, 0.5)
+
+    def test_idle_refill_is_capped_at_the_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        bucket.updated -= 60
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        self.assertAlmostEqual(bucket.tokens, 1.0, places=2)
+
+
+class HistoryRangeTests(SimpleTestCase):
+    def test_missing_gaps_around_covered_ranges(self):
+        ranges = _merge_ranges([[date(2026, 1, 5), date(2026, 1, 9)], [date(2026, 1, 15), date(2026, 1, 20)]])
+        self.assertEqual(_missing(ranges, date(2026, 1, 1), date(2026, 1, 31)), [
+            (date(2026, 1, 1), date(2026, 1, 4)),
+            (date(2026, 1, 10), date(2026, 1, 14)),
+            (date(2026, 1, 21), date(2026, 1, 31)),
+        ])
+
+    def test_nothing_missing_inside_coverage(self):
+        ranges = [[date(2026, 1, 1), date(2026, 1, 31)]]
+        self.assertEqual(_missing(ranges, date(2026, 1, 3), date(2026, 1, 10)), [])
+
+    def test_adjacent_ranges_merge(self):
+        merged = _merge_ranges([[date(2026, 1, 10), date(2026, 1, 12)], [date(2026, 1, 5), date(2026, 1, 9)]])
+        self.assertEqual(merged, [[date(2026, 1, 5), date(2026, 1, 12)]])
+
+    def test_merge_then_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = HistoryStore(root)
+            store.merge('1', 'ONE_DAY', [['2026-01-05T00:00:00+05:30', 1, 2, 0.5, 1.5, 100],
+                                         ['2026-01-06T00:00:00+05:30', 2, 3, 1.5, 2.5, 200]])
+            cols = HistoryStore(root).load('1', 'ONE_DAY')
+            self.assertEqual(list(cols['close']), [1.5, 2.5])
+            self.assertEqual(list(cols['volume']), [100.0, 200.0])
+
+
+class ReferenceLevelsTests(SimpleTestCase):
+    def test_round_trip(self):
+        cols = {f: array('d', [i + 1.0, i + 2.0]) for i, f in enumerate(LEVEL_FIELDS)}
+        cols['session'] = array('d', [date(2026, 10, 16).toordinal()] * 2)
+        levels = ReferenceLevels.decode(encode_levels(['A-EQ', 'B-EQ'], cols, created=1234.5))
+        self.assertEqual(levels.symbols, ['A-EQ', 'B-EQ'])
+        self.assertEqual(levels.get('B-EQ', 'pdh'), cols['pdh'][1])
+        self.assertEqual(levels.column_map('pdh'), {'A-EQ': cols['pdh'][0], 'B-EQ': cols['pdh'][1]})
+        self.assertEqual((levels.asof, levels.created), (date(2026, 10, 16).toordinal(), 1234.5))
+
+    def test_current_map_leaves_out_rows_from_an_older_session(self):
+        cols = {f: array('d', [1.0, 2.0]) for f in LEVEL_FIELDS}
+        # B-EQ did not trade on Friday, so its row still holds Thursday's levels
+        cols['session'] = array('d', [date(2026, 10, 16).toordinal(), date(2026, 10, 15).toordinal()])
+        levels = ReferenceLevels.decode(encode_levels(['A-EQ', 'B-EQ'], cols))
+        self.assertEqual(levels.current_map('pdh'), {'A-EQ': 1.0})
+
+    def test_levels_from_an_earlier_session_are_not_current(self):
+        monday = IST.localize(datetime(2026, 10, 19, 9, 0))
+        self.assertTrue(is_current(date(2026, 10, 16).toordinal(), now=monday))
+        self.assertFalse(is_current(date(2026, 10, 15).toordinal(), now=monday))
+        # Built after Friday's close, so Thursday was the last session (Friday a holiday)
+        built = IST.localize(datetime(2026, 10, 17, 8, 0)).timestamp()
+        self.assertTrue(is_current(date(2026, 10, 15).toordinal(), built, now=monday))
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def psubscribe(self, pattern):
+        self.pattern = pattern
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self):
+        pass
+
+
+class FakeAsyncRedis:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def pubsub(self):
+        return FakePubSub(self.messages)
+
+    async def aclose(self):
+        pass
+
+
+class EventStreamTests(SimpleTestCase):
+    async def test_snapshot_then_own_deltas(self):
+        messages = asyncio.Queue()
+        fanout = Broadcaster(client_factory=lambda: FakeAsyncRedis(messages))
+
+        async def load_snapshot():
+            return 'etag', '{"trades": []}'
+
+        with mock.patch('tradeapp.live.broadcaster', fanout):
+            stream = event_stream(7, load_snapshot, heartbeat_secs=1)
+            self.assertEqual(await anext(stream), 'event: snapshot\ndata: {"trades": []}\n\n')
+            await messages.put({'type': 'pmessage', 'channel': 'dashboard_events:8', 'data': '{"id": 2}'})
+            await messages.put({'type': 'pmessage', 'channel': 'dashboard_events:7', 'data': '{"id": 1}'})
+            self.assertEqual(await anext(stream), 'data: {"id": 1}\n\n')
+            await stream.aclose()
+        self.assertEqual(dict(fanout.sessions), {})
+        fanout._task.cancel()
+
+    def test_stalled_session_is_cut_off(self):
+        fanout = Broadcaster()
+        queue = asyncio.Queue(2)
+        fanout.sessions[7].add(queue)
+        for n in range(3):
+            fanout.dispatch('dashboard_events:7', n)
+        self.assertNotIn(7, fanout.sessions)
+        # Oldest delta dropped for the end-of-stream marker
+        self.assertEqual([queue.get_nowait(), queue.get_nowait()], [1, None])
+
+    def test_async_client_for_a_plain_redis_url(self):
+        with mock.patch.dict(os.environ, {'REDIS_URL': 'redis://cache.example:6380/2'}):
+            client = _async_redis()
+        # The connection is built on first use, which is where a TLS-only option fails
+        connection = client.connection_pool.make_connection()
+        self.assertEqual((connection.host, connection.port, connection.db), ('cache.example', 6380, 2))
+
+
+class HttpPoolTests(SimpleTestCase):
+    def test_requests_share_one_session(self):
+        session = mock.Mock()
+        pooled = PooledRequests(session, ca_bundle='/etc/broker-ca.pem')
+        pooled.request('POST', 'https://broker/order', json={})
+        pooled.request('GET', 'https://broker/book', verify=False)
+        self.assertEqual([call.kwargs['verify'] for call in session.request.call_args_list],
+                         ['/etc/broker-ca.pem', False])
+        self.assertIs(pooled.exceptions, requests.exceptions)
+
+    def test_warm_touches_every_pooled_connection(self):
+        session = mock.Mock()
+        session.head.side_effect = [None, None, requests.ConnectionError('reset')]
+        with self.assertLogs('tradeapp.http_pool', 'WARNING'):
+            self.assertEqual(warm(PooledRequests(session), 'https://broker', 3), 2)
+        self.assertEqual(session.head.call_count, 3)
+
+    def test_keepalive_runs_only_when_idle_in_market_hours(self):
+        pooled = PooledRequests(mock.Mock())
+        clock = mock.Mock(return_value=IST.localize(datetime(2026, 10, 19, 9, 12)))
+        keepalive = KeepAlive(pooled, 'https://broker', interval=30, clock=clock)
+        pooled.last_used = time.monotonic() - 60
+        self.assertTrue(keepalive.due())
+        pooled.last_used = time.monotonic()
+        self.assertFalse(keepalive.due())
+        pooled.last_used = time.monotonic() - 60
+        clock.return_value = IST.localize(datetime(2026, 10, 19, 16, 0))
+        self.assertFalse(keepalive.due())
+
+
+class CandleRingTests(SimpleTestCase):
+    universe = {'1': 'A-EQ', '2': 'B-EQ'}
+
+    def setUp(self):
+        self.ring = CandleRing.create(self.universe, name=f"test_ring_{os.getpid()}", capacity=4)
+        self.addCleanup(self.ring.close)
+
+    def publish(self, closes):
+        for close in closes:
+            self.ring.publish('1', {'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': close, 'volume': 10.0,
+                                    'ts': '2026-10-19 09:16:00+0530'})
+
+    def test_reader_sees_candles_in_order(self):
+        reader = self.ring.reader()
+        self.publish([1.0, 2.0, 3.0])
+        self.assertEqual([c['close'] for c in reader.read(limit=2)], [1.0, 2.0])
+        self.assertEqual([c['close'] for c in reader.read()], [3.0])
+        self.assertEqual(reader.read(), [])
+
+    def test_lapped_reader_skips_to_the_oldest_retained_candle(self):
+        reader = self.ring.reader()
+        self.publish([float(i) for i in range(10)])
+        with self.assertLogs('tradeapp.shm_ring', 'WARNING'):
+            closes = [c['close'] for c in reader.read()]
+        self.assertEqual(closes, [6.0, 7.0, 8.0, 9.0])
+
+    def test_ltp_rows_follow_published_closes(self):
+        self.publish([42.0])
+        view = self.ring.ltp_view()
+        self.assertIn('A-EQ', view)
+        self.assertNotIn('B-EQ', view)
+        self.assertEqual(view['A-EQ']['ltp'], 42.0)
+
+    def test_late_reader_starts_at_the_oldest_retained_candle(self):
+        self.publish([float(i) for i in range(6)])
+        late = CandleRing.attach(self.universe, name=self.ring.shm.name)
+        self.addCleanup(late.close)
+        self.assertEqual([c['close'] for c in late.read()], [2.0, 3.0, 4.0, 5.0])
+
+    def test_reader_in_the_producers_process_keeps_its_tracker_registration(self):
+        # Unregistering here would leave the producer's unlink() to a KeyError in the tracker
+        with mock.patch('tradeapp.shm_ring.resource_tracker.unregister') as unregister:
+            self.assertFalse(self.ring.reader().producer_changed())
+        unregister.assert_not_called()
+
+
+class JournalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='journal')
+
+    def position(self, symbol='ABC-EQ'):
+        return Position(user_id=self.user.id, symbol=symbol, token='1',
+                        candle_ts=IST.localize(datetime(2026, 10, 19, 10, 0)),
+                        entry_level=101.0, stop_level=99.0, target_level=105.0)
+
+    def test_flush_inserts_signals_and_updates_transitions(self):
+        journal = Journal(self.user.id)
+        position = self.position()
+        journal.signal(position)
+        self.assertEqual(journal.flush(), 1)
+        self.assertIsNotNone(position.id)
+
+        journal.record(position, 'ORDER', 'PENDING_ENTRY', entry_order_id='X1', quantity=5)
+        journal.flush()
+        trade = Trade.objects.get(id=position.id)
+        self.assertEqual((trade.status, trade.entry_order_id, trade.quantity), ('PENDING_ENTRY', 'X1', 5))
+        self.assertEqual(list(trade.events.order_by('id').values_list('kind', flat=True)), ['SIGNAL', 'ORDER'])
+
+    def test_failed_flush_keeps_everything_for_the_next_one(self):
+        journal = Journal(self.user.id)
+        position = self.position()
+        journal.signal(position)
+        with mock.patch.object(TradeEvent.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                journal.flush()
+        self.assertIsNone(position.id)
+        self.assertFalse(Trade.objects.exists())
+        self.assertEqual(journal.flush(), 1)
+        self.assertEqual(Trade.objects.get().status, 'PENDING')
+
+    def test_rebuild_projects_trade_from_events(self):
+        journal = Journal(self.user.id)
+        position = self.position()
+        journal.signal(position)
+        journal.flush()
+        journal.record(position, 'EXPIRE', 'EXPIRED')
+        journal.flush()
+        Trade.objects.filter(id=position.id).update(status='OPEN', entry_level=1)
+        self.assertEqual(rebuild(), 1)
+        trade = Trade.objects.get(id=position.id)
+        self.assertEqual(trade.status, 'EXPIRED')
+        self.assertEqual(float(trade.entry_level), 101.0)
+
+
+class InstrumentMasterTests(SimpleTestCase):
+    def test_round_trip(self):
+        rows = [
+            {'token': '2885', 'symbol': 'RELIANCE-EQ', 'exch_seg': 'NSE', 'lotsize': '1', 'tick_size': '5.000000'},
+            {'token': '500325', 'symbol': 'RELIANCE', 'exch_seg': 'BSE', 'lotsize': '1', 'tick_size': '5.000000'},
+            {'token': '35001', 'symbol': 'NIFTY26OCTFUT', 'exch_seg': 'NFO', 'instrumenttype': 'FUTIDX',
+             'lotsize': '75', 'tick_size': '10.000000'},
+        ]
+        master = InstrumentMaster.decode(InstrumentMaster.from_rows(rows, asof=7).encode())
+        self.assertEqual(len(master), 3)
+        self.assertEqual(master.asof, 7)
+        self.assertEqual(master.symbol('500325', 'BSE'), 'RELIANCE')
+        self.assertEqual(master.token('RELIANCE-EQ'), '2885')
+        future = master.get(master.id_for_symbol('NIFTY26OCTFUT', 'NFO'))
+        self.assertEqual((future.segment, future.lot_size, future.tick_size), ('FUTIDX', 75, 0.1))
+        self.assertEqual(master.universe('NSE:EQ'), {'2885': 'RELIANCE-EQ'})
+
+    def test_universe_exchange(self):
+        self.assertEqual(trading_exchange('breakout'), 'NSE')
+        self.assertEqual(trading_exchange('BSE:EQ'), 'BSE')
+        with self.assertRaises(ValueError):
+            trading_exchange('XYZ:EQ')
+
+
+class TimerWheelTests(SimpleTestCase):
+    def test_already_due_timer_fires_on_next_advance(self):
+        wheel = TimerWheel(tick=1.0, slots=8, now=1000)
+        wheel.schedule(990, 'late')
+        self.assertEqual([t.kind for t in wheel.advance(1000.5)], ['late'])
+        self.assertEqual(len(wheel), 0)
+
+    def test_timer_beyond_one_revolution_waits_for_its_deadline(self):
+        wheel = TimerWheel(tick=1.0, slots=8, now=1000)
+        wheel.schedule(1020, 'far')
+        # Its bucket comes round twice before the deadline
+        for now in range(1001, 1020):
+            self.assertEqual(wheel.advance(now), [])
+        self.assertEqual([t.kind for t in wheel.advance(1020)], ['far'])
+
+    def test_gap_longer_than_a_revolution_fires_everything_in_order(self):
+        wheel = TimerWheel(tick=1.0, slots=8, now=1000)
+        for at in (1030, 1003, 1012):
+            wheel.schedule(at, at)
+        self.assertEqual([t.kind for t in wheel.advance(1100)], [1003, 1012, 1030])
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancelled_timer_is_dropped_lazily(self):
+        wheel = TimerWheel(tick=1.0, slots=8, now=1000)
+        timer = wheel.schedule(1002, 'expire')
+        wheel.schedule(1002, 'keep')
+        timer.cancel()
+        self.assertEqual(len(wheel), 2)
+        self.assertEqual([t.kind for t in wheel.advance(1003)], ['keep'])
+        self.assertEqual(len(wheel), 0)
+
+
+class ProcessedCandlesTests(SimpleTestCase):
+    universe = {'10': 'A-EQ', '20': 'B-EQ'}
+
+    def candle(self, token='20', ts='2026-10-19 10:00:00+0530'):
+        return {'token': token, 'ts': ts}
+
+    def test_mark_is_once_per_token_and_minute(self):
+        processed = ProcessedCandles(InMemoryRedis(), 'p', self.universe)
+        self.assertTrue(processed.mark(self.candle()))
+        self.assertFalse(processed.mark(self.candle()))
+        self.assertTrue(processed.mark(self.candle(token='10')))
+        self.assertTrue(processed.mark(self.candle(ts='2026-10-19 10:01:00+0530')))
+
+    def test_unmark_allows_reevaluation(self):
+        processed = ProcessedCandles(InMemoryRedis(), 'p', self.universe)
+        processed.mark(self.candle())
+        processed.unmark(self.candle())
+        self.assertEqual(processed.unsaved, [])
+        self.assertTrue(processed.mark(self.candle()))
+
+    def test_saved_bits_survive_a_restart_of_the_same_universe_only(self):
+        r = InMemoryRedis()
+        processed = ProcessedCandles(r, 'p', self.universe)
+        processed.mark(self.candle())
+        processed.save(r.pipeline()).execute()
+        self.assertFalse(ProcessedCandles(r, 'p', self.universe).mark(self.candle()))
+        # Reordered universe: positions no longer line up, so the old bits are not read
+        self.assertTrue(ProcessedCandles(r, 'p', {'20': 'B-EQ', '10': 'A-EQ'}).mark(self.candle(token='10')))
+
+    def test_new_day_saves_the_marks_left_from_the_old_one(self):
+        r = InMemoryRedis()
+        processed = ProcessedCandles(r, 'p', self.universe)
+        processed.mark(self.candle(ts='2026-10-19 23:59:00+0530'))
+        processed.mark(self.candle(ts='2026-10-20 00:00:00+0530'))
+        self.assertFalse(ProcessedCandles(r, 'p', self.universe).mark(self.candle(ts='2026-10-19 23:59:00+0530')))
+
+
+class QuotaRedis(InMemoryRedis):
+    """InMemoryRedis plus the counters and sorted sets BrokerQuota uses."""
+
+    def incr(self, key):
+        self.kv[key] = str(int(self.kv.get(key, 0)) + 1)
+        return int(self.kv[key])
+
+    def decr(self, key):
+        self.kv[key] = str(int(self.kv.get(key, 0)) - 1)
+        return int(self.kv[key])
+
+    def zadd(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zcount(self, key, low, high):
+        return sum(1 for score in self.hashes.get(key, {}).values() if float(low) <= score <= float(high))
+
+    def zrem(self, key, *members):
+        scores = self.hashes.get(key, {})
+        return sum(scores.pop(m, None) is not None for m in members)
+
+
+class BrokerQuotaTests(SimpleTestCase):
+    classes = {'order': (0, None), 'history': (3, None)}
+
+    def test_lower_classes_leave_headroom_for_orders(self):
+        quota = BrokerQuota(QuotaRedis(), rate=4, headroom=2, classes=self.classes)
+        self.assertEqual([quota._try('history', 1000.5, 'h') for _ in range(3)], [True, True, False])
+        self.assertEqual([quota._try('order', 1000.5, 'o') for _ in range(3)], [True, True, False])
+
+    def test_class_cap_is_separate_from_the_shared_budget(self):
+        quota = BrokerQuota(QuotaRedis(), rate=10, headroom=0, classes={'order': (0, None), 'history': (3, 2)})
+        self.assertEqual([quota._try('history', 1000.5, 'h') for _ in range(3)], [True, True, False])
+        self.assertTrue(quota._try('order', 1000.5, 'o'))
+        self.assertTrue(quota._try('history', 1001.5, 'h'))
+
+    def test_waiting_order_holds_back_lower_classes(self):
+        quota = BrokerQuota(QuotaRedis(), rate=1, headroom=0, classes=self.classes)
+        self.assertTrue(quota._try('history', 1000.5, 'h'))
+        self.assertFalse(quota._try('order', 1000.6, 'o'))
+        # Next second: the budget is back but the order is still waiting for it
+        self.assertFalse(quota._try('history', 1001.1, 'h'))
+        self.assertTrue(quota._try('order', 1001.2, 'o'))
+
+    def test_unreachable_redis_lets_calls_through(self):
+        r = mock.Mock()
+        r.pipeline.side_effect = redis.ConnectionError('down')
+        with self.assertLogs('tradeapp.ratelimit', 'WARNING'):
+            self.assertLess(BrokerQuota(r).acquire('order'), 1.0)
+
+
+class IndicatorBookTests(SimpleTestCase):
+    universe = {'1': 'A-EQ', '2': 'B-EQ'}
+
+    def candle(self, minute, close, token='1', day='2026-10-19'):
+        return {'token': token, 'ts': f'{day} 10:{minute:02d}:00+0530', 'open': close, 'high': close + 1,
+                'low': close - 1, 'close': close, 'volume': 100}
+
+    def test_each_minute_is_folded_once(self):
+        book = IndicatorBook(self.universe)
+        candles = [self.candle(0, 10.0), self.candle(1, 12.0), self.candle(1, 99.0), self.candle(0, 99.0)]
+        self.assertEqual(book.update(candles), 2)
+        row = book.get('A-EQ')
+        self.assertEqual(row['count'], 2)
+        self.assertAlmostEqual(row['ema_fast'], 11.0)
+        self.assertAlmostEqual(row['vwap'], 11.0)
+        self.assertEqual((row['high_n'], row['low_n']), (13.0, 9.0))
+        self.assertFalse(book.ready('A-EQ'))
+        self.assertIsNone(book.get('B-EQ'))
+
+    def test_warm_up_replays_stored_minute_history(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = HistoryStore(root)
+            store.merge('1', 'ONE_MINUTE', [[f'2026-10-16T10:{m:02d}:00+05:30', 100 + m, 101 + m, 99 + m, 100 + m, 100]
+                                            for m in range(30)])
+            book = IndicatorBook(self.universe)
+            self.assertEqual(book.warm_up(store, now=IST.localize(datetime(2026, 10, 19, 9, 0))), 1)
+        self.assertTrue(book.ready('A-EQ'))
+        self.assertEqual(book.value('high_n', 'A-EQ'), 130.0)
+        # Live candles older than the warm-up are ignored
+        self.assertEqual(book.update([self.candle(5, 1.0, day='2026-10-16')]), 0)
+
+    def test_warm_up_warns_when_no_minute_history_is_stored(self):
+        with tempfile.TemporaryDirectory() as root:
+            book = IndicatorBook(self.universe)
+            with self.assertLogs('tradeapp.indicators', 'WARNING'):
+                self.assertEqual(book.warm_up(HistoryStore(root), now=IST.localize(datetime(2026, 10, 19, 9, 0))), 0)
+
+    def test_fetch_pdh_also_fetches_the_warm_up_window(self):
+        store = mock.Mock()
+        store.ensure.return_value = True
+        start, warmup_start, end = date(2026, 9, 1), date(2026, 10, 9), date(2026, 10, 16)
+        self.assertEqual(FetchPdh()._fetch('angel', store, start, end, warmup_start, 'A-EQ', '1'), ('A-EQ', True))
+        self.assertEqual(store.ensure.call_args_list, [mock.call('angel', '1', 'ONE_DAY', start, end),
+                                                       mock.call('angel', '1', 'ONE_MINUTE', warmup_start, end)])
+        # A failed minute fetch puts the symbol back on the retry list
+        store.ensure.side_effect = [True, False]
+        self.assertEqual(FetchPdh()._fetch('angel', store, start, end, warmup_start, 'A-EQ', '1'), ('A-EQ', False))
@@ -1,10 +1,19 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from .models import APICredential, Trade, StrategySettings
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings as django_settings
+from .models import APICredential, StrategySettings
+from .angel_utils import get_redis_client
+from .metrics import render_prometheus
+from .dashboard import get_snapshot, current_etag
+from .live import event_stream
+from .analytics import summarize
+from .session import publish_session, tokens_from_creds
+from .ratelimit import get_quota
 import SmartApi.smartConnect as smart
 import pyotp
-import json
+import hmac
 import logging
 
 # Setup Logger to print to Heroku logs
@@ -20,44 +29,7 @@ def dashboard(request):
     """
     # 1. AJAX Handler for Auto-Refresh
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.GET.get('format') == 'json':
-        
-        def fmt_date(dt): 
-            return dt.strftime('%H:%M') if dt else '--'
-        
-        # Fetch Data
-        open_positions = Trade.objects.filter(user=request.user, status__in=['OPEN', 'PENDING_EXIT']).order_by('-created_at')
-        scanner_signals = Trade.objects.filter(user=request.user, status='PENDING').order_by('-created_at')
-        trade_history = Trade.objects.filter(user=request.user, status__in=['CLOSED', 'EXPIRED', 'CANCELLED', 'FAILED_ENTRY']).order_by('-created_at')[:20]
-
-        # Prepare JSON Payload
-        data = {
-            'scanner': [{
-                'ts': fmt_date(t.candle_ts),
-                'symbol': t.symbol,
-                'pdh': float(t.prev_day_high or 0),
-                'range': f"{float(t.candle_low or 0)} - {float(t.candle_high or 0)}",
-                'level': float(t.entry_level),
-                'status': 'Watching'
-            } for t in scanner_signals],
-            
-            'positions': [{
-                'symbol': t.symbol,
-                'qty': t.quantity,
-                'entry': float(t.entry_price or 0),
-                'stop': float(t.stop_level),
-                'target': float(t.target_level),
-                'status': t.status
-            } for t in open_positions],
-            
-            'history': [{
-                'time': fmt_date(t.updated_at),
-                'symbol': t.symbol,
-                'status': t.status,
-                'pnl': float(t.pnl or 0),
-                'reason': t.exit_reason or t.status
-            } for t in trade_history]
-        }
-        return JsonResponse(data)
+        return dashboard_feed(request)
 
     # 2. Standard Page Load
     creds = APICredential.objects.filter(user=request.user).first()
@@ -75,6 +47,63 @@ def dashboard(request):
     }
     return render(request, 'tradeapp/dashboard.html', context)
 
+def _etag_matches(header, etag):
+    if not header or not etag:
+        return False
+    tags = [t.strip().removeprefix('W/') for t in header.split(',')]
+    return '*' in tags or etag in tags
+
+def dashboard_feed(request):
+    """
+    JSON feed behind the auto-refresher, served from the per-user Redis snapshot.
+    A poll whose If-None-Match still matches gets a 304 without touching the DB.
+    """
+    r = get_redis_client()
+    client_tag = request.headers.get('If-None-Match')
+    if client_tag:
+        try:
+            if _etag_matches(client_tag, current_etag(request.user.id, r)):
+                response = HttpResponseNotModified()
+                response['ETag'] = client_tag
+                return response
+        except Exception as e:
+            logger.error(f"Dashboard ETag check failed: {e}")
+
+    etag, body = get_snapshot(request.user.id, r)
+    if _etag_matches(client_tag, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Let the browser keep the body but revalidate on every poll
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+async def dashboard_stream(request):
+    """
+    Server-sent events for the dashboard: a snapshot, then trade and MTM deltas
+    as the engines emit them. Needs an ASGI server (see Procfile).
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+    response = StreamingHttpResponse(
+        event_stream(user.id, lambda: sync_to_async(get_snapshot)(user.id)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def analytics(request):
+    """Performance summary (?days=30) read from the pre-aggregated summary tables."""
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        days = 30
+    return JsonResponse(summarize(request.user, days=days))
+
 @login_required
 def save_settings(request):
     """Updates Strategy Risk and Limit Settings"""
@@ -133,6 +162,7 @@ def connect_angel(request):
         obj = smart.SmartConnect(api_key=creds.api_key)
         
         # 3. Perform Login
+        get_quota().acquire('session')
         data = obj.generateSession(creds.client_code, creds.password, totp)
         
         # 4. Handle Response
@@ -147,6 +177,8 @@ def connect_angel(request):
             creds.feed_token = feed_token
             creds.refresh_token = refresh_token
             creds.save()
+            # Engines pick the new session up from the shared cache
+            publish_session(get_redis_client(), tokens_from_creds(creds))
             
             print("------------------------------------------------")
             print("✅ ANGEL LOGIN SUCCESSFUL")
@@ -165,6 +197,19 @@ def connect_angel(request):
         
     return redirect('dashboard')
 
+def metrics(request):
+    """
+    Prometheus scrape endpoint for both engines.
+    Needs METRICS_TOKEN (?token= or Bearer header) or a logged-in staff user.
+    """
+    token = getattr(django_settings, 'METRICS_TOKEN', None)
+    supplied = request.GET.get('token') or request.headers.get('Authorization', '').removeprefix('Bearer ')
+    authorized = bool(token and supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+    if not authorized and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    body = render_prometheus(get_redis_client())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def angel_callback(request):
     """
     Legacy Callback URL.